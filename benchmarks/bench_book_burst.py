@@ -0,0 +1,129 @@
+"""Burst benchmark for /book-ride admission control.
+
+Offers bookings open-loop at increasing rates (each level in a fresh
+process, SQLite, in-memory container runtime, a few drivers) and reports
+booking latency percentiles plus how many requests were admitted or shed
+with 429. With admission control the p99 stays flat once offered load
+passes capacity, because the excess is rejected before it reaches the DB;
+--no-admission shows the queue building up instead.
+
+    python benchmarks/bench_book_burst.py [--rates 50,100,200,400,800] [--duration 3] [--no-admission]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def offer_load(main, rate, duration, users):
+    from httpx import ASGITransport, AsyncClient
+
+    results = []
+
+    async def book(ac, user_id):
+        started = time.perf_counter()
+        try:
+            response = await ac.post("/book-ride", json={"user_id": user_id, "start": "12.97,77.59", "destination": "B"})
+            status = response.status_code
+        except Exception:
+            # e.g. SQLite "database is locked" once the write queue outgrows its busy timeout
+            status = 500
+        results.append((status, time.perf_counter() - started))
+
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as ac:
+        for i in range(20):
+            d = (await ac.post("/register-driver", params={"name": f"d{i}", "email": f"d{i}@x", "location": "12.97,77.59"})).json()
+            await ac.post("/go-online", params={"driver_id": d["driver_id"]})
+        # Open loop: requests go out on schedule whether or not earlier ones have finished
+        tasks, t0 = [], time.perf_counter()
+        for i in range(int(rate * duration)):
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(book(ac, users[i % len(users)])))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+
+    ok = [latency for status, latency in results if status == 200]
+    everything = [latency for _, latency in results]
+    return {
+        "rate": rate,
+        "sent": len(results),
+        "admitted": len(ok),
+        "rejected": sum(1 for status, _ in results if status == 429),
+        "errors": sum(1 for status, _ in results if status >= 500),
+        "admitted_per_s": round(len(ok) / elapsed, 1),
+        "p50_ms": round(percentile(everything, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 1),
+        "p99_admitted_ms": round(percentile(ok, 0.99) * 1000, 1) if ok else None,
+    }
+
+
+def run_level(rate, duration, admission):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_burst.db')}"
+    os.environ["RIDE_RUNTIME"] = "fake"
+    os.environ["RESET_DB"] = "1"
+    os.environ.setdefault("ASSIGN_TICK_SECONDS", "0.5")
+    os.environ.setdefault("PENDING_BACKLOG_LIMIT", "100")
+    if not admission:
+        os.environ["PENDING_BACKLOG_LIMIT"] = "0"
+        os.environ["BOOK_MAX_IN_FLIGHT"] = "0"
+        os.environ["BOOK_RATE_PER_SECOND"] = "0"
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import main
+    import models
+
+    with main.SessionLocal() as db:
+        db.add_all([models.User(name=f"u{i}", email=f"u{i}@x") for i in range(5000)])
+        db.commit()
+        users = [user.id for user in db.query(models.User)]
+    # ASGITransport skips the lifespan, so start the workers the burst depends on by hand
+    main.provisioner.start()
+    threading.Thread(target=main.run_assignment_loop, args=(threading.Event(),), daemon=True).start()
+    print(json.dumps(asyncio.run(offer_load(main, rate, duration, users))))
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="50,100,200,400,800")
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument("--no-admission", action="store_true")
+    parser.add_argument("--level", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.level:
+        run_level(args.level, args.duration, not args.no_admission)
+        return
+
+    print(f"admission control {'off' if args.no_admission else 'on'}, {args.duration}s per level")
+    print(f"{'offered/s':>10} {'sent':>6} {'admitted':>9} {'429':>6} {'5xx':>5} {'adm/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'p99 adm':>8}")
+    for rate in [float(r) for r in args.rates.split(",")]:
+        cmd = [sys.executable, os.path.abspath(__file__), "--level", str(rate), "--duration", str(args.duration)]
+        if args.no_admission:
+            cmd.append("--no-admission")
+        out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.join(ROOT, "server"))
+        line = [l for l in out.stdout.splitlines() if l.startswith("{")]
+        if not line:
+            print(f"{rate:>10.0f} failed: {out.stderr.strip()[-300:]}")
+            continue
+        r = json.loads(line[-1])
+        print(f"{r['rate']:>10.0f} {r['sent']:>6} {r['admitted']:>9} {r['rejected']:>6} {r['errors']:>5} {r['admitted_per_s']:>7} "
+              f"{r['p50_ms']:>8} {r['p99_ms']:>8} {r['p99_admitted_ms'] or '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
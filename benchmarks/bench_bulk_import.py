@@ -0,0 +1,72 @@
+"""Registration throughput: one request per entity versus NDJSON bulk import.
+
+Registers the same users and drivers through /register-user and
+/register-driver (one lookup and one insert per request), then through
+/bulk/users and /bulk/drivers (one batched upsert per 1000 rows) on a fresh
+database, and imports again to time the update path of the upsert.
+
+    python benchmarks/bench_bulk_import.py [--users 20000] [--drivers 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_bulk.db')}")
+os.environ.setdefault("RIDE_RUNTIME", "fake")
+os.environ["RESET_DB"] = "1"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from httpx import ASGITransport, AsyncClient
+
+import main
+import schema
+
+
+def reset():
+    schema.reset(main.engine)
+    schema.bootstrap(main.engine)
+
+
+async def one_by_one(ac, users, drivers):
+    started = time.perf_counter()
+    for user in users:
+        await ac.post("/register-user", params=user)
+    for driver in drivers:
+        await ac.post("/register-driver", params=driver)
+    return time.perf_counter() - started
+
+
+async def bulk(ac, users, drivers):
+    started = time.perf_counter()
+    for path, rows in (("/bulk/users", users), ("/bulk/drivers", drivers)):
+        report = (await ac.post(path, content="\n".join(json.dumps(row) for row in rows))).json()
+        assert report["imported"] == len(rows), report
+    return time.perf_counter() - started
+
+
+async def run(args):
+    users = [{"name": f"u{i}", "email": f"u{i}@bulk"} for i in range(args.users)]
+    drivers = [{"name": f"d{i}", "email": f"d{i}@bulk", "location": f"{12.9 + i % 100 / 500},{77.5 + i // 100 % 100 / 500}"}
+               for i in range(args.drivers)]
+    rows = len(users) + len(drivers)
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as ac:
+        reset()
+        single_s = await one_by_one(ac, users, drivers)
+        reset()
+        insert_s = await bulk(ac, users, drivers)
+        update_s = await bulk(ac, users, drivers)
+    print(f"{len(users)} users + {len(drivers)} drivers on {main.engine.dialect.name}")
+    print(f"one request per entity: {single_s:.2f}s ({rows / single_s:.0f} rows/s)")
+    print(f"bulk NDJSON, new rows:  {insert_s:.2f}s ({rows / insert_s:.0f} rows/s, {single_s / insert_s:.0f}x)")
+    print(f"bulk NDJSON, re-import: {update_s:.2f}s ({rows / update_s:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--drivers", type=int, default=5000)
+    asyncio.run(run(parser.parse_args()))
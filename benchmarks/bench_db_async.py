@@ -0,0 +1,94 @@
+"""Sync vs async DB session throughput for the hot read endpoints.
+
+Serves GET /ride/{id} (async session) and an identical handler bound to the
+sync session/threadpool path, each hammered by --clients concurrent clients
+through the in-process ASGI app. Point DATABASE_URL at Postgres to measure
+the asyncpg path; the default is a throwaway SQLite file.
+
+    python benchmarks/bench_db_async.py [--clients 1000] [--requests 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_async.db')}")
+os.environ["RESET_DB"] = "1"
+
+from fastapi import Depends
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.orm import Session
+
+import main
+import models
+
+
+@main.app.get("/bench/sync-ride/{ride_id}")
+def sync_ride(ride_id: int, db: Session = Depends(main.get_db)):
+    """The pre-async get_ride: same lookups on the sync session in a threadpool worker"""
+    ride = db.get(models.RideQueue, ride_id)
+    user = db.get(models.User, ride.user_id)
+    driver = db.get(models.Driver, ride.driver_id) if ride.driver_id else None
+    return {"ride_id": ride.id, "user_name": user.name, "driver_name": driver.name if driver else None}
+
+
+def seed(rides):
+    db = main.SessionLocal()
+    try:
+        user = models.User(name="bench", email="bench@example.com")
+        driver = models.Driver(name="bench", email="bench@example.com", location="12.97,77.59", status="on_trip")
+        db.add_all([user, driver])
+        db.flush()
+        db.add_all([
+            models.RideQueue(user_id=user.id, driver_id=driver.id, start="A", destination="B", status="assigned")
+            for _ in range(rides)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def hammer(path_for, clients, total):
+    latencies = []
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as ac:
+        async def client(worker):
+            for i in range(worker, total, clients):
+                t0 = time.perf_counter()
+                response = await ac.get(path_for(i))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(w) for w in range(clients)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rides", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed(args.rides)
+    print(f"database: {main.engine.url.render_as_string(hide_password=True)}")
+    for label, path in (
+        ("sync ", lambda i: f"/bench/sync-ride/{i % args.rides + 1}"),
+        ("async", lambda i: f"/ride/{i % args.rides + 1}"),
+    ):
+        rps, p50, p99 = asyncio.run(hammer(path, args.clients, args.requests))
+        print(f"{label} clients={args.clients} req/s={rps:8.0f} p50={p50:7.1f}ms p99={p99:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main_()
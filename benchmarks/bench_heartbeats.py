@@ -0,0 +1,67 @@
+"""Heartbeat ingestion benchmark for the in-memory HeartbeatTable.
+
+Absorbs heartbeats from N drivers for a few seconds, then flushes the dirty
+set to a SQLite drivers table in bulk, reporting beats/s and the resulting
+DB write rate (statements per flush).
+
+    python benchmarks/bench_heartbeats.py [--drivers 50000] [--beats 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine, event, insert
+from sqlalchemy.orm import Session
+
+from heartbeats import FLUSH_CHUNK, HeartbeatTable
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=50_000)
+    parser.add_argument("--beats", type=int, default=1_000_000)
+    parser.add_argument("--database-url", default="sqlite://")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    metadata = MetaData()
+    drivers = Table("drivers", metadata, Column("id", Integer, primary_key=True), Column("last_seen", DateTime))
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(drivers), [{"id": i, "last_seen": datetime.utcnow()} for i in range(args.drivers)])
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    table = HeartbeatTable()
+    now = time.time()
+    for driver_id in range(args.drivers):
+        table.seed(driver_id, now)
+
+    rng = random.Random(1)
+    ids = [rng.randrange(args.drivers) for _ in range(args.beats)]
+    started = time.perf_counter()
+    for driver_id in ids:
+        table.beat(driver_id)
+    elapsed = time.perf_counter() - started
+    print(f"absorbed {args.beats} heartbeats in {elapsed:.2f}s -> {args.beats / elapsed:,.0f} beats/s")
+
+    started = time.perf_counter()
+    with Session(engine) as db:
+        rows = table.flush(db, drivers)
+    elapsed = time.perf_counter() - started
+    print(
+        f"flushed {rows} dirty drivers in {elapsed * 1000:.0f}ms "
+        f"using {len(statements)} statements (chunk size {FLUSH_CHUNK})"
+    )
+    print(f"=> at a 1s flush interval the DB sees at most {rows} row updates/s regardless of ping rate")
+
+
+if __name__ == "__main__":
+    main()
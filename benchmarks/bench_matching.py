@@ -0,0 +1,68 @@
+"""Nearest-driver matching benchmark for the in-memory DriverIndex.
+
+Matches 10k bookings against 50k online drivers scattered around Bangalore
+and reports p50/p99 per-booking latency.
+
+    python benchmarks/bench_matching.py [--drivers 50000] [--bookings 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from geo import DriverIndex
+
+CENTER = (12.9716, 77.5946)
+SPREAD_DEG = 0.25  # ~28 km box around the city centre
+
+
+def random_location(rng):
+    lat = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    lng = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    return f"Lat: {lat:.4f}, Lng: {lng:.4f}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=50_000)
+    parser.add_argument("--bookings", type=int, default=10_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = DriverIndex()
+    started = time.perf_counter()
+    for driver_id in range(args.drivers):
+        index.add(driver_id, random_location(rng))
+    print(f"indexed {args.drivers} drivers in {time.perf_counter() - started:.2f}s")
+
+    pickups = [random_location(rng) for _ in range(args.bookings)]
+
+    for label, match in (
+        (f"nearest(k={args.k})", lambda loc: index.nearest(loc, k=args.k)),
+        ("claim_nearest", index.claim_nearest),
+    ):
+        samples = []
+        for pickup in pickups:
+            t0 = time.perf_counter()
+            match(pickup)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        print(
+            f"{label:<16} bookings={len(samples)} "
+            f"p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us "
+            f"max={max(samples):.1f}us"
+        )
+    print(f"drivers left online: {len(index)}")
+
+
+if __name__ == "__main__":
+    main()
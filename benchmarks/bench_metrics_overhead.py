@@ -0,0 +1,120 @@
+"""Overhead of the /metrics instrumentation on request handling.
+
+Runs the same request mix in-process (ASGITransport, SQLite) once with
+METRICS_ENABLED=0 and once with it on, each in a fresh process, and
+reports per-request latency and the relative slowdown per endpoint. The
+cheapest endpoints (cached /ride/{id}, /) are where the fixed per-request
+cost of the middleware shows most. Each process keeps the best of several
+batches and the modes alternate, since run-to-run noise on a shared box is
+larger than the overhead being measured. The direct cost of the
+middleware, timed around a no-op app, is printed as well.
+
+    python benchmarks/bench_metrics_overhead.py [--requests 3000] [--rounds 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ENDPOINTS = ("/", "/ride/{ride_id}", "/queue?limit=20", "/available-drivers")
+
+
+async def measure(main, requests, batches=5):
+    from httpx import ASGITransport, AsyncClient
+
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "b", "email": "b@x"})).json()["user_id"]
+        for i in range(20):
+            d = (await ac.post("/register-driver", params={"name": f"d{i}", "email": f"d{i}@x", "location": "12.9,77.6"})).json()
+            await ac.post("/go-online", params={"driver_id": d["driver_id"]})
+        ride_id = (await ac.post("/book-ride", json={"user_id": user_id, "start": "12.9,77.6", "destination": "B"})).json()["ride_id"]
+        results = {}
+        for endpoint in ENDPOINTS:
+            url = endpoint.format(ride_id=ride_id)
+            for _ in range(100):
+                await ac.get(url)
+            best = float("inf")
+            for _ in range(batches):
+                started = time.perf_counter()
+                for _ in range(requests // batches):
+                    await ac.get(url)
+                best = min(best, (time.perf_counter() - started) / (requests // batches))
+            results[endpoint] = best
+        return results
+
+
+def middleware_cost(rounds=20000):
+    """Per-request cost of MetricsMiddleware around a no-op ASGI app, free of transport/DB noise"""
+    from metrics import MetricsMiddleware
+
+    class Route:
+        path = "/bench/{id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    async def loop(handler):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await handler({"type": "http", "method": "GET"}, None, send)
+        return (time.perf_counter() - started) / rounds
+
+    wrapped = MetricsMiddleware(app)
+    return min(asyncio.run(loop(wrapped)) - asyncio.run(loop(app)) for _ in range(3))
+
+
+def run_mode(requests):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_metrics.db')}"
+    os.environ["RIDE_RUNTIME"] = "fake"
+    os.environ["RESET_DB"] = "1"
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import main
+
+    results = asyncio.run(measure(main, requests))
+    results["middleware"] = middleware_cost()
+    print(json.dumps(results))
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=4, help="alternating off/on runs; best of each is kept")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_mode(args.requests)
+        return
+
+    best = {"0": {}, "1": {}}
+    for _ in range(args.rounds):
+        for enabled in ("0", "1"):
+            env = {**os.environ, "METRICS_ENABLED": enabled}
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests)],
+                                 capture_output=True, text=True, env=env, cwd=os.path.join(ROOT, "server"))
+            line = [l for l in out.stdout.splitlines() if l.startswith("{")]
+            if not line:
+                sys.exit(f"run failed: {out.stderr.strip()[-500:]}")
+            for endpoint, seconds in json.loads(line[-1]).items():
+                best[enabled][endpoint] = min(seconds, best[enabled].get(endpoint, float("inf")))
+
+    print(f"{'endpoint':<22} {'off us/req':>11} {'on us/req':>10} {'overhead':>9}")
+    for endpoint in ENDPOINTS:
+        off, on = best["0"][endpoint], best["1"][endpoint]
+        print(f"{endpoint:<22} {off * 1e6:>11.0f} {on * 1e6:>10.0f} {(on / off - 1) * 100:>8.1f}%")
+    cheapest = min(best["0"][endpoint] for endpoint in ENDPOINTS)
+    cost = min(best["0"]["middleware"], best["1"]["middleware"])
+    print(f"middleware cost per request: {cost * 1e6:.1f} us ({cost / cheapest * 100:.1f}% of the cheapest endpoint)")
+
+
+if __name__ == "__main__":
+    main()
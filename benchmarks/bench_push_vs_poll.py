@@ -0,0 +1,140 @@
+"""Load-test harness comparing dashboard polling with pushed updates.
+
+Runs the FastAPI app in-process against SQLite with the in-memory container runtime.
+A fixed background workload (drivers toggling online, users booking rides)
+runs while N simulated dashboards either poll /queue + /available-drivers
+every --poll-interval seconds (the old clients) or hold an event-bus
+subscription and only fetch once on connect (the new clients). Reports the
+request rate and SQL statement rate hitting the database in each mode.
+
+    python benchmarks/bench_push_vs_poll.py [--clients 200] [--duration 10]
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_push.db')}")
+os.environ.setdefault("RIDE_RUNTIME", "fake")
+os.environ["RESET_DB"] = "1"
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+
+import main
+
+# ASGITransport skips the lifespan, so run the container worker (fake runtime) by hand
+main.provisioner.start()
+
+
+# Which simulated party issued the current request, so DB statements can be attributed
+ROLE = contextvars.ContextVar("role", default="workload")
+
+
+class Counters:
+    def __init__(self):
+        self.statements = {"connect": 0, "client": 0, "workload": 0}
+        self.requests = 0
+        self.events = 0
+
+
+async def workload(ac, stop, rng, driver_ids, user_ids):
+    """Roughly 20 state changes per second shared by both modes"""
+    while not stop.is_set():
+        driver_id = rng.choice(driver_ids)
+        await ac.post(rng.choice(["/go-online", "/go-offline"]), params={"driver_id": driver_id})
+        if rng.random() < 0.5:
+            await ac.post("/book-ride", json={
+                "user_id": rng.choice(user_ids), "start": "12.97,77.59", "destination": "12.93,77.62"
+            })
+        await asyncio.sleep(0.05)
+
+
+async def polling_client(ac, stop, counters, interval, rng):
+    ROLE.set("client")
+    # Spread the first polls like real dashboards opened at different times
+    await asyncio.sleep(rng.uniform(0, interval))
+    while not stop.is_set():
+        await ac.get("/queue")
+        await ac.get("/available-drivers")
+        counters.requests += 2
+        await asyncio.sleep(interval)
+
+
+async def push_client(ac, stop, counters):
+    # One snapshot on connect, then only pushed events
+    ROLE.set("connect")
+    await ac.get("/queue")
+    await ac.get("/available-drivers")
+    ROLE.set("client")
+    sub = main.event_bus.subscribe({"rides", "drivers"})
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(sub.get(), timeout=0.2)
+                counters.events += 1
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        main.event_bus.unsubscribe(sub)
+
+
+async def run_mode(mode, args):
+    counters = Counters()
+    stop = asyncio.Event()
+    rng = random.Random(7)
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as ac:
+        user_ids = [
+            (await ac.post("/register-user", params={"name": f"u{i}", "email": f"{mode}-u{i}@bench"})).json()["user_id"]
+            for i in range(20)
+        ]
+        driver_ids = [
+            (await ac.post("/register-driver", params={
+                "name": f"d{i}", "email": f"{mode}-d{i}@bench", "location": f"12.9{i % 10},77.5{i % 10}"
+            })).json()["driver_id"]
+            for i in range(50)
+        ]
+
+        def count(*_):
+            counters.statements[ROLE.get()] += 1
+        event.listen(main.engine, "before_cursor_execute", count)
+        if mode == "poll":
+            clients = [polling_client(ac, stop, counters, args.poll_interval, rng) for _ in range(args.clients)]
+        else:
+            clients = [push_client(ac, stop, counters) for _ in range(args.clients)]
+        tasks = [asyncio.ensure_future(c) for c in clients]
+        tasks.append(asyncio.ensure_future(workload(ac, stop, rng, driver_ids, user_ids)))
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        event.remove(main.engine, "before_cursor_execute", count)
+
+    print(
+        f"{mode:<5} clients={args.clients} steady_client_requests/s={counters.requests / elapsed:7.1f} "
+        f"connect_db_statements={counters.statements['connect']} "
+        f"steady_client_db_statements/s={counters.statements['client'] / elapsed:7.1f} "
+        f"workload_db_statements/s={counters.statements['workload'] / elapsed:7.1f} "
+        f"events_delivered={counters.events}"
+    )
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--poll-interval", type=float, default=3, help="seconds between polls (the dashboards use 3)")
+    args = parser.parse_args()
+    asyncio.run(run_mode("poll", args))
+    asyncio.run(run_mode("push", args))
+
+
+if __name__ == "__main__":
+    main_()
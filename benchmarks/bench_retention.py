@@ -0,0 +1,113 @@
+"""Hot-path queries against a ride_queue full of history, before and after archival.
+
+Seeds drivers and rides: a long tail of completed rides plus a small
+active set (pending and assigned, with ports). It times the statements
+the dispatch loop, booking, warm start and /queue run over and over,
+runs the retention job, and times them again. The query plans show which
+index each statement uses.
+
+    python benchmarks/bench_retention.py [--completed 300000] [--active 2000] [--drivers 20000]
+    DATABASE_URL=postgresql://... python benchmarks/bench_retention.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_retention.db')}")
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+import schema
+from db import engine
+from dispatch import ACTIVE_RIDE_STATUSES, active_ports_stmt, pending_count_stmt, pending_rides_stmt
+from retention import archive_completed_rides
+
+ROUNDS = 20
+
+
+def hot_queries(ports):
+    ride, driver = models.RideQueue, models.Driver
+    return {
+        "pending batch (dispatch)": pending_rides_stmt(1000),
+        "pending count (admission)": pending_count_stmt(),
+        "active ports (booking)": active_ports_stmt(ports),
+        "active rides (warm start)": select(ride.id, ride.port).where(ride.status.in_(ACTIVE_RIDE_STATUSES)),
+        "online drivers (index sync)": select(driver.id, driver.location).where(driver.status == "online"),
+        "/queue?status=assigned": select(ride).where(ride.status == "assigned").order_by(ride.id).limit(100),
+    }
+
+
+def time_queries(db, queries):
+    timings = {}
+    for name, stmt in queries.items():
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            db.execute(stmt).all()
+            db.rollback()
+        timings[name] = (time.perf_counter() - started) / ROUNDS
+    return timings
+
+
+def plans(db, queries):
+    if engine.dialect.name != "sqlite":
+        return {}
+    out = {}
+    for name, stmt in queries.items():
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        out[name] = "; ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--completed", type=int, default=300000)
+    parser.add_argument("--active", type=int, default=2000)
+    parser.add_argument("--drivers", type=int, default=20000)
+    args = parser.parse_args()
+
+    schema.reset(engine)
+    schema.bootstrap(engine)
+    old = datetime.utcnow() - timedelta(days=2)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [{"name": "u", "email": "u@x"}])
+        conn.execute(models.Driver.__table__.insert(), [
+            {"name": f"d{i}", "email": f"d{i}@x", "location": "12.9,77.6", "last_seen": old,
+             "status": "online" if i % 10 == 0 else "offline"} for i in range(args.drivers)])
+        conn.execute(models.RideQueue.__table__.insert(), [
+            {"user_id": 1, "start": "A", "destination": "B", "status": "completed", "driver_id": 1 + i % args.drivers,
+             "updated_at": old} for i in range(args.completed)])
+        conn.execute(models.RideQueue.__table__.insert(), [
+            {"user_id": 1, "start": "A", "destination": "B", "status": "assigned" if i % 2 else "pending",
+             "port": 7000 + i if i % 2 else None} for i in range(args.active)])
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE"))
+
+    Session = sessionmaker(bind=engine)
+    queries = hot_queries([7000 + i for i in range(1, 200, 2)])
+    with Session() as db:
+        for name, plan in plans(db, queries).items():
+            print(f"  plan {name}: {plan}")
+        before = time_queries(db, queries)
+        started = time.perf_counter()
+        moved = archive_completed_rides(db, datetime.utcnow() - timedelta(hours=1))
+        archive_s = time.perf_counter() - started
+        after = time_queries(db, queries)
+        remaining = db.scalar(select(func.count()).select_from(models.RideQueue))
+
+    print(f"{args.completed} completed + {args.active} active rides, {args.drivers} drivers on {engine.dialect.name}")
+    print(f"archived {moved} rides in {archive_s:.1f}s ({moved / archive_s:.0f} rides/s), "
+          f"{remaining} left in ride_queue")
+    print(f"{'query':<30} {'before ms':>10} {'after ms':>9}")
+    for name in queries:
+        print(f"{name:<30} {before[name] * 1000:>10.2f} {after[name] * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Route model benchmark: cell-pair cache and batch pickup ETAs.
+
+Routes random trips around Bangalore with a warm and a disabled cache, then
+scores one pickup against its nearest candidate drivers, one route() call
+per driver versus a single pickup_etas() pass.
+
+    python benchmarks/bench_routing.py [--trips 200000] [--drivers 50000] [--candidates 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from geo import DriverIndex
+from routing import RouteModel
+
+CENTER = (12.9716, 77.5946)
+SPREAD_DEG = 0.25  # ~28 km box around the city centre
+HOTSPOTS = 200     # pickups and drop-offs cluster around a few hundred busy spots
+
+
+def random_point(rng, spread=SPREAD_DEG):
+    return CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread)
+
+
+def time_routes(model, trips):
+    started = time.perf_counter()
+    for a, b in trips:
+        model.route(a, b)
+    return (time.perf_counter() - started) / len(trips)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trips", type=int, default=200000)
+    parser.add_argument("--drivers", type=int, default=50000)
+    parser.add_argument("--candidates", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    spots = [random_point(rng) for _ in range(HOTSPOTS)]
+    near = lambda spot: (spot[0] + rng.uniform(-0.001, 0.001), spot[1] + rng.uniform(-0.001, 0.001))
+    trips = [(near(rng.choice(spots)), near(rng.choice(spots))) for _ in range(args.trips)]
+
+    cached = RouteModel()
+    cached_s = time_routes(cached, trips)
+    uncached_s = time_routes(RouteModel(cache_size=0), trips)
+    stats = cached.stats()
+    print(f"{args.trips} routes between {HOTSPOTS} hotspots: cached {cached_s * 1e6:.2f} µs/route "
+          f"(hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.0%}), uncached {uncached_s * 1e6:.2f} µs/route")
+
+    index = DriverIndex()
+    for driver_id in range(args.drivers):
+        index.add(driver_id, random_point(rng))
+    pickups = [random_point(rng) for _ in range(200)]
+    scalar_s = batch_s = 0.0
+    for pickup in pickups:
+        points = index.points(index.nearest(pickup, args.candidates))
+        started = time.perf_counter()
+        one_by_one = [cached.route(point, pickup)[1] for point in points]
+        scalar_s += time.perf_counter() - started
+        started = time.perf_counter()
+        batch = cached.pickup_etas(pickup, points)
+        batch_s += time.perf_counter() - started
+        assert max(abs(x - y) for x, y in zip(one_by_one, batch)) < 1e-6
+    print(f"ETA for one pickup against {args.candidates} drivers: route() loop {scalar_s / len(pickups) * 1e3:.3f} ms, "
+          f"pickup_etas() {batch_s / len(pickups) * 1e3:.3f} ms ({scalar_s / batch_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
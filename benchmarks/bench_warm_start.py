@@ -0,0 +1,100 @@
+"""Restart time against a populated database.
+
+Seeds a database with a busy city's worth of state (drivers online and
+on trips, a pending backlog, assigned rides holding ports, completed
+history), then starts the app in a fresh process the way a restarted
+worker would. It times the schema bootstrap at import and warm_start(),
+and checks that the restored state matches the tables.
+
+    python benchmarks/bench_warm_start.py [--drivers 50000] [--online 20000] [--pending 10000] [--assigned 5000] [--completed 100000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_warm.db')}")
+os.environ.setdefault("RIDE_RUNTIME", "fake")
+os.environ.setdefault("RIDE_PORT_START", "20000")
+os.environ.setdefault("RIDE_PORT_COUNT", "20000")
+
+
+def seed(args):
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import db
+    import models
+    import schema
+
+    schema.reset(db.engine)
+    schema.bootstrap(db.engine)
+    now = datetime.utcnow()
+    port_start = int(os.environ["RIDE_PORT_START"])
+    with db.engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [{"name": f"u{i}", "email": f"u{i}@x"} for i in range(1000)])
+        conn.execute(models.Driver.__table__.insert(), [
+            {"name": f"d{i}", "email": f"d{i}@x", "location": f"{12.9 + i % 100 / 500},{77.5 + i // 100 % 100 / 500}",
+             "status": "on_trip" if i < args.assigned else "online" if i < args.assigned + args.online else "offline",
+             "last_seen": now}
+            for i in range(args.drivers)])
+        ride_table = models.RideQueue.__table__
+        conn.execute(ride_table.insert(), [
+            {"user_id": 1 + i % 1000, "start": "A", "destination": "B", "status": "assigned", "driver_id": 1 + i,
+             "port": port_start + i, "completes_at": now + timedelta(minutes=1)} for i in range(args.assigned)])
+        for status, count in (("pending", args.pending), ("completed", args.completed)):
+            conn.execute(ride_table.insert(), [{"user_id": 1 + i % 1000, "start": "A", "destination": "B", "status": status}
+                                               for i in range(count)])
+
+
+def restart():
+    started = time.perf_counter()
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import main
+
+    imported = time.perf_counter()
+    warmed = main.warm_start()
+    done = time.perf_counter()
+    print(json.dumps({"import_s": round(imported - started, 3), "warm_start_s": round(done - imported, 3),
+                      "restored": warmed, "indexed_drivers": len(main.driver_index),
+                      "trip_timers": len(main.trip_scheduler), "backlog": main.backlog_gate.stats()["pending"]}))
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=50000)
+    parser.add_argument("--online", type=int, default=20000)
+    parser.add_argument("--pending", type=int, default=10000)
+    parser.add_argument("--assigned", type=int, default=5000)
+    parser.add_argument("--completed", type=int, default=100000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        restart()
+        return
+
+    started = time.perf_counter()
+    seed(args)
+    print(f"seeded {args.drivers} drivers ({args.online} online, {args.assigned} on trips), {args.pending} pending, "
+          f"{args.completed} completed rides in {time.perf_counter() - started:.1f}s")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], capture_output=True, text=True,
+                         cwd=os.path.join(ROOT, "server"))
+    line = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if not line:
+        sys.exit(f"restart failed: {out.stderr.strip()[-500:]}")
+    result = json.loads(line[-1])
+    print(f"import + schema bootstrap: {result['import_s']}s, warm start: {result['warm_start_s']}s")
+    print(f"restored: {result['restored']}")
+    expected = {"online_drivers": args.online, "pending_rides": args.pending, "trips": args.assigned, "ports": args.assigned}
+    ok = result["restored"] == expected and result["indexed_drivers"] == args.online \
+        and result["trip_timers"] == args.assigned and result["backlog"] == args.pending
+    print("OK: in-memory state matches the tables" if ok else f"MISMATCH: expected {expected}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
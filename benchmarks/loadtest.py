@@ -0,0 +1,376 @@
+"""Reproducible in-process load test for the API hot paths.
+
+Drives server/main.py through ASGITransport with the app's own background
+workers running (dispatch, trip completion, heartbeat flush, liveness,
+provisioner on the in-memory container runtime). Each scenario runs in a
+fresh process against a fresh database:
+
+  - N drivers register, go online at random spots around the city and
+    heartbeat on a fixed interval for the whole run
+  - users book open-loop with Poisson arrivals at the scenario's rate
+    (seeded, so every run offers the same load), then open their ride
+
+It reports:
+  - throughput and latency percentiles per request kind
+  - DB statements per request per route, from the /metrics hooks
+  - booking outcomes
+  - assignment fairness: how long rides waited for a driver, and how
+    evenly rides were spread over drivers (Jain's index, 1.0 = perfectly
+    even)
+
+--save writes the result to benchmarks/baselines/<scenario>.json.
+--check compares a run against that file and exits 1 on a regression:
+  - p95 latency or p99 ride wait grew by more than --tolerance
+  - booking throughput dropped by more than --tolerance
+  - DB statements per request grew by more than 0.5
+
+Statement counts are exact and portable across machines. Latencies
+are only comparable on the machine the baseline came from, and tails
+are noisy on shared hosts, so save and check with --repeat 3 or more
+(each metric is then the median over runs). Scenarios
+inherit the environment, so app settings such as BOOK_MAX_IN_FLIGHT or
+ASSIGN_TICK_SECONDS can be varied per run; baselines record the config
+but not those, so save and check with the same ones.
+
+    python benchmarks/loadtest.py [--scenario smoke,steady,burst] [--repeat 3] [--save | --check] [--tolerance 0.5]
+    DATABASE_URL=postgresql://localhost/mini_uber_bench python benchmarks/loadtest.py --scenario steady
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+SCENARIOS = {
+    # Quick sanity run, e.g. before pushing
+    "smoke": {"drivers": 200, "book_rate": 20, "duration": 5, "heartbeat_seconds": 5, "trip_seconds": 2},
+    # Sustained load near what SQLite, which serializes writers, can serve
+    "steady": {"drivers": 1000, "book_rate": 50, "duration": 15, "heartbeat_seconds": 5, "trip_seconds": 3},
+    # More bookings than drivers free up, so admission control and the backlog matter
+    "burst": {"drivers": 1000, "book_rate": 300, "duration": 5, "heartbeat_seconds": 5, "trip_seconds": 10},
+}
+CITY = (12.97, 77.59)
+SPREAD = 0.1  # degrees around CITY that drivers and pickups are scattered over
+SEED = 7
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def spot(rng):
+    return f"{CITY[0] + rng.uniform(-SPREAD, SPREAD):.5f},{CITY[1] + rng.uniform(-SPREAD, SPREAD):.5f}"
+
+
+def jain_index(counts):
+    """Jain's fairness index of counts, relative to the most even split of the same total.
+
+    With fewer rides than drivers some drivers must get none, so the raw
+    index can't reach 1; dividing by the best achievable one makes 1.0 mean
+    "as even as possible" at any load.
+    """
+    total, n = sum(counts), len(counts)
+    if not total:
+        return None
+    raw = total * total / (n * sum(c * c for c in counts))
+    q, r = divmod(total, n)
+    best = total * total / (n * (r * (q + 1) ** 2 + (n - r) * q * q))
+    return round(raw / best, 3)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def call(self, kind, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except Exception:
+            # e.g. SQLite "database is locked" once writers queue past the busy timeout
+            response, status = None, 500
+        self.latencies[kind].append(time.perf_counter() - started)
+        self.statuses[kind][status] += 1
+        return response
+
+
+async def run_scenario(main, metrics, config):
+    from httpx import ASGITransport, AsyncClient
+
+    # Separate streams so task scheduling order can't change the offered load
+    rng, beat_rng = random.Random(SEED), random.Random(SEED + 1)
+    recorder = Recorder()
+    booked_at, assigned_at, rides_by_driver = {}, {}, Counter()
+    outcomes = Counter()
+
+    async with main.lifespan(main.app), AsyncClient(transport=ASGITransport(app=main.app), base_url="http://load") as ac:
+        users = []
+        for i in range(int(config["book_rate"] * config["duration"] * 1.5) + 10):
+            users.append((await ac.post("/register-user", params={"name": f"u{i}", "email": f"u{i}@load"})).json()["user_id"])
+
+        async def heartbeat(driver_id):
+            await asyncio.sleep(beat_rng.uniform(0, config["heartbeat_seconds"]))
+            while True:
+                await recorder.call("heartbeat", ac.post("/heartbeat", params={"driver_id": driver_id}))
+                await asyncio.sleep(config["heartbeat_seconds"])
+
+        # Each driver heartbeats from the moment it is online, or the liveness sweep
+        # would take early drivers offline while the rest are still registering
+        drivers, beats = [], []
+        for i in range(config["drivers"]):
+            driver = (await ac.post("/register-driver", params={"name": f"d{i}", "email": f"d{i}@load", "location": spot(rng)})).json()
+            await ac.post("/go-online", params={"driver_id": driver["driver_id"]})
+            drivers.append(driver["driver_id"])
+            beats.append(asyncio.create_task(heartbeat(driver["driver_id"])))
+
+        # Assignments made by the dispatch loop arrive as ride events, which gives each ride's wait
+        subscription = main.event_bus.subscribe(["rides"])
+
+        async def watch_rides():
+            while True:
+                ride = (await subscription.get())["ride"]
+                if ride["status"] == "assigned" and ride["id"] not in assigned_at:
+                    assigned_at[ride["id"]] = time.perf_counter()
+                    rides_by_driver[ride["driver_id"]] += 1
+
+        async def book(user_id, start, destination):
+            sent = time.perf_counter()
+            response = await recorder.call("book-ride", ac.post(
+                "/book-ride", json={"user_id": user_id, "start": start, "destination": destination}))
+            if response is None or response.status_code != 200:
+                outcomes["rejected" if response is not None and response.status_code == 429 else "failed"] += 1
+                return
+            body = response.json()
+            booked_at[body["ride_id"]] = sent
+            if body["driver_id"]:
+                outcomes["assigned_at_booking"] += 1
+                if body["ride_id"] not in assigned_at:
+                    assigned_at[body["ride_id"]] = time.perf_counter()
+                    rides_by_driver[body["driver_id"]] += 1
+            else:
+                outcomes["queued"] += 1
+            # The dashboard opens the ride right after booking
+            await recorder.call("ride", ac.get(f"/ride/{body['ride_id']}"))
+
+        watcher = asyncio.create_task(watch_rides())
+        recorder.__init__()
+        db_before = metrics.HTTP_DB_QUERIES.totals()
+        started = time.perf_counter()
+        stop_at = started + config["duration"]
+
+        # Open loop: bookings go out on schedule whether or not earlier ones have finished
+        bookings, next_at, user = [], started, 0
+        while True:
+            next_at += rng.expovariate(config["book_rate"])
+            if next_at >= stop_at:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bookings.append(asyncio.create_task(book(users[user % len(users)], spot(rng), spot(rng))))
+            user += 1
+        await asyncio.gather(*bookings)
+        elapsed = time.perf_counter() - started
+        for beat in beats:
+            beat.cancel()
+        # Give the dispatch loop one more tick to pick up the tail of the backlog
+        await asyncio.sleep(main.ASSIGN_TICK_SECONDS + 0.5)
+        db_after = metrics.HTTP_DB_QUERIES.totals()
+        watcher.cancel()
+        main.event_bus.unsubscribe(subscription)
+
+    requests = {}
+    for kind, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[kind]
+        requests[kind] = {
+            "count": len(latencies),
+            "per_s": round(len(latencies) / elapsed, 1),
+            "errors": sum(n for status, n in statuses.items() if status >= 500),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    queries = {}
+    for (route,), (count, total) in sorted(db_after.items()):
+        before_count, before_total = db_before.get((route,), (0, 0))
+        if count > before_count:
+            queries[route] = round((total - before_total) / (count - before_count), 2)
+    waits = [assigned_at[ride] - booked_at[ride] for ride in booked_at if ride in assigned_at]
+    return {
+        "config": config,
+        "requests": requests,
+        "db_queries_per_request": queries,
+        "bookings": {
+            "offered": len(bookings),
+            "admitted_per_s": round(len(booked_at) / elapsed, 1),
+            **{key: outcomes[key] for key in ("assigned_at_booking", "queued", "rejected", "failed")},
+        },
+        "assignment": {
+            "assigned": len(waits),
+            "never_assigned": len(booked_at) - len(waits),
+            "wait_p50_ms": round(percentile(waits, 0.5) * 1000, 1) if waits else None,
+            "wait_p99_ms": round(percentile(waits, 0.99) * 1000, 1) if waits else None,
+            "drivers_used": len(rides_by_driver),
+            "max_rides_per_driver": max(rides_by_driver.values(), default=0),
+            # Over every driver that was online, idle ones included
+            "jain_index": jain_index([rides_by_driver[d] for d in drivers]),
+        },
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "database": main.engine.dialect.name},
+    }
+
+
+def run_child(name, overrides):
+    config = {**SCENARIOS[name], **overrides}
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.gettempdir(), f"loadtest_{name}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["RIDE_RUNTIME"] = "fake"
+    os.environ["METRICS_ENABLED"] = "1"
+    # Every scenario starts from empty tables
+    os.environ["RESET_DB"] = "1"
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import main
+    import metrics
+
+    # Trips normally last as long as the route model says; shorten them so drivers come back and get ridden again
+    main.trip_completion_time = lambda *args: datetime.utcnow() + timedelta(seconds=config["trip_seconds"])
+    result = asyncio.run(run_scenario(main, metrics, config))
+    print(json.dumps({"scenario": name, **result}))
+    os._exit(0)
+
+
+def median_of(results):
+    """Merge repeated runs of one scenario, taking the median of every number"""
+    first = results[0]
+    if isinstance(first, dict):
+        return {key: median_of([r.get(key) for r in results]) for key in first}
+    numbers = sorted(r for r in results if isinstance(r, (int, float)) and not isinstance(r, bool))
+    if not numbers or len(numbers) != len(results):
+        return first
+    return numbers[len(numbers) // 2]
+
+
+def run_scenario_process(name, overrides):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name]
+    for key, value in overrides.items():
+        cmd += [f"--{key.replace('_', '-')}", str(value)]
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.join(ROOT, "server"))
+    line = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if not line:
+        raise RuntimeError(out.stderr.strip()[-500:])
+    return json.loads(line[-1])
+
+
+def regressions(result, baseline, tolerance):
+    found = []
+
+    def worse(label, now, then, higher_is_worse=True, absolute=None):
+        if now is None or then is None:
+            return
+        if absolute is not None:
+            bad = now > then + absolute
+        elif higher_is_worse:
+            bad = now > then * (1 + tolerance)
+        else:
+            bad = now < then * (1 - tolerance)
+        if bad:
+            found.append(f"{label}: {then} -> {round(now, 2)}")
+
+    for kind, stats in baseline["requests"].items():
+        # p95 rather than p99: a handful of scheduler hiccups moves p99 of a few hundred samples
+        worse(f"{kind} p95_ms", result["requests"].get(kind, {}).get("p95_ms"), stats["p95_ms"])
+    for route, queries in baseline["db_queries_per_request"].items():
+        worse(f"{route} db queries/request", result["db_queries_per_request"].get(route), queries, absolute=0.5)
+    worse("bookings admitted_per_s", result["bookings"]["admitted_per_s"], baseline["bookings"]["admitted_per_s"],
+          higher_is_worse=False)
+    worse("assignment wait_p99_ms", result["assignment"]["wait_p99_ms"], baseline["assignment"]["wait_p99_ms"])
+    return found
+
+
+def report(result):
+    print(f"== {result['scenario']}: {result['config']}")
+    print(f"   {'request':<12} {'count':>7} {'per s':>8} {'5xx':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for kind, r in result["requests"].items():
+        print(f"   {kind:<12} {r['count']:>7} {r['per_s']:>8} {r['errors']:>5} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+    print("   db queries/request: " + ", ".join(f"{route} {n}" for route, n in result["db_queries_per_request"].items()))
+    print(f"   bookings: {result['bookings']}")
+    print(f"   assignment: {result['assignment']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", default="smoke", help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--drivers", type=int)
+    parser.add_argument("--book-rate", type=float, help="bookings offered per second")
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--save", action="store_true", help="write results as the new baselines")
+    parser.add_argument("--check", action="store_true", help="fail if results regress against the baselines")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative change for --check")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; every metric is the median")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    overrides = {key: value for key, value in
+                 (("drivers", args.drivers), ("book_rate", args.book_rate), ("duration", args.duration)) if value}
+    if args.child:
+        run_child(args.child, overrides)
+        return
+
+    failed = False
+    for name in args.scenario.split(","):
+        if name not in SCENARIOS:
+            sys.exit(f"unknown scenario {name!r}")
+        try:
+            result = median_of([run_scenario_process(name, overrides) for _ in range(args.repeat)])
+        except RuntimeError as e:
+            print(f"== {name} failed: {e}")
+            failed = True
+            continue
+        result["runs"] = args.repeat
+        report(result)
+
+        path = os.path.join(BASELINES, f"{name}.json")
+        if args.save:
+            os.makedirs(BASELINES, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+                f.write("\n")
+            print(f"   saved baseline {os.path.relpath(path, ROOT)}")
+        elif args.check:
+            if not os.path.exists(path):
+                print(f"   no baseline at {os.path.relpath(path, ROOT)}, run with --save first")
+                failed = True
+                continue
+            with open(path) as f:
+                baseline = json.load(f)
+            if baseline["config"] != result["config"]:
+                print("   baseline was recorded with a different config, skipping comparison")
+                continue
+            found = regressions(result, baseline, args.tolerance)
+            for line in found:
+                print(f"   REGRESSION {line}")
+            if not found:
+                print("   OK: within baseline")
+            failed = failed or bool(found)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
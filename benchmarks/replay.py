@@ -0,0 +1,270 @@
+"""Replay a JSONL traffic trace against the API at recorded or accelerated time.
+
+A trace has one event per line, ordered or not, with "t" in seconds from
+the start of the trace:
+
+    {"t": 0.0, "event": "user", "name": "Asha", "email": "asha@example.com"}
+    {"t": 0.1, "event": "driver", "name": "Ravi", "email": "ravi@example.com", "location": "12.97,77.59"}
+    {"t": 0.2, "event": "online", "driver": "ravi@example.com"}
+    {"t": 5.0, "event": "heartbeat", "driver": "ravi@example.com"}
+    {"t": 7.5, "event": "book", "user": "asha@example.com", "start": "Koramangala", "destination": "12.93,77.62"}
+    {"t": 9.0, "event": "offline", "driver": "ravi@example.com"}
+
+Users and drivers are referred to by email, so a trace plays against any
+database. Registrations are loaded up front through /bulk/users and
+/bulk/drivers unless --no-preload, then every other event goes out open
+loop at t / --speed (0 sends as fast as --concurrency allows). The report
+covers latency and status per event kind, and how far sends fell behind
+schedule; a replay that can't keep up shows it as lag.
+
+    python benchmarks/replay.py synth trace.jsonl [--drivers 200] [--users 500] [--rides-per-s 5] [--duration 120]
+    python benchmarks/replay.py play trace.jsonl [--url http://localhost:8000] [--speed 10] [--concurrency 200]
+    python benchmarks/replay.py play trace.jsonl --in-process --speed 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CENTER = (12.9716, 77.5946)
+SPREAD_DEG = 0.15
+# Sent as the pickup or destination now and then, to exercise place-name routing
+PLACE_NAMES = ["Koramangala", "Indiranagar", "MG Road, Bangalore", "Whitefield", "HSR Layout", "Hebbal"]
+HEARTBEAT_SECONDS = 3
+
+
+def spot(rng):
+    if rng.random() < 0.2:
+        return rng.choice(PLACE_NAMES)
+    return f"{CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG):.4f},{CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG):.4f}"
+
+
+def synth(args):
+    """A shift of drivers logging on and heartbeating while riders book with Poisson arrivals"""
+    rng = random.Random(args.seed)
+    events = [{"t": 0.0, "event": "user", "name": f"rider {i}", "email": f"rider{i}@trace"} for i in range(args.users)]
+    for i in range(args.drivers):
+        email = f"driver{i}@trace"
+        online_at = rng.uniform(0, args.duration * 0.1)
+        shift_end = rng.uniform(args.duration * 0.7, args.duration * 1.2)
+        events.append({"t": 0.0, "event": "driver", "name": f"driver {i}", "email": email,
+                       "location": f"{CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG):.4f},"
+                                   f"{CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG):.4f}"})
+        events.append({"t": round(online_at, 3), "event": "online", "driver": email})
+        beat = online_at + rng.uniform(0, HEARTBEAT_SECONDS)
+        while beat < min(shift_end, args.duration):
+            events.append({"t": round(beat, 3), "event": "heartbeat", "driver": email})
+            beat += HEARTBEAT_SECONDS
+        if shift_end < args.duration:
+            events.append({"t": round(shift_end, 3), "event": "offline", "driver": email})
+    t = 0.0
+    while True:
+        t += rng.expovariate(args.rides_per_s)
+        if t >= args.duration:
+            break
+        events.append({"t": round(t, 3), "event": "book", "user": f"rider{rng.randrange(args.users)}@trace",
+                       "start": spot(rng), "destination": spot(rng)})
+    events.sort(key=lambda e: e["t"])
+    with open(args.trace, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+    print(f"wrote {len(events)} events over {args.duration}s to {args.trace}: {Counter(e['event'] for e in events)}")
+
+
+def load_trace(path):
+    events, bad = [], 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+                event["t"] = float(event["t"])
+                event["event"]
+            except (ValueError, TypeError, KeyError):
+                bad += 1
+                continue
+            events.append(event)
+    events.sort(key=lambda e: e["t"])
+    return events, bad
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Player:
+    def __init__(self, client, concurrency):
+        self.client = client
+        self.slots = asyncio.Semaphore(concurrency)
+        self.users, self.drivers = {}, {}
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lag = []
+        self.skipped = Counter()
+
+    async def preload(self, events):
+        """Bulk-load every registration in the trace and learn the ids it maps to"""
+        for kind, path, fields in (("user", "/bulk/users", ("name", "email")),
+                                   ("driver", "/bulk/drivers", ("name", "email", "location"))):
+            rows = [json.dumps({field: e.get(field) for field in fields}) for e in events if e["event"] == kind]
+            if not rows:
+                continue
+            started = time.perf_counter()
+            response = await self.client.post(path, params={"return_ids": "true"}, content="\n".join(rows))
+            report = response.json()
+            (self.users if kind == "user" else self.drivers).update(report.get("ids", {}))
+            print(f"preloaded {report.get('imported')} {kind}s in {time.perf_counter() - started:.2f}s"
+                  + (f", {report['rejected']} rejected: {report['errors'][:3]}" if report.get("rejected") else ""))
+
+    def request_for(self, event):
+        """(kind, coroutine) for one event, or None if it names someone the replay doesn't know"""
+        kind = event["event"]
+        if kind == "user":
+            return kind, self._register("/register-user", self.users, event, ("name", "email"))
+        if kind == "driver":
+            return kind, self._register("/register-driver", self.drivers, event, ("name", "email", "location"))
+        if kind == "book":
+            user_id = self.users.get(event.get("user"))
+            if user_id is None:
+                return None
+            return kind, self.client.post("/book-ride", json={"user_id": user_id, "start": event.get("start"),
+                                                              "destination": event.get("destination")})
+        paths = {"online": "/go-online", "offline": "/go-offline", "heartbeat": "/heartbeat"}
+        driver_id = self.drivers.get(event.get("driver"))
+        if kind not in paths or driver_id is None:
+            return None
+        return kind, self.client.post(paths[kind], params={"driver_id": driver_id})
+
+    async def _register(self, path, ids, event, fields):
+        response = await self.client.post(path, params={field: event.get(field) for field in fields})
+        key = "user_id" if path == "/register-user" else "driver_id"
+        if response.status_code == 200 and key in response.json():
+            ids[event["email"]] = response.json()[key]
+        return response
+
+    async def send(self, kind, request):
+        async with self.slots:
+            started = time.perf_counter()
+            try:
+                status = (await request).status_code
+            except Exception:
+                status = "error"
+            self.latencies[kind].append(time.perf_counter() - started)
+            self.statuses[kind][status] += 1
+
+    async def play(self, events, speed):
+        tasks = []
+        started = time.perf_counter()
+        t0 = events[0]["t"] if events else 0.0
+        for event in events:
+            due = started + (event["t"] - t0) / speed if speed else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lag.append(max(0.0, time.perf_counter() - due))
+            found = self.request_for(event)
+            if found is None:
+                self.skipped[event["event"]] += 1
+            elif event["event"] in ("user", "driver"):
+                # Registrations are sent inline, so later events in the trace can name them
+                await self.send(*found)
+            else:
+                tasks.append(asyncio.create_task(self.send(*found)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+
+def report(player, events, elapsed, speed):
+    span = events[-1]["t"] - events[0]["t"] if events else 0.0
+    sent = sum(len(v) for v in player.latencies.values())
+    print(f"replayed {sent} requests in {elapsed:.1f}s (trace spans {span:.1f}s"
+          + (f", {span / speed:.1f}s at {speed}x)" if speed else ", sent unthrottled)"))
+    print(f"schedule lag: p50 {percentile(player.lag, 0.5) * 1000:.1f} ms, p99 {percentile(player.lag, 0.99) * 1000:.1f} ms, "
+          f"max {max(player.lag) * 1000:.1f} ms" if player.lag and speed else "schedule lag: n/a")
+    print(f"   {'event':<10} {'count':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for kind, latencies in sorted(player.latencies.items()):
+        print(f"   {kind:<10} {len(latencies):>7} {len(latencies) / elapsed:>8.1f} {percentile(latencies, 0.5) * 1000:>8.2f} "
+              f"{percentile(latencies, 0.95) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}  "
+              f"{dict(player.statuses[kind])}")
+    if player.skipped:
+        print(f"skipped events naming unknown users or drivers: {dict(player.skipped)}")
+
+
+async def play_against(client, events, args):
+    player = Player(client, args.concurrency)
+    if args.preload:
+        await player.preload(events)
+        events = [e for e in events if e["event"] not in ("user", "driver")]
+    elapsed = await player.play(events, args.speed)
+    report(player, events, elapsed, args.speed)
+
+
+async def play_in_process(events, args):
+    """Fresh SQLite database and the app's own background workers, like loadtest.py"""
+    from httpx import ASGITransport, AsyncClient
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'replay.db')}"
+    os.environ.setdefault("RIDE_RUNTIME", "fake")
+    os.environ.setdefault("RESET_DB", "1")
+    sys.path.insert(0, os.path.join(ROOT, "server"))
+    import main
+
+    async with main.lifespan(main.app), AsyncClient(transport=ASGITransport(app=main.app), base_url="http://replay") as client:
+        await play_against(client, events, args)
+        print(f"dispatch state: {main.backlog_gate.stats()}, drivers indexed {len(main.driver_index)}, "
+              f"trips running {len(main.trip_scheduler)}")
+
+
+async def play_remote(events, args):
+    from httpx import AsyncClient, Limits
+
+    limits = Limits(max_connections=args.concurrency)
+    async with AsyncClient(base_url=args.url, timeout=30, limits=limits) as client:
+        await play_against(client, events, args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("synth", help="write a synthetic trace")
+    make.add_argument("trace")
+    make.add_argument("--drivers", type=int, default=200)
+    make.add_argument("--users", type=int, default=500)
+    make.add_argument("--rides-per-s", type=float, default=5)
+    make.add_argument("--duration", type=float, default=120)
+    make.add_argument("--seed", type=int, default=42)
+    play = commands.add_parser("play", help="replay a trace")
+    play.add_argument("trace")
+    play.add_argument("--url", default="http://localhost:8000")
+    play.add_argument("--in-process", action="store_true", help="run the app in this process on a fresh database")
+    play.add_argument("--speed", type=float, default=1.0, help="time multiplier; 0 sends without waiting")
+    play.add_argument("--concurrency", type=int, default=200, help="requests in flight at once")
+    play.add_argument("--no-preload", dest="preload", action="store_false",
+                      help="send registrations at their recorded time instead of bulk-loading them first")
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        synth(args)
+        return
+    events, bad = load_trace(args.trace)
+    if bad:
+        print(f"skipped {bad} trace lines without a numeric t and an event")
+    if not events:
+        sys.exit("no events to replay")
+    asyncio.run(play_in_process(events, args) if args.in_process else play_remote(events, args))
+    if args.in_process:
+        # Background threads from the app's lifespan may still be winding down
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Multi-process dispatch stress test for the claim protocol in dispatch.py.
+
+Starts N worker processes against one database. Each books rides as fast
+as it can and runs dispatch passes over the shared pending backlog, picking
+drivers from its own stale snapshot the way a separate uvicorn worker
+would. Afterwards it checks that no driver holds more than one ride and no
+ride was won twice, and reports booking and assignment rates. --naive
+swaps the conditional claims for read-then-write to show the races it
+prevents.
+
+    python benchmarks/stress_dispatch.py [--workers 8] [--bookings 150] [--drivers 1000]
+    DATABASE_URL=postgresql://... python benchmarks/stress_dispatch.py
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'stress_dispatch.db')}")
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import models
+from db import DATABASE_URL, pool_options
+from dispatch import assign_ride, claim_driver, pending_rides_stmt, unclaim_driver
+
+CANDIDATES_PER_RIDE = 5
+
+
+def make_engine():
+    if DATABASE_URL.startswith("sqlite"):
+        return create_engine(DATABASE_URL, connect_args={"timeout": 60})
+    return create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+
+
+def naive_assign(db, ride, driver_id):
+    """What book_ride/assign_pending_rides used to do: read, check, write"""
+    driver = db.get(models.Driver, driver_id)
+    if driver.status != "online":
+        return False
+    driver.status = "on_trip"
+    ride.status = "assigned"
+    ride.driver_id = driver_id
+    db.flush()
+    return True
+
+
+def dispatch_pass(db, driver_ids, rng, naive):
+    won = []
+    for ride in db.execute(pending_rides_stmt(20)).scalars().all():
+        for driver_id in rng.sample(driver_ids, CANDIDATES_PER_RIDE):
+            if naive:
+                if naive_assign(db, ride, driver_id):
+                    won.append((ride.id, driver_id))
+                    break
+            elif claim_driver(db, driver_id):
+                if assign_ride(db, ride.id, driver_id):
+                    won.append((ride.id, driver_id))
+                else:
+                    unclaim_driver(db, driver_id)
+                break
+    db.commit()
+    return won
+
+
+def worker(worker_id, bookings, naive, results):
+    rng = random.Random(worker_id)
+    Session = sessionmaker(bind=make_engine())
+    with Session() as db:
+        # Snapshot taken once and never refreshed, like a worker's local driver index
+        driver_ids = db.scalars(select(models.Driver.id)).all()
+    wins, retries = [], 0
+    started = time.perf_counter()
+    for _ in range(bookings):
+        while True:
+            try:
+                with Session() as db:
+                    db.add(models.RideQueue(user_id=1, start="A", destination="B", status="pending"))
+                    db.commit()
+                    wins += dispatch_pass(db, driver_ids, rng, naive)
+                break
+            except OperationalError:
+                # SQLite busy/locked under contention; Postgres serialization hiccups
+                retries += 1
+    results.put((wins, retries, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--bookings", type=int, default=150, help="bookings per worker")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--naive", action="store_true", help="read-then-write claims, to show the races")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(models.User(name="stress", email="stress@example.com"))
+        db.add_all([models.Driver(name=f"d{i}", email=f"d{i}@x", status="online") for i in range(args.drivers)])
+        db.commit()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(n, args.bookings, args.naive, results))
+             for n in range(args.workers)]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    outcomes = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    wins = [win for won, _, _ in outcomes for win in won]
+    rides_won_twice = sum(1 for n in Counter(ride for ride, _ in wins).values() if n > 1)
+    drivers_won_twice = sum(1 for n in Counter(driver for _, driver in wins).values() if n > 1)
+    with Session() as db:
+        assigned = db.scalar(select(func.count()).where(models.RideQueue.status == "assigned"))
+        on_trip = db.scalar(select(func.count()).where(models.Driver.status == "on_trip"))
+
+    bookings = args.workers * args.bookings
+    print(f"{args.workers} workers, {bookings} bookings, {args.drivers} drivers on {engine.dialect.name}"
+          f"{' (naive claims)' if args.naive else ''}")
+    print(f"  {bookings / elapsed:.0f} bookings/s, {len(wins)} assignments, "
+          f"{sum(r for _, r, _ in outcomes)} lock retries, {elapsed:.1f}s")
+    print(f"  rides won twice:   {rides_won_twice}")
+    print(f"  drivers won twice: {drivers_won_twice}")
+    print(f"  assigned rides in DB: {assigned}, on_trip drivers: {on_trip}")
+    ok = rides_won_twice == drivers_won_twice == 0 and assigned == on_trip == len(wins)
+    print("  OK: zero double assignments" if ok else "  FAILED: double assignments detected")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import { API_BASE_URL } from "../config";
+import { subscribeToUpdates, upsertRide } from "../events";
 import MapComponent from "./MapComponent";
 
 export default function DriverDashboard({ driver, onLogout }) {
@@ -11,19 +12,31 @@ export default function DriverDashboard({ driver, onLogout }) {
   const [assignedRides, setAssignedRides] = useState([]);
   const [completedRides, setCompletedRides] = useState([]);
   const [onlineDriversCount, setOnlineDriversCount] = useState(0);
+  const [rides, setRides] = useState([]);
+  const [onlineDriverIds, setOnlineDriverIds] = useState(new Set());
+
+  useEffect(() => {
+    setAvailableRides(rides.filter(ride => ride.status === "pending"));
+    setAssignedRides(rides.filter(ride => 
+      ride.status === "assigned" && ride.driver_id === driver.id
+    ));
+    setCompletedRides(rides.filter(ride => 
+      ride.status === "completed" && ride.driver_id === driver.id
+    ));
+  }, [rides]);
+
+  useEffect(() => {
+    setOnlineDriversCount(onlineDriverIds.size);
+  }, [onlineDriverIds]);
 
   const fetchRides = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/queue`);
-      const rides = response.data;
-      
-      setAvailableRides(rides.filter(ride => ride.status === "pending"));
-      setAssignedRides(rides.filter(ride => 
-        ride.status === "assigned" && ride.driver_id === driver.id
-      ));
-      setCompletedRides(rides.filter(ride => 
-        ride.status === "completed" && ride.driver_id === driver.id
-      ));
+      // Only the open requests and this driver's own rides are shown
+      const [pending, own] = await Promise.all([
+        axios.get(`${API_BASE_URL}/queue`, { params: { status: "pending", limit: 1000 } }),
+        axios.get(`${API_BASE_URL}/queue`, { params: { driver_id: driver.id, limit: 1000 } })
+      ]);
+      setRides([...pending.data, ...own.data]);
     } catch (error) {
       console.error("Error fetching rides:", error);
     }
@@ -32,7 +45,7 @@ export default function DriverDashboard({ driver, onLogout }) {
   const fetchOnlineDrivers = async () => {
     try {
       const response = await axios.get(`${API_BASE_URL}/available-drivers`);
-      setOnlineDriversCount(response.data.length);
+      setOnlineDriverIds(new Set(response.data.map(d => d.id)));
     } catch (error) {
       console.error("Error fetching online drivers:", error);
     }
@@ -52,7 +65,6 @@ export default function DriverDashboard({ driver, onLogout }) {
         setIsOnline(true);
         await sendHeartbeat(); // Send heartbeat immediately after going online
       }
-      fetchOnlineDrivers(); // Refresh driver count immediately
     } catch (error) {
       console.error("Error toggling status:", error);
     }
@@ -69,7 +81,6 @@ export default function DriverDashboard({ driver, onLogout }) {
   };
 
   useEffect(() => {
-    let ridesInterval;
     let heartbeatInterval;
     
     // Set driver online on mount
@@ -86,13 +97,34 @@ export default function DriverDashboard({ driver, onLogout }) {
     };
     
     initDriver();
-    fetchRides();
-    fetchOnlineDrivers();
     
-    ridesInterval = setInterval(() => {
-      fetchRides();
-      fetchOnlineDrivers();
-    }, 3000);
+    // Rides and drivers load once the socket opens, and again after every reconnect;
+    // in between the server pushes each change
+    const unsubscribe = subscribeToUpdates(
+      { driverId: driver.id, topics: ["rides", "drivers"] },
+      (event) => {
+        if (event.type === "ride") {
+          const ride = event.ride;
+          // Keep only what fetchRides loads: open requests and this driver's own rides
+          if (ride.status === "pending" || ride.driver_id === driver.id) {
+            setRides(prev => upsertRide(prev, ride));
+          } else {
+            setRides(prev => prev.filter(r => r.id !== ride.id));
+          }
+        } else if (event.type === "driver") {
+          setOnlineDriverIds(prev => {
+            const next = new Set(prev);
+            if (event.driver.status === "online") next.add(event.driver.id);
+            else next.delete(event.driver.id);
+            return next;
+          });
+        }
+      },
+      () => {
+        fetchRides();
+        fetchOnlineDrivers();
+      }
+    );
     heartbeatInterval = setInterval(() => {
       sendHeartbeat();
     }, 5000);
@@ -105,7 +137,7 @@ export default function DriverDashboard({ driver, onLogout }) {
     window.addEventListener('beforeunload', handleBeforeUnload);
     
     return () => {
-      clearInterval(ridesInterval);
+      unsubscribe();
       clearInterval(heartbeatInterval);
       window.removeEventListener('beforeunload', handleBeforeUnload);
       // Set driver offline on unmount
@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import { API_BASE_URL } from "../config";
+import { subscribeToUpdates, upsertRide, applyDriverStatus } from "../events";
 import MapComponent from "./MapComponent";
 
 export default function UserDashboard({ user, onLogout }) {
@@ -14,14 +15,10 @@ export default function UserDashboard({ user, onLogout }) {
 
   const fetchRides = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/queue`);
-      const userRides = response.data.filter(ride => ride.user_id === user.id);
-      setRides(userRides);
-      
-      const activeRide = userRides.find(ride => 
-        ride.status === "pending" || ride.status === "assigned"
-      );
-      setCurrentRide(activeRide);
+      const response = await axios.get(`${API_BASE_URL}/queue`, {
+        params: { user_id: user.id, limit: 1000 }
+      });
+      setRides(response.data);
     } catch (error) {
       console.error("Error fetching rides:", error);
     }
@@ -57,21 +54,45 @@ export default function UserDashboard({ user, onLogout }) {
       setDestination("");
       fetchRides();
       
-      window.open(ride_url, '_blank');
+      if (ride_url) {
+        window.open(ride_url, '_blank');
+      } else {
+        alert("🕐 Ride requested! We'll assign the next available driver.");
+      }
     } catch (error) {
       console.error("Error booking ride:", error);
+      if (error.response?.status === 429) {
+        alert(`⏳ ${error.response.data.error} (retry in ${error.response.data.retry_after}s)`);
+        return;
+      }
       alert("Failed to book ride. Please try again.");
     }
   };
 
   useEffect(() => {
-    fetchRides();
-    fetchNearbyDrivers();
-    const interval = setInterval(() => {
-      fetchRides();
-      fetchNearbyDrivers();
-    }, 3000);
-    return () => clearInterval(interval);
+    const activeRide = rides.find(ride => 
+      ride.status === "pending" || ride.status === "assigned"
+    );
+    setCurrentRide(activeRide);
+  }, [rides]);
+
+  useEffect(() => {
+    // Rides and drivers load once the socket opens, and again after every reconnect;
+    // in between the server pushes each change
+    return subscribeToUpdates(
+      { userId: user.id, topics: ["drivers"] },
+      (event) => {
+        if (event.type === "ride") {
+          setRides(prev => upsertRide(prev, event.ride));
+        } else if (event.type === "driver") {
+          setNearbyDrivers(prev => applyDriverStatus(prev, event.driver));
+        }
+      },
+      () => {
+        fetchRides();
+        fetchNearbyDrivers();
+      }
+    );
   }, []);
 
   return (
@@ -190,7 +211,7 @@ export default function UserDashboard({ user, onLogout }) {
                     <p className="text-sm font-semibold text-blue-800 mb-2">🐈 Your Ride Container:</p>
                     <p className="text-sm text-blue-600 mb-3 break-all">Port: <code className="bg-blue-100 px-2 py-1 rounded">{currentRide.port}</code></p>
                     <a 
-                      href={`http://localhost:${currentRide.port}`}
+                      href={`${API_BASE_URL}/rides/${currentRide.id}`}
                       target="_blank"
                       rel="noopener noreferrer"
                       className="inline-block px-4 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-700 transition-all duration-300 hover:scale-105 text-sm"
@@ -0,0 +1,52 @@
+import { API_BASE_URL } from "./config";
+
+// Subscribe to ride/driver updates pushed by the backend over /ws.
+// `onOpen` runs on the first connect and every reconnect, so callers load their initial state there
+// (and resync anything missed while disconnected) rather than fetching separately on mount.
+// Returns a function that closes the subscription.
+export function subscribeToUpdates({ userId, driverId, topics = [] }, onEvent, onOpen) {
+  const params = new URLSearchParams();
+  if (userId != null) params.set("user_id", userId);
+  if (driverId != null) params.set("driver_id", driverId);
+  if (topics.length) params.set("topics", topics.join(","));
+  const url = `${API_BASE_URL.replace(/^http/, "ws")}/ws?${params}`;
+
+  let socket;
+  let closed = false;
+  let retryDelay = 1000;
+
+  const connect = () => {
+    socket = new WebSocket(url);
+    socket.onopen = () => {
+      retryDelay = 1000;
+      if (onOpen) onOpen();
+    };
+    socket.onmessage = (message) => onEvent(JSON.parse(message.data));
+    socket.onclose = () => {
+      if (closed) return;
+      setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    socket.close();
+  };
+}
+
+// Replace the ride with the same id in `rides`, or append it
+export function upsertRide(rides, ride) {
+  const index = rides.findIndex(r => r.id === ride.id);
+  if (index === -1) return [...rides, ride];
+  const next = [...rides];
+  next[index] = ride;
+  return next;
+}
+
+// Keep `drivers` in sync with one driver's status change (only online drivers are listed)
+export function applyDriverStatus(drivers, driver) {
+  const others = drivers.filter(d => d.id !== driver.id);
+  return driver.status === "online" ? [...others, driver] : others;
+}
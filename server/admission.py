@@ -0,0 +1,90 @@
+import math
+import threading
+import time
+
+
+class RateLimiter:
+    """Per-key token buckets: `rate` tokens per second, holding at most `burst`.
+
+    Buckets that have refilled completely carry no information, so they are
+    dropped whenever the table grows past max_keys.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, key, now=None):
+        """Take a token for key; returns 0 if admitted, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.limited += 1
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def _prune(self, now):
+        full = [key for key, (tokens, updated_at) in self._buckets.items()
+                if tokens + (now - updated_at) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+    def stats(self):
+        return {"rate_per_second": self.rate, "burst": self.burst,
+                "tracked_keys": len(self._buckets), "rate_limited": self.limited}
+
+
+class BacklogGate:
+    """Caps the pending-ride backlog, so bursts are turned away before they touch the DB.
+
+    A booking reserves a slot when admitted, before its insert, so
+    concurrent requests can't all slip in under the cap, and settles it
+    once it knows whether the ride stayed pending. The pending count is
+    reset from the table by the assignment loop; in-flight bookings are
+    tracked separately so a reset never forgets them.
+    """
+
+    def __init__(self, limit, drain_seconds):
+        self.limit = limit
+        self.drain_seconds = drain_seconds
+        self._pending = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def admit(self):
+        """Reserve a slot and return 0, or return a retry hint in whole seconds once the backlog is full"""
+        with self._lock:
+            if not 0 < self.limit <= self._pending + self._in_flight:
+                self._in_flight += 1
+                return 0
+            self.rejected += 1
+        # A full backlog has to wait for an assignment pass to drain it
+        return max(1, math.ceil(self.drain_seconds))
+
+    def settle(self, pending):
+        """Release the slot taken by admit; pending says whether the ride now waits for a driver"""
+        with self._lock:
+            self._in_flight -= 1
+            if pending:
+                self._pending += 1
+
+    def reset(self, pending):
+        with self._lock:
+            self._pending = pending
+
+    def stats(self):
+        return {"backlog_limit": self.limit, "pending": self._pending, "in_flight": self._in_flight,
+                "backlog_rejected": self.rejected}
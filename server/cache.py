@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+
+class RideCache:
+    """Read-through cache of ride details plus a port -> ride id index of active rides.
+
+    Readers take a ticket before querying the DB and hand it back to `put`;
+    an invalidation that lands in between makes the put a no-op, so a slow
+    read can never re-cache a ride that changed status under it.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()      # ride_id -> details, least recently used first
+        self._invalidated = OrderedDict()  # ride_id -> clock of its latest invalidation
+        self._floor = 0                    # tickets older than this may have missed an evicted invalidation
+        self._clock = 0
+        self._ports = {}                   # port -> ride_id
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ride_id):
+        with self._lock:
+            details = self._entries.get(ride_id)
+            if details is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(ride_id)
+            self.hits += 1
+            return details
+
+    def ticket(self):
+        with self._lock:
+            return self._clock
+
+    def put(self, ride_id, details, ticket):
+        with self._lock:
+            if ticket < self._floor or self._invalidated.get(ride_id, -1) > ticket:
+                return False
+            self._entries[ride_id] = details
+            self._entries.move_to_end(ride_id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, ride_id):
+        with self._lock:
+            self._clock += 1
+            self._entries.pop(ride_id, None)
+            self._invalidated[ride_id] = self._clock
+            self._invalidated.move_to_end(ride_id)
+            if len(self._invalidated) > self.max_size:
+                _, clock = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, clock)
+
+    def track_port(self, ride_id, port, active):
+        """Point port at ride_id while the ride is active, drop the mapping once it isn't"""
+        if port is None:
+            return
+        with self._lock:
+            if active:
+                self._ports[port] = ride_id
+            elif self._ports.get(port) == ride_id:
+                del self._ports[port]
+
+    def ride_for_port(self, port):
+        return self._ports.get(port)
+
+    def stats(self):
+        return {
+            "cached_rides": len(self._entries),
+            "indexed_ports": len(self._ports),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,381 @@
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+
+RIDE_INTERFACE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ride-interface")
+POOL_PREFIX = "ride-pool-"
+RIDE_PREFIX = "ride-"
+
+
+def ride_container_name(ride_id):
+    return f"{RIDE_PREFIX}{ride_id}"
+
+
+def ride_id_from_name(name):
+    """Ride id of a ride-<id> container, None for pool containers and anything else"""
+    suffix = name[len(RIDE_PREFIX):]
+    return int(suffix) if name.startswith(RIDE_PREFIX) and suffix.isdigit() else None
+
+
+class ContainerRuntime(ABC):
+    """What the provisioner needs from a container backend"""
+
+    @abstractmethod
+    def run(self, name, port, ride_id=None):
+        """Start a ride interface container publishing port; returns True on success"""
+
+    @abstractmethod
+    def rename(self, old, new):
+        """Rename a container; returns True on success"""
+
+    @abstractmethod
+    def remove(self, names):
+        """Force-remove containers by name in one go"""
+
+    @abstractmethod
+    def list(self):
+        """{name: {"port", "status"}} for every ride-* container, running or not"""
+
+
+class DockerRuntime(ContainerRuntime):
+    """nginx:alpine containers serving ride-interface/, driven through the docker CLI"""
+
+    def __init__(self, image="nginx:alpine"):
+        self.image = image
+
+    def run(self, name, port, ride_id=None):
+        # Remove existing container if it exists
+        subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+        cmd = [
+            "docker", "run", "-d",
+            "--name", name,
+            "-p", f"{port}:80",
+            "-v", f"{RIDE_INTERFACE_PATH}:/usr/share/nginx/html:ro",
+            "-e", f"PORT={port}",
+        ]
+        # Pooled containers start before their ride exists; the page finds its ride by port
+        if ride_id is not None:
+            cmd += ["-e", f"RIDE_ID={ride_id}"]
+        result = subprocess.run(cmd + [self.image], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"❌ Failed to create container: {result.stderr}")
+        return result.returncode == 0
+
+    def rename(self, old, new):
+        return subprocess.run(["docker", "rename", old, new], capture_output=True).returncode == 0
+
+    def remove(self, names):
+        if names:
+            subprocess.run(["docker", "rm", "-f", *names], capture_output=True)
+
+    def list(self):
+        result = subprocess.run(
+            ["docker", "ps", "-a", "--filter", f"name={RIDE_PREFIX}", "--format", "json"],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or "docker ps failed")
+        containers = {}
+        for line in result.stdout.splitlines():
+            if line:
+                info = json.loads(line)
+                port = re.search(r":(\d+)->80", info.get("Ports", ""))
+                containers[info["Names"]] = {"port": int(port.group(1)) if port else None, "status": info["Status"]}
+        return containers
+
+
+class FakeRuntime(ContainerRuntime):
+    """In-memory runtime for tests and local runs without Docker"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.containers = {}  # name -> port
+
+    def run(self, name, port, ride_id=None):
+        time.sleep(self.delay)
+        self.containers[name] = port
+        return True
+
+    def rename(self, old, new):
+        if old not in self.containers:
+            return False
+        self.containers[new] = self.containers.pop(old)
+        return True
+
+    def remove(self, names):
+        for name in names:
+            self.containers.pop(name, None)
+
+    def list(self):
+        return {name: {"port": port, "status": "running"} for name, port in list(self.containers.items())}
+
+
+def runtime_from_env():
+    return FakeRuntime() if os.getenv("RIDE_RUNTIME", "docker") == "fake" else DockerRuntime()
+
+
+class Provisioner:
+    """Creates and tears down ride containers off the request path.
+
+    Bookings call `acquire` and `provision`, neither of which touches the
+    runtime: a pre-warmed idle container is claimed and renamed to the ride's
+    name in the background, otherwise a fresh port is allocated and a create
+    job queued. `release` queues teardown, which the worker batches into a
+    single remove call before freeing the ports.
+    """
+
+    def __init__(self, runtime, ports, pool_size=0, max_jobs=1000, teardown_batch=50, on_create=None):
+        self.runtime = runtime
+        self.on_create = on_create  # called with the seconds each runtime.run took
+        self.ports = ports
+        self.pool_size = pool_size
+        self.teardown_batch = teardown_batch
+        self._jobs = queue.Queue(max_jobs)
+        self._idle = []       # ports of warm containers ready to be claimed
+        self._pooled = set()  # claimed warm ports not yet provisioned for a ride
+        self._registry = {}   # container name -> {"port", "status"}, kept in step with our own calls
+        self._suspect_containers = set()
+        self._suspect_ports = set()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+        self.created = 0
+        self.claimed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.removed = 0
+        self.durations = []  # seconds per runtime.run, most recent last
+        self.reaped_containers = 0
+        self.reclaimed_ports = 0
+        self.last_reconciled = None
+
+    def acquire(self):
+        """Port for a ride's interface, preferring a warm container; None when no port is free"""
+        with self._lock:
+            if self._idle:
+                port = self._idle.pop()
+                self._pooled.add(port)
+                self.claimed += 1
+                return port
+        return self.ports.allocate()
+
+    def provision(self, ride_id, port):
+        """Queue the container for ride_id on an acquired port"""
+        with self._lock:
+            pooled = port in self._pooled
+            self._pooled.discard(port)
+        self._submit(("rename" if pooled else "create", ride_id, port))
+
+    def unclaim(self, port, reusable=True):
+        """Give back a port from acquire whose ride was never committed.
+
+        A reusable port goes back to the warm pool or the allocator. One that
+        another worker's ride holds only loses its claim: it stays allocated
+        and reconcile reaps its warm container, then frees the port once that
+        ride is gone.
+        """
+        with self._lock:
+            pooled = port in self._pooled
+            self._pooled.discard(port)
+            if pooled and reusable:
+                self._idle.append(port)
+                return
+        if not pooled and reusable:
+            self.ports.release(port)
+
+    def release(self, ride_id, port):
+        self._submit(("remove", ride_id, port))
+
+    def _submit(self, job):
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            print(f"⚠️ Provisioning queue full, dropped {job[0]} for ride {job[1]}")
+            if job[0] == "remove":
+                self.ports.release(job[2])
+
+    def start(self):
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="ride-provisioner", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._worker:
+            self._worker.join(timeout=5)
+
+    def stats(self):
+        recent = sorted(self.durations[-200:])
+        return {
+            "queued_jobs": self._jobs.qsize(),
+            "idle_containers": len(self._idle),
+            "pool_size": self.pool_size,
+            "created": self.created,
+            "claimed_from_pool": self.claimed,
+            "removed": self.removed,
+            "failed": self.failed,
+            "dropped_jobs": self.dropped,
+            "create_p50_seconds": round(recent[len(recent) // 2], 3) if recent else None,
+            "worker_alive": bool(self._worker and self._worker.is_alive()),
+            "reaped_containers": self.reaped_containers,
+            "reclaimed_ports": self.reclaimed_ports,
+        }
+
+    def containers(self):
+        """Known ride containers, served from the registry without asking the runtime"""
+        with self._lock:
+            return [{"name": name, **info} for name, info in sorted(self._registry.items())]
+
+    def reconcile(self, active_rides, inspect=True):
+        """Sync the registry with the runtime and reap what no active ride owns.
+
+        active_rides maps ride id -> port for every pending/assigned ride. A
+        container or port is only reaped once two consecutive passes find it
+        orphaned, so bookings not yet committed and queued jobs aren't taken
+        for leaks. Pass inspect=False to only reclaim leaked ports.
+        """
+        reaped = []
+        if inspect:
+            listed = self.runtime.list()
+            with self._lock:
+                self._registry = listed
+                pool = set(self._idle) | self._pooled
+            orphans = {name for name in listed if self._is_orphan(name, active_rides, pool)}
+            reaped = sorted(orphans & self._suspect_containers)
+            self._suspect_containers = orphans - set(reaped)
+            if reaped:
+                self.runtime.remove(reaped)
+                with self._lock:
+                    for name in reaped:
+                        self._registry.pop(name, None)
+
+        with self._lock:
+            owned = set(active_rides.values()) | set(self._idle) | self._pooled
+        with self._jobs.mutex:
+            owned |= {job[2] for job in self._jobs.queue}
+        leaked = set(self.ports.allocated_ports()) - owned
+        reclaimed = sorted(leaked & self._suspect_ports)
+        self._suspect_ports = leaked - set(reclaimed)
+        for port in reclaimed:
+            self.ports.release(port)
+
+        self.reaped_containers += len(reaped)
+        self.reclaimed_ports += len(reclaimed)
+        self.last_reconciled = time.time()
+        if reaped or reclaimed:
+            print(f"🧹 Reaped {len(reaped)} orphaned ride containers, reclaimed {len(reclaimed)} leaked ports")
+        return {"containers": reaped, "ports": reclaimed}
+
+    @staticmethod
+    def _is_orphan(name, active_rides, pool):
+        if name.startswith(POOL_PREFIX):
+            port = name[len(POOL_PREFIX):]
+            return not (port.isdigit() and int(port) in pool)
+        ride_id = ride_id_from_name(name)
+        return ride_id is not None and ride_id not in active_rides
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._jobs.get(timeout=0.5)
+            except queue.Empty:
+                self._refill_pool()
+                continue
+            if job[0] != "remove":
+                self._handle(job)
+                continue
+            removes, others = self._drain_removes()
+            # Jobs queued between the removes run first so a ride's create never follows its remove
+            for other in others:
+                self._handle(other)
+            try:
+                self._teardown([job] + removes)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Ride container teardown failed: {e}")
+
+    def _handle(self, job):
+        kind, ride_id, port = job
+        try:
+            if kind == "create":
+                self._create(ride_container_name(ride_id), port, ride_id)
+            elif kind == "rename":
+                old, new = f"{POOL_PREFIX}{port}", ride_container_name(ride_id)
+                if self.runtime.rename(old, new):
+                    with self._lock:
+                        self._registry[new] = self._registry.pop(old, {"port": port, "status": "running"})
+                else:
+                    self._create(new, port, ride_id)
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Provisioning {kind} for ride {ride_id} failed: {e}")
+
+    def _create(self, name, port, ride_id=None):
+        started = time.perf_counter()
+        ok = self.runtime.run(name, port, ride_id)
+        elapsed = time.perf_counter() - started
+        self.durations.append(elapsed)
+        del self.durations[:-1000]
+        if self.on_create:
+            self.on_create(elapsed)
+        if ok:
+            self.created += 1
+            with self._lock:
+                self._registry[name] = {"port": port, "status": "running"}
+            print(f"✅ Created ride container {name} on port {port}")
+        else:
+            self.failed += 1
+        return ok
+
+    def _drain_removes(self):
+        """Pull further queued removes (up to a batch) so they share one runtime call"""
+        batch, others = [], []
+        while len(batch) < self.teardown_batch - 1:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            (batch if job[0] == "remove" else others).append(job)
+        return batch, others
+
+    def _teardown(self, jobs):
+        names = [ride_container_name(ride_id) for _, ride_id, _ in jobs]
+        self.runtime.remove(names)
+        with self._lock:
+            for name in names:
+                self._registry.pop(name, None)
+        for _, _, port in jobs:
+            self.ports.release(port)
+        self.removed += len(jobs)
+        print(f"🗑️ Removed {len(jobs)} ride containers")
+
+    def _refill_pool(self):
+        """Top the warm pool up while the worker has nothing else to do"""
+        while len(self._idle) < self.pool_size and self._jobs.empty() and not self._stop.is_set():
+            port = self.ports.allocate()
+            if port is None:
+                return
+            if self._create(f"{POOL_PREFIX}{port}", port):
+                with self._lock:
+                    self._idle.append(port)
+            else:
+                self.ports.release(port)
+                return
+
+    def drain_pool(self):
+        """Remove idle warm containers and free their ports, e.g. on shutdown"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        names = [f"{POOL_PREFIX}{port}" for port in idle]
+        self.runtime.remove(names)
+        with self._lock:
+            for name in names:
+                self._registry.pop(name, None)
+        for port in idle:
+            self.ports.release(port)
@@ -0,0 +1,108 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+# Claim protocol that lets several workers or processes dispatch against one database.
+# Handing out a driver or a pending ride is a conditional UPDATE that only matches while
+# the row is still in the state the caller saw, so of two dispatchers racing for the same
+# row exactly one sees rowcount 1. On PostgreSQL the pending backlog is also read
+# FOR UPDATE SKIP LOCKED so concurrent passes take disjoint batches; SQLite ignores the
+# locking clause and relies on the conditional updates alone.
+
+# Ride statuses that hold a driver and/or a port
+ACTIVE_RIDE_STATUSES = ("pending", "assigned")
+
+
+def claim_driver_stmt(driver_id):
+    return (
+        update(models.Driver)
+        .where(models.Driver.id == driver_id, models.Driver.status == "online")
+        .values(status="on_trip")
+    )
+
+
+def unclaim_driver_stmt(driver_id):
+    return (
+        update(models.Driver)
+        .where(models.Driver.id == driver_id, models.Driver.status == "on_trip")
+        .values(status="online")
+    )
+
+
+def assign_ride_stmt(ride_id, driver_id, **values):
+    return (
+        update(models.RideQueue)
+        .where(models.RideQueue.id == ride_id, models.RideQueue.status == "pending")
+        .values(status="assigned", driver_id=driver_id, **values)
+    )
+
+
+def complete_ride_stmt(ride_id, driver_id):
+    return (
+        update(models.RideQueue)
+        .where(models.RideQueue.id == ride_id, models.RideQueue.driver_id == driver_id,
+               models.RideQueue.status == "assigned")
+        .values(status="completed")
+    )
+
+
+def claim_driver(db, driver_id):
+    """Flip an online driver to on_trip; False if another dispatcher got there first"""
+    return db.execute(claim_driver_stmt(driver_id)).rowcount == 1
+
+
+async def claim_driver_async(db, driver_id):
+    return (await db.execute(claim_driver_stmt(driver_id))).rowcount == 1
+
+
+def unclaim_driver(db, driver_id):
+    """Undo claim_driver inside the same transaction"""
+    db.execute(unclaim_driver_stmt(driver_id))
+
+
+async def unclaim_driver_async(db, driver_id):
+    await db.execute(unclaim_driver_stmt(driver_id))
+
+
+def assign_ride(db, ride_id, driver_id, **values):
+    """Move a pending ride to assigned; False if it is no longer pending"""
+    return db.execute(assign_ride_stmt(ride_id, driver_id, **values)).rowcount == 1
+
+
+def complete_ride(db, ride_id, driver_id):
+    """Move driver_id's assigned ride to completed; False if another worker already completed it"""
+    return db.execute(complete_ride_stmt(ride_id, driver_id)).rowcount == 1
+
+
+def release_driver(db, driver_id):
+    """Put a driver back online after a trip; False if they are no longer on_trip, e.g. went offline"""
+    return db.execute(unclaim_driver_stmt(driver_id)).rowcount == 1
+
+
+def pending_rides_stmt(limit=None):
+    """Oldest pending rides, row-locked and skipping rows another dispatcher holds"""
+    stmt = (
+        select(models.RideQueue)
+        .where(models.RideQueue.status == "pending")
+        .order_by(models.RideQueue.id)
+        .with_for_update(skip_locked=True)
+    )
+    return stmt.limit(limit) if limit else stmt
+
+
+def pending_count_stmt():
+    return select(func.count()).select_from(models.RideQueue).where(models.RideQueue.status == "pending")
+
+
+def active_ports_stmt(ports):
+    """Which of ports are held by active rides, whichever process allocated them"""
+    return select(models.RideQueue.port).where(
+        models.RideQueue.status.in_(ACTIVE_RIDE_STATUSES),
+        models.RideQueue.port.in_(list(ports)),
+    )
+
+
+def is_port_conflict(error: IntegrityError):
+    """True if error is the active-port unique index rejecting a port another process holds"""
+    return "ux_ride_queue_active_port" in str(error.orig) or "ride_queue.port" in str(error.orig)
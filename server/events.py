@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+# Events buffered per subscriber before the oldest ones are dropped
+QUEUE_SIZE = 256
+
+
+class Subscription:
+    """One connected client: an asyncio queue on the loop that owns the connection."""
+
+    def __init__(self, channels, loop, maxsize=QUEUE_SIZE):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event):
+        # Runs on self.loop. A slow client loses its oldest events rather than stalling publishers.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBus:
+    """In-process pub/sub for ride and driver status changes.
+
+    Subscribers listen on channels such as "rides", "drivers", "user:7" or
+    "driver:3". `publish` is safe to call from request threads and background
+    workers; delivery is batched into one callback per event loop.
+    """
+
+    def __init__(self):
+        self._channels = defaultdict(set)  # channel -> {Subscription}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, channels, loop=None):
+        sub = Subscription(channels, loop or asyncio.get_running_loop())
+        with self._lock:
+            for channel in sub.channels:
+                self._channels[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._channels.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def publish(self, event, channels):
+        """Fan event out to every subscriber of any of channels (each gets it once)"""
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._channels.get(channel, ()))
+        self.published += 1
+        if not targets:
+            return 0
+
+        by_loop = defaultdict(list)
+        for sub in targets:
+            by_loop[sub.loop].append(sub)
+        for loop, subs in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subs, event)
+            except RuntimeError:
+                # Loop already closed; its connections are gone too
+                for sub in subs:
+                    self.unsubscribe(sub)
+        self.delivered += len(targets)
+        return len(targets)
+
+    def stats(self):
+        with self._lock:
+            connections = len(set().union(*self._channels.values())) if self._channels else 0
+            return {
+                "connections": connections,
+                "channels": len(self._channels),
+                "published": self.published,
+                "delivered": self.delivered,
+            }
+
+
+def _deliver_all(subs, event):
+    for sub in subs:
+        sub._deliver(event)
+
+
+def channels_for(user_id=None, driver_id=None, topics=()):
+    """Channels a client subscribes to from its query parameters"""
+    channels = {topic for topic in topics if topic in ("rides", "drivers")}
+    if user_id is not None:
+        channels.add(f"user:{user_id}")
+    if driver_id is not None:
+        channels.add(f"driver:{driver_id}")
+    return channels
@@ -0,0 +1,198 @@
+import math
+import re
+import threading
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEG = 0.01  # ~1.1 km per grid cell at the equator
+
+# The whole string must be coordinates: "Lat: 12.9716, Lng: 77.5946" (what the driver login
+# form sends) or two decimals "12.97,77.59". Numbers inside an address ("Flat 3, Tower 45")
+# are not coordinates, so nothing is searched for inside free text.
+_COORD_RE = re.compile(r"\s*(-?\d{1,3}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)\s*")
+_LABELLED_COORD_RE = re.compile(
+    r"\s*lat(?:itude)?\s*[:=]\s*(-?\d{1,3}(?:\.\d+)?)\s*,?\s*(?:lng|lon|long|longitude)\s*[:=]\s*(-?\d{1,3}(?:\.\d+)?)\s*",
+    re.IGNORECASE,
+)
+
+
+def parse_location(text):
+    """Parse a location string into a (lat, lng) tuple, or None unless the string is exactly coordinates"""
+    if text is None:
+        return None
+    if isinstance(text, (tuple, list)):
+        return float(text[0]), float(text[1])
+    match = _COORD_RE.fullmatch(text) or _LABELLED_COORD_RE.fullmatch(text)
+    if not match:
+        return None
+    lat, lng = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(a, b):
+    """Great-circle distance in km between two (lat, lng) points"""
+    lat1, lng1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lng2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class DriverIndex:
+    """Grid-bucketed index of online drivers for nearest-driver lookups.
+
+    Drivers whose location can't be resolved are kept in a FIFO side list so
+    they can still be matched once no located driver is left. resolve turns a
+    location into (lat, lng) or None; pass routing.resolve so place names
+    locate drivers the same way they locate pickups.
+    """
+
+    def __init__(self, cell_deg=CELL_DEG, resolve=parse_location):
+        self.cell_deg = cell_deg
+        self.resolve = resolve
+        self._cells = {}      # (row, col) -> {driver_id: (lat, lng)}
+        self._points = {}     # driver_id -> (lat, lng)
+        self._unlocated = {}  # driver_id -> None, insertion ordered
+        self._lock = threading.Lock()
+
+    def _cell(self, point):
+        return int(math.floor(point[0] / self.cell_deg)), int(math.floor(point[1] / self.cell_deg))
+
+    def __len__(self):
+        return len(self._points) + len(self._unlocated)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._points or driver_id in self._unlocated
+
+    def ids(self):
+        with self._lock:
+            return list(self._points) + list(self._unlocated)
+
+    def snapshot(self):
+        """Copy of {driver_id: (lat, lng) or None} for every indexed driver"""
+        with self._lock:
+            points = dict(self._points)
+            points.update(self._unlocated)
+            return points
+
+    def points(self, driver_ids):
+        """(lat, lng) of each driver id, None for unlocated or unindexed drivers"""
+        with self._lock:
+            return [self._points.get(driver_id) for driver_id in driver_ids]
+
+    def add(self, driver_id, location):
+        """Insert or move a driver; location may be a string or a (lat, lng) tuple"""
+        point = self.resolve(location)
+        with self._lock:
+            self._put(driver_id, point)
+
+    def move(self, driver_id, location):
+        """Update an indexed driver's location; drivers not in the index stay out"""
+        point = self.resolve(location)
+        with self._lock:
+            if driver_id not in self._points and driver_id not in self._unlocated:
+                return False
+            self._put(driver_id, point)
+            return True
+
+    def discard(self, driver_id):
+        with self._lock:
+            self._remove(driver_id)
+
+    def claim(self, driver_id):
+        """Remove a driver if still indexed; False means someone else claimed them first"""
+        with self._lock:
+            if driver_id not in self._points and driver_id not in self._unlocated:
+                return False
+            self._remove(driver_id)
+            return True
+
+    def _put(self, driver_id, point):
+        self._remove(driver_id)
+        if point is None:
+            self._unlocated[driver_id] = None
+        else:
+            self._points[driver_id] = point
+            self._cells.setdefault(self._cell(point), {})[driver_id] = point
+
+    def _remove(self, driver_id):
+        self._unlocated.pop(driver_id, None)
+        point = self._points.pop(driver_id, None)
+        if point is not None:
+            key = self._cell(point)
+            bucket = self._cells[key]
+            del bucket[driver_id]
+            if not bucket:
+                del self._cells[key]
+
+    def nearest(self, location, k=1, exclude=()):
+        """Return up to k driver ids ordered by distance from location"""
+        with self._lock:
+            return self._nearest(self.resolve(location), k, exclude)
+
+    def claim_nearest(self, location, exclude=()):
+        """Atomically remove and return the nearest driver id, or None if the index is empty"""
+        with self._lock:
+            found = self._nearest(self.resolve(location), 1, exclude)
+            if not found:
+                return None
+            self._remove(found[0])
+            return found[0]
+
+    def _nearest(self, point, k, exclude):
+        if point is None:
+            # No coordinates to rank by: fall back to insertion order
+            found = [d for d in list(self._points) + list(self._unlocated) if d not in exclude]
+            return found[:k]
+
+        best = []  # sorted [(distance_km, driver_id)]
+        row, col = self._cell(point)
+        # Smallest km width of one cell around the query, used to bound unvisited rings
+        cell_km = self.cell_deg * KM_PER_DEG * max(math.cos(math.radians(abs(point[0]) + self.cell_deg)), 0.01)
+        ring = 0
+        while True:
+            if (2 * ring + 1) ** 2 > 4 * len(self._cells):
+                # Rings have become wider than the occupied grid: scan the rest directly
+                for key, bucket in self._cells.items():
+                    if max(abs(key[0] - row), abs(key[1] - col)) >= ring:
+                        self._collect(point, bucket, best, k, exclude)
+                break
+            for key in self._ring(row, col, ring):
+                bucket = self._cells.get(key)
+                if bucket:
+                    self._collect(point, bucket, best, k, exclude)
+            # Anything in ring + 1 is at least `ring` whole cells away
+            if len(best) >= k and best[-1][0] <= ring * cell_km:
+                break
+            ring += 1
+
+        found = [driver_id for _, driver_id in best]
+        if len(found) < k:
+            found += [d for d in self._unlocated if d not in exclude][:k - len(found)]
+        return found
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    @staticmethod
+    def _collect(point, bucket, best, k, exclude):
+        for driver_id, other in bucket.items():
+            if driver_id in exclude:
+                continue
+            dist = haversine_km(point, other)
+            if len(best) < k:
+                best.append((dist, driver_id))
+                best.sort()
+            elif dist < best[-1][0]:
+                best[-1] = (dist, driver_id)
+                best.sort()
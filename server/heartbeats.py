@@ -0,0 +1,129 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, text, update
+
+# Rows per bulk UPDATE statement
+FLUSH_CHUNK = 1000
+
+
+def to_datetime(ts):
+    """Epoch seconds -> naive UTC datetime, matching how last_seen is stored"""
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class HeartbeatTable:
+    """In-memory last-seen times for known drivers.
+
+    Heartbeats only touch a dict; the dirty entries are written back to the
+    drivers table in bulk by `flush`, so the DB sees one statement per chunk
+    per flush interval instead of one commit per ping.
+    """
+
+    def __init__(self):
+        self._last_seen = {}  # driver_id -> epoch seconds
+        self._dirty = {}      # driver_id -> epoch seconds not yet written to the DB
+        self._lock = threading.Lock()
+        self.beats = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+
+    def __contains__(self, driver_id):
+        return driver_id in self._last_seen
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def seed(self, driver_id, last_seen):
+        """Record a last-seen time already persisted in the DB (datetime or epoch seconds)"""
+        ts = to_epoch(last_seen) if isinstance(last_seen, datetime) else last_seen
+        with self._lock:
+            self._last_seen[driver_id] = ts
+
+    def beat(self, driver_id, now=None):
+        """Absorb a heartbeat; returns False for drivers the table doesn't know yet"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if driver_id not in self._last_seen:
+                return False
+            self._last_seen[driver_id] = now
+            self._dirty[driver_id] = now
+            self.beats += 1
+        return True
+
+    def last_seen(self, driver_id, default=None):
+        """Last heartbeat as epoch seconds, falling back to default (datetime or epoch)"""
+        ts = self._last_seen.get(driver_id)
+        if ts is None and default is not None:
+            ts = to_epoch(default) if isinstance(default, datetime) else default
+        return ts
+
+    def is_alive(self, driver_id, timeout, default=None, now=None):
+        ts = self.last_seen(driver_id, default)
+        now = time.time() if now is None else now
+        return ts is not None and now - ts <= timeout
+
+    def drain(self):
+        """Take the pending {driver_id: epoch} writes"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def restore(self, dirty):
+        """Put back writes from a failed flush without clobbering newer beats"""
+        with self._lock:
+            for driver_id, ts in dirty.items():
+                if ts > self._dirty.get(driver_id, 0):
+                    self._dirty[driver_id] = ts
+
+    def flush(self, db, table):
+        """Write pending last-seen times to `table` in bulk. Returns rows written."""
+        dirty = self.drain()
+        if not dirty:
+            return 0
+        rows = [(driver_id, to_datetime(ts)) for driver_id, ts in dirty.items()]
+        try:
+            for start in range(0, len(rows), FLUSH_CHUNK):
+                bulk_update_last_seen(db, table, rows[start:start + FLUSH_CHUNK])
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.restore(dirty)
+            raise
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    def stats(self):
+        return {
+            "tracked_drivers": len(self._last_seen),
+            "pending_writes": len(self._dirty),
+            "heartbeats": self.beats,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+        }
+
+
+def bulk_update_last_seen(db, table, rows):
+    """UPDATE last_seen for many [(driver_id, datetime)] rows in one statement"""
+    if db.get_bind().dialect.name == "postgresql":
+        values = ", ".join(
+            f"(CAST(:id{i} AS INTEGER), CAST(:ts{i} AS TIMESTAMP))" for i in range(len(rows))
+        )
+        params = {}
+        for i, (driver_id, last_seen) in enumerate(rows):
+            params[f"id{i}"] = driver_id
+            params[f"ts{i}"] = last_seen
+        db.execute(text(
+            f"UPDATE {table.name} AS d SET last_seen = v.last_seen "
+            f"FROM (VALUES {values}) AS v(id, last_seen) WHERE d.id = v.id"
+        ), params)
+    else:
+        # No UPDATE ... FROM (VALUES) on other backends: fall back to a single executemany
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(last_seen=bindparam("b_last_seen"))
+        db.execute(stmt, [{"b_id": driver_id, "b_last_seen": last_seen} for driver_id, last_seen in rows])
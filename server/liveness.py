@@ -0,0 +1,85 @@
+import heapq
+import math
+import threading
+import time
+
+
+class LivenessTracker:
+    """Online drivers bucketed by the whole second their heartbeat deadline falls in.
+
+    A heartbeat moves its driver to a later bucket in O(1), and `pop_expired`
+    only visits buckets whose second has passed, so a sweep costs
+    O(expired drivers) rather than O(online drivers).
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._buckets = {}   # deadline second -> set of driver ids
+        self._deadline = {}  # driver_id -> deadline second
+        self._order = []     # heap of bucket seconds
+        self._lock = threading.Lock()
+        self.expired_total = 0
+
+    def __contains__(self, driver_id):
+        return driver_id in self._deadline
+
+    def __len__(self):
+        return len(self._deadline)
+
+    def watch(self, driver_id, last_seen=None):
+        """Start (or refresh) tracking a driver last seen at last_seen (epoch seconds)"""
+        last_seen = time.time() if last_seen is None else last_seen
+        deadline = math.ceil(last_seen + self.timeout)
+        with self._lock:
+            self._move(driver_id, deadline)
+
+    def touch(self, driver_id, last_seen=None):
+        """Push back the deadline of a tracked driver; untracked drivers are ignored"""
+        last_seen = time.time() if last_seen is None else last_seen
+        deadline = math.ceil(last_seen + self.timeout)
+        with self._lock:
+            current = self._deadline.get(driver_id)
+            if current is not None and current != deadline:
+                self._move(driver_id, deadline)
+
+    def unwatch(self, driver_id):
+        with self._lock:
+            self._drop(driver_id)
+
+    def pop_expired(self, now=None):
+        """Stop tracking and return every driver whose deadline is before now"""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._order and self._order[0] < now:
+                second = heapq.heappop(self._order)
+                for driver_id in self._buckets.pop(second, ()):
+                    del self._deadline[driver_id]
+                    expired.append(driver_id)
+            self.expired_total += len(expired)
+        return expired
+
+    def stats(self):
+        return {
+            "watched_drivers": len(self._deadline),
+            "deadline_buckets": len(self._buckets),
+            "expired_total": self.expired_total,
+        }
+
+    def _move(self, driver_id, deadline):
+        self._drop(driver_id)
+        bucket = self._buckets.get(deadline)
+        if bucket is None:
+            bucket = self._buckets[deadline] = set()
+            heapq.heappush(self._order, deadline)
+        bucket.add(driver_id)
+        self._deadline[driver_id] = deadline
+
+    def _drop(self, driver_id):
+        deadline = self._deadline.pop(driver_id, None)
+        if deadline is not None:
+            bucket = self._buckets[deadline]
+            bucket.discard(driver_id)
+            # Leave the emptied second in the heap; pop_expired skips it for free
+            if not bucket:
+                del self._buckets[deadline]
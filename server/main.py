@@ -1,17 +1,114 @@
-from fastapi import FastAPI, Depends, Response
+from fastapi import FastAPI, Depends, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import datetime
-import threading, time, subprocess, json
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import asyncio, math, os, threading, time, json
 
-from db import SessionLocal, engine
-import models, schemas
+from admission import BacklogGate, RateLimiter
+from cache import RideCache
+from containers import RIDE_INTERFACE_PATH, Provisioner, runtime_from_env
+from db import AsyncSessionLocal, SessionLocal, async_engine, engine
+from dispatch import (ACTIVE_RIDE_STATUSES, active_ports_stmt, assign_ride, claim_driver, claim_driver_async,
+                      complete_ride, is_port_conflict, pending_count_stmt, pending_rides_stmt, release_driver,
+                      unclaim_driver, unclaim_driver_async)
+from events import EventBus, channels_for
+from geo import DriverIndex
+from heartbeats import HeartbeatTable, to_epoch
+from liveness import LivenessTracker
+from matching import match
+from metrics import (CONTAINER_CREATE_SECONDS, RIDES_ARCHIVED, RIDES_ASSIGNED, Gauge, MetricsMiddleware, instrument_engine,
+                     registry, timed)
+from pagination import decode_cursor, encode_cursor, etag_for
+from ports import PortAllocator
+from profiler import SamplingProfiler
+from retention import archive_completed_rides
+from routing import RouteModel, resolve
+from scheduler import TripScheduler
+import bulk, models, schema, schemas
 
-# Create tables
-models.Base.metadata.drop_all(bind=engine)
-models.Base.metadata.create_all(bind=engine)
+# Create or upgrade tables, keeping existing rows; RESET_DB=1 wipes them first (development only)
+if os.getenv("RESET_DB", "0") in ("1", "true", "True"):
+    schema.reset(engine)
+migrations_applied = schema.bootstrap(engine)
+if migrations_applied:
+    print(f"🗄️ Schema migrations applied: {migrations_applied}")
 
-app = FastAPI()
+# Seconds between batch assignment passes over the pending backlog
+ASSIGN_TICK_SECONDS = float(os.getenv("ASSIGN_TICK_SECONDS", "2"))
+# Pending rides one assignment pass locks and matches
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "1000"))
+# Times a booking retries on a port another worker process already holds
+PORT_CONFLICT_RETRIES = 3
+# Bookings each user may make per second, with short bursts up to BOOK_BURST
+BOOK_RATE_PER_SECOND = float(os.getenv("BOOK_RATE_PER_SECOND", "0.5"))
+BOOK_BURST = int(os.getenv("BOOK_BURST", "5"))
+# Pending rides, counting bookings still being processed, beyond which /book-ride answers 429 (0 disables)
+PENDING_BACKLOG_LIMIT = int(os.getenv("PENDING_BACKLOG_LIMIT", "1000"))
+# Bookings writing to the DB at once; the rest wait their turn rather than being turned away.
+# A few keeps SQLite busy without lock timeouts; raise it for Postgres (0 = no limit)
+BOOK_MAX_IN_FLIGHT = int(os.getenv("BOOK_MAX_IN_FLIGHT", "4"))
+# Worker processes sharing the database (uvicorn --workers reads the same variable)
+WORKER_PROCESSES = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Trip length used when the pickup or destination can't be located on the map
+TRIP_DURATION_MINUTES = 1
+# Rides per /queue page unless ?limit= asks for more (up to the max)
+QUEUE_PAGE_SIZE = 100
+QUEUE_MAX_PAGE_SIZE = 1000
+# updated_at is stamped before commit, so a slow transaction can land behind a cursor already
+# handed out; ?since= cursors are rewound by this much and clients drop rows they've seen
+QUEUE_SINCE_WINDOW_SECONDS = float(os.getenv("QUEUE_SINCE_WINDOW_SECONDS", "5"))
+# Drivers without a heartbeat for this long are marked offline
+DRIVER_TIMEOUT_SECONDS = 10
+# Seconds between liveness sweeps that mark silent drivers offline
+LIVENESS_SWEEP_SECONDS = float(os.getenv("LIVENESS_SWEEP_SECONDS", "1"))
+# Seconds between bulk writes of buffered heartbeats to the drivers table
+HEARTBEAT_FLUSH_SECONDS = float(os.getenv("HEARTBEAT_FLUSH_SECONDS", "1"))
+# Request/DB/background timings for /metrics; set METRICS_ENABLED=0 to drop the hooks entirely
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+# Exposes /debug/profiler/*, a sampling profiler that only runs while started
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") in ("1", "true", "True")
+# Seconds between passes that sync the container registry and reap orphans and leaked ports
+CONTAINER_RECONCILE_SECONDS = float(os.getenv("CONTAINER_RECONCILE_SECONDS", "30"))
+# Completed rides stay in ride_queue (and /queue) this long before moving to ride_history (0 keeps them)
+RIDE_RETENTION_SECONDS = float(os.getenv("RIDE_RETENTION_SECONDS", "3600"))
+# Seconds between retention passes, and rides moved per transaction
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "60"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+@asynccontextmanager
+async def lifespan(app):
+    stop = threading.Event()
+    warmed = warm_start()
+    if any(warmed.values()):
+        print(f"♻️ Warm start: {warmed}")
+    trip_scheduler.start()
+    if not SHARED_RIDE_INTERFACE:
+        provisioner.start()
+    try:
+        # Fill the container registry and mark leftovers from a previous run for the next pass
+        reconcile_containers()
+    except Exception as e:
+        print(f"❌ Container reconciliation failed: {e}")
+    threading.Thread(target=run_assignment_loop, args=(stop,), daemon=True).start()
+    threading.Thread(target=run_heartbeat_flush_loop, args=(stop,), daemon=True).start()
+    threading.Thread(target=run_liveness_sweep_loop, args=(stop,), daemon=True).start()
+    threading.Thread(target=run_container_reconcile_loop, args=(stop,), daemon=True).start()
+    if RIDE_RETENTION_SECONDS > 0:
+        threading.Thread(target=run_archive_loop, args=(stop,), daemon=True).start()
+    yield
+    stop.set()
+    trip_scheduler.stop()
+    provisioner.stop()
+    provisioner.drain_pool()
+    flush_heartbeats()
+
+app = FastAPI(lifespan=lifespan)
 
 # ✅ CORS setup
 app.add_middleware(
@@ -20,86 +117,197 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Since-Cursor"],
 )
 
+# 📈 Metrics: outermost middleware so latency includes CORS, plus per-statement DB hooks
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
+# Online drivers bucketed by location, used for nearest-driver matching
+driver_index = DriverIndex(resolve=resolve)
+
+# Pickup ETAs and trip durations, memoized per pair of map cells
+route_model = RouteModel()
+
+# Last-seen times absorbed from /heartbeat, written back to the DB in bulk
+heartbeats = HeartbeatTable()
+
+# Heartbeat deadlines of online drivers, expired by the liveness sweeper
+liveness = LivenessTracker(DRIVER_TIMEOUT_SECONDS)
+
+# Ride and driver status changes pushed to /ws and /events subscribers
+event_bus = EventBus()
+
+booking_limiter = RateLimiter(BOOK_RATE_PER_SECOND, BOOK_BURST)
+backlog_gate = BacklogGate(PENDING_BACKLOG_LIMIT, ASSIGN_TICK_SECONDS)
+# Queue for the booking insert, so overlapping bookings serialize on it instead of on DB locks;
+# (event loop, semaphore), made on first use since Python 3.9 binds a semaphore to the loop it was created on
+_booking_writers = None
+
+@asynccontextmanager
+async def _no_limit():
+    yield
+
+def booking_writers():
+    """Context manager holding one of the BOOK_MAX_IN_FLIGHT booking insert slots"""
+    global _booking_writers
+    if BOOK_MAX_IN_FLIGHT <= 0:
+        return _no_limit()
+    loop = asyncio.get_running_loop()
+    if _booking_writers is None or _booking_writers[0] is not loop:
+        _booking_writers = (loop, asyncio.Semaphore(BOOK_MAX_IN_FLIGHT))
+    return _booking_writers[1]
+
+# Details served by /ride/{id} and /ride-by-port/{port}, invalidated on every ride transition
+# (only within this process, so it is off by default when several workers share the DB)
+ride_cache = RideCache(int(os.getenv("RIDE_CACHE_SIZE", "10000" if WORKER_PROCESSES == 1 else "0")))
+
+def driver_row(driver):
+    return jsonable_encoder({c.name: getattr(driver, c.name) for c in models.Driver.__table__.columns})
+
+def ride_row(ride):
+    return jsonable_encoder({c.name: getattr(ride, c.name) for c in models.RideQueue.__table__.columns})
+
+def publish_driver(row):
+    """Push a driver row (see driver_row) to driver-list subscribers and the driver itself"""
+    event_bus.publish({"type": "driver", "driver": row}, ["drivers", f"driver:{row['id']}"])
+
+def publish_ride(row):
+    """Push a ride row (see ride_row) to ride-list subscribers, its user and its driver"""
+    channels = ["rides", f"user:{row['user_id']}"]
+    if row["driver_id"]:
+        channels.append(f"driver:{row['driver_id']}")
+    event_bus.publish({"type": "ride", "ride": row}, channels)
+
+def ride_changed(row):
+    """Record a ride transition: drop cached details, update the port index, push the row"""
+    ride_cache.invalidate(row["id"])
+    ride_cache.track_port(row["id"], row["port"], row["status"] in ACTIVE_RIDE_STATUSES)
+    publish_ride(row)
+
+async def load_ride_details(db: AsyncSession, ride_id):
+    """Ride with its user and driver names in one joined query, served from ride_cache when possible"""
+    details = ride_cache.get(ride_id)
+    if details is not None:
+        return details
+    ticket = ride_cache.ticket()
+    result = await db.execute(
+        select(models.RideQueue)
+        .options(joinedload(models.RideQueue.user), joinedload(models.RideQueue.driver))
+        .where(models.RideQueue.id == ride_id)
+    )
+    ride = result.scalars().first()
+    if not ride:
+        return await load_archived_ride_details(db, ride_id)
+    details = {
+        "ride_id": ride.id,
+        "container_name": ride.container_name or f"ride-{ride.id}",
+        "user_name": ride.user.name if ride.user else "Unknown",
+        "driver_name": ride.driver.name if ride.driver else "Not assigned",
+        "start": ride.start,
+        "destination": ride.destination,
+        "status": ride.status,
+        "port": ride.port
+    }
+    ride_cache.put(ride_id, details, ticket)
+    return details
+
+async def load_archived_ride_details(db: AsyncSession, ride_id):
+    """Details of a ride the retention job already moved to ride_history, or None"""
+    history = models.RideHistory
+    row = (await db.execute(
+        select(history, models.User.name, models.Driver.name)
+        .outerjoin(models.User, models.User.id == history.user_id)
+        .outerjoin(models.Driver, models.Driver.id == history.driver_id)
+        .where(history.id == ride_id)
+    )).first()
+    if not row:
+        return None
+    ride, user_name, driver_name = row
+    return {
+        "ride_id": ride.id,
+        "container_name": ride.container_name or f"ride-{ride.id}",
+        "user_name": user_name or "Unknown",
+        "driver_name": driver_name or "Not assigned",
+        "start": ride.start,
+        "destination": ride.destination,
+        "status": ride.status,
+        "port": ride.port
+    }
+
+async def claim_nearest_driver(db: AsyncSession, location):
+    """Claim the nearest online driver to location from the index, or None"""
+    while True:
+        driver_id = driver_index.claim_nearest(location)
+        if driver_id is None:
+            return None
+        # The index can lag behind the table or another worker may have taken the driver;
+        # the conditional claim skips both
+        if await claim_driver_async(db, driver_id):
+            return await db.get(models.Driver, driver_id)
+
 # Port management for ride containers
-USED_PORTS = set()
-BASE_PORT = 7000
+BASE_PORT = int(os.getenv("RIDE_PORT_START", "7000"))
+PORT_COUNT = int(os.getenv("RIDE_PORT_COUNT", "1000"))
+# "container" runs an nginx container per ride; "shared" serves every ride page from this app at
+# /rides/{ride_id}, keeping ports only as ride keys for /ride-by-port
+RIDE_INTERFACE_MODE = os.getenv("RIDE_INTERFACE_MODE", "container")
+SHARED_RIDE_INTERFACE = RIDE_INTERFACE_MODE == "shared"
+# Ride keys are never bound in shared mode, so they span the whole integer column instead of
+# RIDE_PORT_COUNT and active rides never run out of them
+RIDE_KEY_COUNT = 2**31 - 1 - BASE_PORT
+# Public address of this API, used for ride_url in shared mode
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://localhost:8000")
+port_allocator = PortAllocator(BASE_PORT, RIDE_KEY_COUNT if SHARED_RIDE_INTERFACE else PORT_COUNT,
+                               probe=not SHARED_RIDE_INTERFACE)
+
+# Ride containers are created, renamed and removed by a background worker, never on the request path
+RIDE_POOL_SIZE = int(os.getenv("RIDE_POOL_SIZE", "0"))
+provisioner = Provisioner(runtime_from_env(), port_allocator, pool_size=RIDE_POOL_SIZE,
+                          max_jobs=int(os.getenv("RIDE_PROVISION_QUEUE", "1000")),
+                          on_create=CONTAINER_CREATE_SECONDS.observe)
 
 def get_next_available_port():
-    """Get the next available port starting from 7000"""
-    import socket
-    port = BASE_PORT
-    while True:
-        if port not in USED_PORTS:
-            # Check if port is actually free
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.bind(('', port))
-                USED_PORTS.add(port)
-                return port
-            except OSError:
-                pass  # Port is busy, try next
-        port += 1
+    """Get a free ride port (warm container first), or None if all are taken"""
+    if SHARED_RIDE_INTERFACE:
+        return port_allocator.allocate()
+    return provisioner.acquire()
 
 def release_port(port):
     """Release a port when ride is completed"""
-    USED_PORTS.discard(port)
+    port_allocator.release(port)
 
-def create_ride_container(ride_id, port):
-    """Create a Docker container for a specific ride"""
-    try:
-        container_name = f"ride-{ride_id}"
-        
-        # Remove existing container if it exists
-        subprocess.run(["docker", "rm", "-f", container_name], capture_output=True)
-        
-        # Get the absolute path to the ride interface
-        import os
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        ride_interface_path = os.path.join(os.path.dirname(current_dir), "ride-interface")
-        
-        # Create a container with nginx serving our ride interface
-        cmd = [
-            "docker", "run", "-d",
-            "--name", container_name,
-            "-p", f"{port}:80",
-            "-v", f"{ride_interface_path}:/usr/share/nginx/html:ro",
-            "-e", f"RIDE_ID={ride_id}",
-            "-e", f"PORT={port}",
-            "nginx:alpine"
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print(f"✅ Created ride container {container_name} on port {port}")
-            print(f"🌐 Ride interface available at: http://localhost:{port}")
-            return True
-        else:
-            print(f"❌ Failed to create container: {result.stderr}")
-            release_port(port)
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error creating container: {e}")
+def unclaim_port(port, reusable=True):
+    """Hand back a port from get_next_available_port whose ride didn't commit.
+
+    Pass reusable=False when another worker's ride holds it: the port stays
+    allocated until reconciliation sees that ride finish.
+    """
+    if not SHARED_RIDE_INTERFACE:
+        provisioner.unclaim(port, reusable)
+    elif reusable:
         release_port(port)
-        return False
+
+def create_ride_container(ride_id, port):
+    """Queue the Docker container for a specific ride"""
+    if not SHARED_RIDE_INTERFACE:
+        provisioner.provision(ride_id, port)
 
 def remove_ride_container(ride_id, port):
-    """Remove Docker container when ride is completed"""
-    try:
-        container_name = f"ride-{ride_id}"
-        
-        # Stop and remove container
-        subprocess.run(["docker", "stop", container_name], capture_output=True)
-        subprocess.run(["docker", "rm", container_name], capture_output=True)
-        
+    """Queue removal of a ride's container; its port is freed once it is gone"""
+    if SHARED_RIDE_INTERFACE:
         release_port(port)
-        print(f"🗑️ Removed ride container {container_name} from port {port}")
-        
-    except Exception as e:
-        print(f"❌ Error removing container: {e}")
+    else:
+        provisioner.release(ride_id, port)
+
+def ride_url(ride_id, port):
+    """Where the ride interface for a ride is served in the current mode"""
+    if SHARED_RIDE_INTERFACE:
+        return f"{PUBLIC_API_URL}/rides/{ride_id}"
+    return f"http://localhost:{port}"
 
 # Dependency to get DB session
 def get_db():
@@ -109,6 +317,11 @@ def get_db():
     finally:
         db.close()
 
+# Async session for the hot endpoints, so they don't hold a threadpool worker while waiting on the DB
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 
 # ------------------ USERS ------------------
 
@@ -124,6 +337,14 @@ def register_user(name: str, email: str, db: Session = Depends(get_db)):
     return {"message": "User registered 👤", "user_id": user.id}
 
 
+@app.post("/bulk/users")
+async def bulk_users(request: Request, return_ids: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """NDJSON of {"name", "email"}, upserted by email in batches; return_ids adds {email: user_id}"""
+    report = await bulk.import_ndjson(request.stream(), bulk.user_row, lambda batch, report: bulk.upsert_users(db, batch, report),
+                                      keep_ids=return_ids)
+    return report.as_dict()
+
+
 # ------------------ DRIVERS ------------------
 
 @app.post("/register-driver")
@@ -132,7 +353,11 @@ def register_driver(name: str, email: str, location: str, db: Session = Depends(
     if existing:
         existing.status = "offline"
         existing.last_seen = datetime.utcnow()
+        row = driver_row(existing)
         db.commit()
+        liveness.unwatch(existing.id)
+        driver_index.discard(existing.id)
+        publish_driver(row)
         return {"message": "Driver already exists", "driver_id": existing.id}
     driver = models.Driver(name=name, email=email, location=location, status="offline", last_seen=datetime.utcnow())
     db.add(driver)
@@ -141,6 +366,20 @@ def register_driver(name: str, email: str, location: str, db: Session = Depends(
     return {"message": "Driver registered 🚖", "driver_id": driver.id}
 
 
+@app.post("/bulk/drivers")
+async def bulk_drivers(request: Request, return_ids: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """NDJSON of {"name", "email", "location"}, upserted by email in batches; return_ids adds {email: driver_id}.
+
+    New drivers start offline; existing ones keep their status, and online
+    ones are moved to the new location in the matching index.
+    """
+    async def write(batch, report):
+        for driver_id, _, location in await bulk.upsert_drivers(db, batch, report):
+            driver_index.move(driver_id, location)
+
+    return (await bulk.import_ndjson(request.stream(), bulk.driver_row, write, keep_ids=return_ids)).as_dict()
+
+
 @app.post("/go-online")
 def go_online(driver_id: int, db: Session = Depends(get_db)):
     driver = db.query(models.Driver).filter(models.Driver.id == driver_id).first()
@@ -148,8 +387,12 @@ def go_online(driver_id: int, db: Session = Depends(get_db)):
         return {"error": "Driver not found"}
     driver.status = "online"
     driver.last_seen = datetime.utcnow()
+    row = driver_row(driver)
     db.commit()
-    assign_pending_rides(db)
+    heartbeats.seed(driver.id, driver.last_seen)
+    liveness.watch(driver.id)
+    driver_index.add(driver.id, driver.location)
+    publish_driver(row)
     return {"message": f"Driver {driver.name} is now online ✅"}
 
 
@@ -159,36 +402,39 @@ def go_offline(driver_id: int, db: Session = Depends(get_db)):
     if not driver:
         return {"error": "Driver not found"}
     driver.status = "offline"
+    row = driver_row(driver)
     db.commit()
+    liveness.unwatch(driver.id)
+    driver_index.discard(driver.id)
+    publish_driver(row)
     return {"message": f"Driver {driver.name} is now offline ❌"}
 
 
 @app.post("/heartbeat")
-def heartbeat(driver_id: int, db: Session = Depends(get_db)):
-    driver = db.query(models.Driver).filter(models.Driver.id == driver_id).first()
+async def heartbeat(driver_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Fast path: known drivers are only touched in memory and flushed in bulk
+    if heartbeats.beat(driver_id):
+        liveness.touch(driver_id)
+        return {"message": "Driver is alive"}
+
+    driver = await db.get(models.Driver, driver_id)
     if not driver:
         return {"error": "Driver not found"}
-    driver.last_seen = datetime.utcnow()
-    db.commit()
+    heartbeats.seed(driver.id, driver.last_seen)
+    heartbeats.beat(driver.id)
+    # Re-sync the index in case this driver was dropped or never added
+    if driver.status == "online":
+        liveness.watch(driver.id)
+        driver_index.add(driver.id, driver.location)
     return {"message": "Driver is alive"}
 
 
 @app.get("/available-drivers")
-def available_drivers(db: Session = Depends(get_db)):
-    from datetime import timedelta
-    
-    # Mark drivers as offline if they haven't sent heartbeat in 10 seconds
-    timeout = datetime.utcnow() - timedelta(seconds=10)
-    inactive_drivers = db.query(models.Driver).filter(
-        models.Driver.status == "online",
-        models.Driver.last_seen < timeout
-    ).all()
-    
-    for driver in inactive_drivers:
-        driver.status = "offline"
-    db.commit()
-    
-    return db.query(models.Driver).filter(models.Driver.status == "online").all()
+async def available_drivers(response: Response, db: AsyncSession = Depends(get_async_db)):
+    # Stale drivers are expired by the liveness sweeper, so this is a plain read
+    response.headers["Cache-Control"] = f"max-age={max(1, int(LIVENESS_SWEEP_SECONDS))}"
+    result = await db.execute(select(models.Driver).where(models.Driver.status == "online"))
+    return [driver_row(driver) for driver in result.scalars()]
 
 
 # ------------------ RIDES ------------------
@@ -199,156 +445,423 @@ def home():
 
 
 @app.get("/queue")
-def get_queue(db: Session = Depends(get_db)):
-    """Returns all rides in queue (pending, assigned, completed)."""
-    return db.query(models.RideQueue).order_by(models.RideQueue.id).all()
+def get_queue(
+    request: Request,
+    response: Response,
+    status: str = None,
+    user_id: int = None,
+    driver_id: int = None,
+    created_after: datetime = None,
+    created_before: datetime = None,
+    cursor: int = None,
+    since: str = None,
+    limit: int = QUEUE_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Returns rides in queue (pending, assigned, completed), filtered and one page at a time.
+
+    status takes a comma-separated list. Rides come in id order; pass the
+    X-Next-Cursor header back as ?cursor= for the next page. ?since= (from
+    X-Since-Cursor) instead returns rides changed after that point, oldest
+    change first; keep paging while a page comes back full. The last page's
+    cursor is rewound by QUEUE_SINCE_WINDOW_SECONDS, so recent changes repeat
+    on the next poll and clients should merge rows by id and updated_at.
+    """
+    limit = max(1, min(limit, QUEUE_MAX_PAGE_SIZE))
+    query = db.query(models.RideQueue)
+    if status:
+        statuses = status.split(",")
+        unknown = set(statuses) - set(models.RIDE_STATUSES)
+        if unknown:
+            response.status_code = 400
+            return {"error": f"Unknown status {', '.join(sorted(unknown))}; expected one of {', '.join(models.RIDE_STATUSES)}"}
+        query = query.filter(models.RideQueue.status.in_(statuses))
+    if user_id is not None:
+        query = query.filter(models.RideQueue.user_id == user_id)
+    if driver_id is not None:
+        query = query.filter(models.RideQueue.driver_id == driver_id)
+    if created_after is not None:
+        query = query.filter(models.RideQueue.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(models.RideQueue.created_at < created_before)
+
+    if since:
+        try:
+            changed_at, last_id = decode_cursor(since)
+        except ValueError as e:
+            response.status_code = 400
+            return {"error": str(e)}
+        query = query.filter(tuple_(models.RideQueue.updated_at, models.RideQueue.id) > (changed_at, last_id))
+        query = query.order_by(models.RideQueue.updated_at, models.RideQueue.id)
+    else:
+        # Changes from here on will show up in ?since= of this cursor, so clients don't miss any
+        changed_at, last_id = datetime.utcnow(), 0
+        if cursor is not None:
+            query = query.filter(models.RideQueue.id > cursor)
+        query = query.order_by(models.RideQueue.id)
+
+    rows = [ride_row(ride) for ride in query.limit(limit).all()]
+    if since and rows:
+        changed_at, last_id = datetime.fromisoformat(rows[-1]["updated_at"]), rows[-1]["id"]
+    if len(rows) < limit or not since:
+        # Caught up: step back over changes that may still be committing
+        settled = datetime.utcnow() - timedelta(seconds=QUEUE_SINCE_WINDOW_SECONDS)
+        if settled < changed_at:
+            changed_at, last_id = settled, 0
+
+    etag = etag_for(rows, str(request.query_params))
+    headers = {"ETag": etag, "X-Since-Cursor": encode_cursor(changed_at, last_id)}
+    if len(rows) == limit and not since:
+        headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return rows
+
+@app.get("/next-ride")
+async def next_ride(db: AsyncSession = Depends(get_async_db)):
+    """Oldest ride still waiting for a driver, without taking it off the queue"""
+    ride = (await db.execute(
+        select(models.RideQueue).where(models.RideQueue.status == "pending").order_by(models.RideQueue.id).limit(1)
+    )).scalar()
+    if not ride:
+        return {"message": "No pending rides"}
+    return {"ride_id": ride.id, "user_id": ride.user_id, "start": ride.start,
+            "destination": ride.destination, "status": ride.status}
+
+@app.get("/eta")
+def get_eta(start: str, response: Response, destination: str = None, k: int = 5):
+    """Quote for a pickup: ETA of the k nearest idle drivers and the trip's length, without booking"""
+    pickup = resolve(start)
+    if pickup is None:
+        response.status_code = 400
+        return {"error": "Unknown pickup location, send coordinates or a known place name"}
+    driver_ids = driver_index.nearest(pickup, max(1, min(k, 50)))
+    etas = route_model.pickup_etas(pickup, driver_index.points(driver_ids))
+    drivers = sorted(
+        ({"driver_id": driver_id, "eta_seconds": round(eta) if math.isfinite(eta) else None}
+         for driver_id, eta in zip(driver_ids, etas.tolist())),
+        key=lambda d: math.inf if d["eta_seconds"] is None else d["eta_seconds"],
+    )
+    trip = route_model.route(pickup, destination) if destination else None
+    return {
+        "start": pickup,
+        "destination": resolve(destination) if destination else None,
+        "drivers": drivers,
+        "pickup_eta_seconds": drivers[0]["eta_seconds"] if drivers else None,
+        "trip_km": round(trip[0], 2) if trip else None,
+        "trip_seconds": round(route_model.trip_seconds(pickup, destination)) if trip else None,
+    }
 
 @app.get("/ride/{ride_id}")
-def get_ride(ride_id: int, db: Session = Depends(get_db)):
+async def get_ride(ride_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get ride details by ID"""
-    ride = db.query(models.RideQueue).filter(models.RideQueue.id == ride_id).first()
-    if not ride:
+    details = await load_ride_details(db, ride_id)
+    if not details:
         return {"error": "Ride not found"}
     
-    user = db.query(models.User).filter(models.User.id == ride.user_id).first()
-    driver = db.query(models.Driver).filter(models.Driver.id == ride.driver_id).first() if ride.driver_id else None
-    
     return {
-        "ride_id": ride.id,
-        "user_name": user.name if user else "Unknown",
-        "driver_name": driver.name if driver else "Not assigned",
-        "start": ride.start,
-        "destination": ride.destination,
-        "status": ride.status
+        "ride_id": details["ride_id"],
+        "user_name": details["user_name"],
+        "driver_name": details["driver_name"],
+        "start": details["start"],
+        "destination": details["destination"],
+        "status": details["status"]
     }
 
 @app.get("/ride-by-port/{port}")
-def get_ride_by_port(port: int, db: Session = Depends(get_db)):
+async def get_ride_by_port(port: int, db: AsyncSession = Depends(get_async_db)):
     """Get ride details by port number"""
-    # Query for active rides (not completed) with this port
-    ride = db.query(models.RideQueue).filter(
-        models.RideQueue.port == port,
-        models.RideQueue.status.in_(["pending", "assigned"])
-    ).first()
-    
-    if not ride:
+    # Only active rides (not completed) are in the port index
+    ride_id = ride_cache.ride_for_port(port)
+    details = await load_ride_details(db, ride_id) if ride_id else None
+    stale = not details or details["status"] not in ACTIVE_RIDE_STATUSES
+    if stale and (ride_id is not None or WORKER_PROCESSES > 1):
+        # Booked through another worker, or the indexed ride finished there and its port was reused
+        active_id = (await db.execute(select(models.RideQueue.id).where(
+            models.RideQueue.port == port,
+            models.RideQueue.status.in_(ACTIVE_RIDE_STATUSES)
+        ))).scalar()
+        if ride_id is not None:
+            ride_cache.track_port(ride_id, port, active=False)
+        if active_id:
+            ride_cache.track_port(active_id, port, active=True)
+        details = await load_ride_details(db, active_id) if active_id else None
+
+    if not details or details["status"] not in ACTIVE_RIDE_STATUSES:
         return {"error": "Ride not found for this port"}
     
-    user = db.query(models.User).filter(models.User.id == ride.user_id).first()
-    driver = db.query(models.Driver).filter(models.Driver.id == ride.driver_id).first() if ride.driver_id else None
-    
-    print(f"📍 Fetching ride by port {port}: Ride ID={ride.id}, Container={ride.container_name}, User={user.name if user else 'Unknown'}, Driver={driver.name if driver else 'Not assigned'}")
+    print(f"📍 Fetching ride by port {port}: Ride ID={details['ride_id']}, Container={details['container_name']}, User={details['user_name']}, Driver={details['driver_name']}")
     
     return {
-        "ride_id": ride.id,
-        "container_name": ride.container_name or f"ride-{ride.id}",
-        "user_name": user.name if user else "Unknown",
-        "driver_name": driver.name if driver else "Not assigned",
-        "start": ride.start,
-        "destination": ride.destination,
-        "status": ride.status
+        "ride_id": details["ride_id"],
+        "container_name": details["container_name"],
+        "user_name": details["user_name"],
+        "driver_name": details["driver_name"],
+        "start": details["start"],
+        "destination": details["destination"],
+        "status": details["status"]
     }
 
+# Ride page template, read once; /rides/{ride_id} injects the ride's details into it
+with open(os.path.join(RIDE_INTERFACE_PATH, "index.html")) as f:
+    RIDE_PAGE = f.read()
+
+@app.get("/rides/{ride_id}", response_class=HTMLResponse)
+async def ride_page(ride_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Ride interface served by the API itself, with the ride context inlined instead of fetched"""
+    details = await load_ride_details(db, ride_id)
+    if not details:
+        return HTMLResponse("<h1>Ride not found</h1>", status_code=404)
+    # Escape "</" so ride fields can't close the script tag
+    context = json.dumps(details).replace("</", "<\\/")
+    return RIDE_PAGE.replace("<script>", f"<script>window.RIDE_CONTEXT = {context};</script>\n    <script>", 1)
+
+@app.get("/ride-ports")
+def get_ride_ports():
+    """Ride port allocator usage and exhaustion counts"""
+    return port_allocator.stats()
+
+@app.get("/ride-provisioner")
+def get_ride_provisioner():
+    """Container provisioning queue depth, warm pool and create timings"""
+    return provisioner.stats()
+
+# Live state read at scrape time; the *_total ones are running counts kept by each component
+for name, help, read, kind in (
+    ("process_threads", "Live threads in this process", threading.active_count, "gauge"),
+    ("trip_timers_scheduled", "In-flight trips waiting on the trip scheduler", lambda: len(trip_scheduler), "gauge"),
+    ("drivers_indexed", "Idle online drivers in the matching index", lambda: len(driver_index), "gauge"),
+    ("pending_ride_backlog", "Pending rides as seen by admission control", lambda: backlog_gate.stats()["pending"], "gauge"),
+    ("bookings_in_flight", "Bookings admitted and still being processed", lambda: backlog_gate.stats()["in_flight"], "gauge"),
+    ("bookings_rejected_total", "Bookings turned away with 429", lambda: backlog_gate.rejected + booking_limiter.limited, "counter"),
+    ("ride_ports_allocated", "Ride ports currently allocated", lambda: port_allocator.stats()["allocated"], "gauge"),
+    ("provisioner_queued_jobs", "Container jobs waiting for the provisioner", lambda: provisioner.stats()["queued_jobs"], "gauge"),
+    ("ride_containers_idle", "Warm pooled containers ready to claim", lambda: provisioner.stats()["idle_containers"], "gauge"),
+    ("event_bus_connections", "Open WebSocket/SSE subscriptions", lambda: event_bus.stats()["connections"], "gauge"),
+    ("heartbeats_total", "Heartbeats absorbed in memory", lambda: heartbeats.stats()["heartbeats"], "counter"),
+    ("heartbeats_pending_writes", "Drivers with a heartbeat not yet flushed", lambda: heartbeats.stats()["pending_writes"], "gauge"),
+    ("ride_cache_hits_total", "Ride details served from the cache", lambda: ride_cache.stats()["hits"], "counter"),
+    ("ride_cache_misses_total", "Ride details loaded from the DB", lambda: ride_cache.stats()["misses"], "counter"),
+    ("route_cache_hits_total", "Route costs served from the cell-pair cache", lambda: route_model.stats()["hits"], "counter"),
+    ("route_cache_misses_total", "Route costs computed", lambda: route_model.stats()["misses"], "counter"),
+):
+    registry.add(Gauge(name, help, read, kind=kind))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus metrics: request latency, DB usage, background timings and live state"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Opt-in sampling profiler (PROFILER_ENABLED=1); idle until started
+profiler = SamplingProfiler()
+
+@app.post("/debug/profiler/start")
+def start_profiler(response: Response, interval: float = 0.005):
+    if not PROFILER_ENABLED:
+        response.status_code = 404
+        return {"error": "Profiler disabled, set PROFILER_ENABLED=1"}
+    if not profiler.start(max(interval, 0.001)):
+        response.status_code = 409
+        return {"error": "Profiler already running"}
+    return profiler.stats()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler(response: Response):
+    if not PROFILER_ENABLED:
+        response.status_code = 404
+        return {"error": "Profiler disabled, set PROFILER_ENABLED=1"}
+    profiler.stop()
+    return profiler.stats()
+
+@app.get("/debug/profiler", response_class=PlainTextResponse)
+def get_profile(limit: int = 200):
+    """Collapsed stacks (flamegraph input) sampled since the last start"""
+    if not PROFILER_ENABLED:
+        return PlainTextResponse("Profiler disabled, set PROFILER_ENABLED=1\n", status_code=404)
+    return profiler.collapsed(limit)
+
+@app.get("/admission")
+def get_admission():
+    """Booking rate limiting and pending backlog cap"""
+    return {**booking_limiter.stats(), **backlog_gate.stats()}
+
+@app.get("/ride-cache")
+def get_ride_cache():
+    """Ride details cache and port index sizes and hit rate"""
+    return ride_cache.stats()
+
+@app.get("/heartbeat-stats")
+def get_heartbeat_stats():
+    """Heartbeats absorbed in memory, how many have been flushed to the DB and liveness tracking"""
+    return {**heartbeats.stats(), **liveness.stats()}
+
+@app.get("/event-bus")
+def get_event_bus():
+    """Connected push subscribers and events published so far"""
+    return event_bus.stats()
+
+@app.websocket("/ws")
+async def updates_socket(websocket: WebSocket, user_id: int = None, driver_id: int = None, topics: str = ""):
+    """Push ride/driver events to one client.
+
+    Subscribe with ?user_id=, ?driver_id= and/or ?topics=rides,drivers.
+    """
+    await websocket.accept()
+    sub = event_bus.subscribe(channels_for(user_id, driver_id, topics.split(",")))
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    closed = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        while True:
+            next_event = asyncio.ensure_future(sub.get())
+            await asyncio.wait({next_event, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if closed.done():
+                next_event.cancel()
+                break
+            await websocket.send_json(next_event.result())
+    finally:
+        closed.cancel()
+        event_bus.unsubscribe(sub)
+
+@app.get("/events")
+async def updates_stream(request: Request, user_id: int = None, driver_id: int = None, topics: str = ""):
+    """Server-sent events version of /ws for clients that can't use WebSockets"""
+    sub = event_bus.subscribe(channels_for(user_id, driver_id, topics.split(",")))
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/trip-scheduler")
+def get_trip_scheduler():
+    """Queue depth and throughput of the trip completion scheduler"""
+    return trip_scheduler.stats()
+
 @app.get("/ride-containers")
 def get_ride_containers():
-    """Returns information about active ride containers"""
-    try:
-        # Get running containers with ride- prefix
-        result = subprocess.run(
-            ["docker", "ps", "--filter", "name=ride-", "--format", "json"],
-            capture_output=True, text=True
+    """Returns information about active ride containers, from the provisioner's registry"""
+    return {
+        "containers": provisioner.containers(),
+        "used_ports": port_allocator.allocated_ports(),
+        "last_reconciled": provisioner.last_reconciled,
+    }
+
+
+async def insert_ride(db: AsyncSession, user_id, start, destination):
+    """Insert a ride in one commit, assigned to the nearest free driver if there is one.
+
+    Only an assigned ride gets a port (and then a container); a pending one
+    waits for the assignment loop to hand it both. Returns (ride, driver), or
+    (None, None) after repeated port conflicts: a port another worker's active
+    ride holds is rejected by the database, stays out of our free list and the
+    insert is retried on another port.
+    """
+    for _ in range(PORT_CONFLICT_RETRIES):
+        driver = await claim_nearest_driver(db, resolve(start))
+        ride_port = get_next_available_port() if driver else None
+        if driver and ride_port is None:
+            # Out of ports: hand the driver back and queue the ride instead
+            await unclaim_driver_async(db, driver.id)
+            driver_index.add(driver.id, driver.location)
+            driver = None
+        claimed = (driver.id, driver.location) if driver else None
+        ride_db = models.RideQueue(
+            user_id=user_id,
+            start=start,
+            destination=destination,
+            status="assigned" if driver else "pending",
+            driver_id=driver.id if driver else None,
+            port=ride_port,
+            completes_at=trip_completion_time(start, destination, driver.location) if driver else None
         )
-        
-        if result.returncode == 0:
-            containers = []
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    container_info = json.loads(line)
-                    containers.append({
-                        "name": container_info["Names"],
-                        "ports": container_info["Ports"],
-                        "status": container_info["Status"]
-                    })
-            return {"containers": containers, "used_ports": list(USED_PORTS)}
-        else:
-            return {"error": "Could not fetch containers", "containers": [], "used_ports": list(USED_PORTS)}
-            
-    except Exception as e:
-        return {"error": str(e), "containers": [], "used_ports": list(USED_PORTS)}
+        db.add(ride_db)
+        try:
+            if driver:
+                # Flush for the id so the container name goes out in the same commit
+                await db.flush()
+                ride_db.container_name = f"ride-{ride_db.id}"
+            await db.commit()
+            return ride_db, driver
+        except IntegrityError as e:
+            await db.rollback()
+            if claimed:
+                driver_index.add(*claimed)
+            conflict = is_port_conflict(e)
+            if ride_port is not None:
+                unclaim_port(ride_port, reusable=not conflict)
+            if not conflict:
+                raise
+            print(f"⚠️ Port {ride_port} is held by another worker, retrying")
+    return None, None
+
+def reject_booking(response: Response, message, retry_after):
+    """429 with a Retry-After hint, sent before the booking touches the DB"""
+    retry_after = max(1, math.ceil(retry_after))
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return {"error": message, "retry_after": retry_after}
+
+@app.post("/bulk/rides")
+async def bulk_rides(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """NDJSON of {"user_id" or "user_email", "start", "destination"}, inserted as pending rides in batches.
 
+    Skips admission control and per-ride events: the rides wait for the
+    next assignment pass, which also brings the backlog count up to date.
+    """
+    report = await bulk.import_ndjson(request.stream(), bulk.ride_row, lambda batch, report: bulk.insert_rides(db, batch, report))
+    return report.as_dict()
 
 @app.options("/book-ride")
 def book_ride_options():
     return {"message": "OK"}
 
 @app.post("/book-ride")
-def book_ride(ride: schemas.RideCreate, response: Response, db: Session = Depends(get_db)):
+async def book_ride(ride: schemas.RideCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
     user_id = ride.user_id
     start = ride.start
     destination = ride.destination
 
-    # Get next available port for this ride
-    ride_port = get_next_available_port()
-    
-    driver = db.query(models.Driver).filter(models.Driver.status == "online").first()
-    
-    if driver:
-        status = "assigned"
-        driver.status = "on_trip"
-        assigned_driver_id = driver.id
-    else:
-        status = "pending"
-        assigned_driver_id = None
-
-    ride_db = models.RideQueue(
-        user_id=user_id,
-        start=start,
-        destination=destination,
-        status=status,
-        driver_id=assigned_driver_id,
-        port=ride_port
-    )
-    db.add(ride_db)
-    db.commit()
-    db.refresh(ride_db)
-    
-    # Set container name and update in DB
-    container_name = f"ride-{ride_db.id}"
-    ride_db.container_name = container_name
-    db.commit()
-    
-    # Create Docker container for this ride
-    container_created = create_ride_container(ride_db.id, ride_port)
-    
-    if not container_created:
-        # If container creation fails, still proceed but log the error
-        print(f"⚠️ Warning: Could not create container for ride {ride_db.id}")
+    # Admission control: cheap in-memory checks that shed a burst before it reaches the DB
+    retry_after = booking_limiter.acquire(user_id)
+    if retry_after:
+        return reject_booking(response, "Too many bookings, slow down", retry_after)
+    retry_after = backlog_gate.admit()
+    if retry_after:
+        return reject_booking(response, "Too many rides waiting for a driver, try again shortly", retry_after)
+
+    try:
+        async with booking_writers():
+            ride_db, driver = await insert_ride(db, user_id, start, destination)
+    except Exception:
+        backlog_gate.settle(pending=False)
+        raise
+    backlog_gate.settle(pending=ride_db is not None and driver is None)
+    if ride_db is None:
+        response.status_code = 503
+        return {"error": "No ride ports available, try again shortly"}
+    ride_port = ride_db.port
+    ride_changed(ride_row(ride_db))
+    pickup_seconds, trip_seconds = trip_plan(start, destination, driver.location if driver else None)
 
     if driver:
-        def finish_trip(driver_id, ride_id, ride_port, duration=1):
-            time.sleep(duration * 60)
-            
-            # Get fresh DB session for the thread
-            thread_db = SessionLocal()
-            try:
-                driver = thread_db.query(models.Driver).filter(models.Driver.id == driver_id).first()
-                ride = thread_db.query(models.RideQueue).filter(models.RideQueue.id == ride_id).first()
-                
-                if driver and ride:
-                    # Only set driver online if they were on_trip, not if they went offline
-                    if driver.status == "on_trip":
-                        driver.status = "online"
-                    ride.status = "completed"
-                    thread_db.commit()
-                    
-                    # Remove the ride container
-                    remove_ride_container(ride_id, ride_port)
-                    
-                    assign_pending_rides(thread_db)
-            finally:
-                thread_db.close()
-
-        threading.Thread(target=finish_trip, args=(driver.id, ride_db.id, ride_port, 1)).start()
+        publish_driver(driver_row(driver))
+        # Container startup happens in the provisioner, so booking latency doesn't depend on it
+        create_ride_container(ride_db.id, ride_port)
+        schedule_trip(ride_db.id, driver.id, ride_port, ride_db.completes_at)
 
     # Add explicit CORS headers
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -361,55 +874,361 @@ def book_ride(ride: schemas.RideCreate, response: Response, db: Session = Depend
         "user_id": user_id,
         "start": start,
         "destination": destination,
+        "status": ride_db.status,
         "driver": driver.name if driver else None,
         "driver_id": driver.id if driver else None,
+        "pickup_eta_seconds": round(pickup_seconds) if pickup_seconds is not None else None,
+        "trip_seconds": round(trip_seconds) if trip_seconds is not None else None,
+        # Pending rides get their port and container once a driver is assigned
         "ride_port": ride_port,
-        "ride_url": f"http://localhost:{ride_port}"
+        "ride_url": ride_url(ride_db.id, ride_port) if ride_port else None
     }
 
 
 # ------------------ HELPER ------------------
 
 def assign_pending_rides(db: Session):
-    """Assign pending rides to available drivers."""
-    pending_rides = db.query(models.RideQueue).filter(models.RideQueue.status == "pending").all()
-    for ride in pending_rides:
-        driver = db.query(models.Driver).filter(models.Driver.status == "online").first()
-        if driver:
-            ride.driver_id = driver.id
-            ride.status = "assigned"
-            driver.status = "on_trip"
-            
+    """Match pending rides against idle drivers in one batch and commit once.
+
+    Drivers and rides are taken with the claim protocol in dispatch.py, so
+    other workers running the same pass can't assign either twice.
+    Returns the number of rides assigned.
+    """
+    pending_rides = db.execute(pending_rides_stmt(DISPATCH_BATCH_SIZE)).scalars().all()
+    if not pending_rides:
+        db.rollback()
+        return 0
+    idle = driver_index.snapshot()
+    if not idle:
+        db.rollback()
+        return 0
+
+    driver_ids = list(idle)
+    pairs = match([resolve(ride.start) for ride in pending_rides], [idle[d] for d in driver_ids])
+
+    # Claim matched drivers so a concurrent book_ride can't take them as well
+    claimed = {}
+    for ride_idx, driver_idx in pairs:
+        if driver_index.claim(driver_ids[driver_idx]):
+            claimed[driver_ids[driver_idx]] = pending_rides[ride_idx]
+    if not claimed:
+        db.rollback()
+        return 0
+
+    assigned, new_ports = [], []
+    changed_rides, changed_drivers = [], []
+    drivers = {driver.id: driver for driver in db.query(models.Driver).filter(models.Driver.id.in_(list(claimed)))}
+    try:
+        for driver_id, ride in claimed.items():
+            driver = drivers.get(driver_id)
+            # Stale index entry (offline, or dispatched by another worker); the ride waits for the next tick
+            if not driver or not claim_driver(db, driver_id):
+                continue
+
             # Use existing port if already allocated, otherwise get new one
-            if not ride.port:
-                ride.port = get_next_available_port()
-                ride.container_name = f"ride-{ride.id}"
-                create_ride_container(ride.id, ride.port)
-            
-            ride_port = ride.port
-            db.commit()
-
-            def finish_trip(driver_id, ride_id, ride_port, duration=1):
-                time.sleep(duration * 60)
-                
-                # Get fresh DB session for the thread
-                thread_db = SessionLocal()
-                try:
-                    driver = thread_db.query(models.Driver).filter(models.Driver.id == driver_id).first()
-                    ride = thread_db.query(models.RideQueue).filter(models.RideQueue.id == ride_id).first()
-                    
-                    if driver and ride:
-                        # Only set driver online if they were on_trip, not if they went offline
-                        if driver.status == "on_trip":
-                            driver.status = "online"
-                        ride.status = "completed"
-                        thread_db.commit()
-                        
-                        # Remove the ride container
-                        remove_ride_container(ride_id, ride_port)
-                        
-                        assign_pending_rides(thread_db)
-                finally:
-                    thread_db.close()
-
-            threading.Thread(target=finish_trip, args=(driver.id, ride.id, ride_port, 1)).start()
+            new_container = not ride.port
+            port = ride.port or get_next_available_port()
+            if port is None:
+                # Out of ports: hand the driver back and retry the ride next tick
+                unclaim_driver(db, driver_id)
+                driver_index.add(driver_id, idle[driver_id])
+                continue
+
+            completes_at = trip_completion_time(ride.start, ride.destination, idle[driver_id])
+            if not assign_ride(db, ride.id, driver_id, port=port, container_name=f"ride-{ride.id}", completes_at=completes_at):
+                # Another worker assigned this ride first
+                unclaim_driver(db, driver_id)
+                driver_index.add(driver_id, idle[driver_id])
+                if new_container:
+                    unclaim_port(port)
+                continue
+            if new_container:
+                new_ports.append(port)
+            changed_drivers.append(driver_row(driver))
+            assigned.append((driver_id, ride.id, port, completes_at, new_container))
+            changed_rides.append(ride_row(ride))
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not is_port_conflict(e):
+            raise
+        # Ports held by another worker's ride stay allocated here until reconciliation sees
+        # that ride finish; the rest go back and the whole batch retries next tick
+        taken = set(db.execute(active_ports_stmt(new_ports)).scalars())
+        db.rollback()
+        for port in new_ports:
+            unclaim_port(port, reusable=port not in taken)
+        for driver_id in claimed:
+            if driver_id in drivers:
+                driver_index.add(driver_id, idle[driver_id])
+        print("⚠️ Ride port held by another worker, retrying assignment next tick")
+        return 0
+    for row in changed_rides:
+        ride_changed(row)
+    for row in changed_drivers:
+        publish_driver(row)
+
+    for driver_id, ride_id, ride_port, completes_at, new_container in assigned:
+        if new_container:
+            create_ride_container(ride_id, ride_port)
+
+        schedule_trip(ride_id, driver_id, ride_port, completes_at)
+    return len(assigned)
+
+
+def trip_plan(start, destination, driver_location=None):
+    """(pickup_eta_seconds, trip_seconds) from the route model, None for whichever can't be located"""
+    pickup = route_model.pickup_seconds(driver_location, start) if driver_location is not None else None
+    return pickup, route_model.trip_seconds(start, destination)
+
+
+def trip_completion_time(start, destination, driver_location=None):
+    """When an assigned ride finishes: the driver's drive to the pickup plus the trip itself"""
+    pickup_seconds, trip_seconds = trip_plan(start, destination, driver_location)
+    if trip_seconds is None:
+        trip_seconds = TRIP_DURATION_MINUTES * 60
+    return datetime.utcnow() + timedelta(seconds=(pickup_seconds or 0) + trip_seconds)
+
+
+def schedule_trip(ride_id, driver_id, ride_port, completes_at):
+    """Hand an assigned ride to the trip scheduler; completes_at is a naive UTC datetime"""
+    trip_scheduler.schedule(ride_id, driver_id, ride_port, completes_at.replace(tzinfo=timezone.utc).timestamp())
+
+
+def complete_trips(trips):
+    """Complete a batch of due trips with one session and one commit; returns how many were completed.
+
+    Each ride and driver moves with a conditional UPDATE, so when several workers
+    hold the same trip (every worker's warm start schedules every assigned ride)
+    only the one that completes the ride frees the driver and removes the container.
+    """
+    db = SessionLocal()
+    try:
+        # Rides already completed elsewhere, e.g. scheduled twice after a restart, are skipped
+        won = [trip for trip in trips if complete_ride(db, trip.ride_id, trip.driver_id)]
+        # Only drivers still on_trip go back online, not those who went offline meanwhile
+        freed = {trip.driver_id for trip in won if release_driver(db, trip.driver_id)}
+        db.commit()
+        if not won:
+            return 0
+
+        rides = {ride.id: ride for ride in db.query(models.RideQueue).filter(
+            models.RideQueue.id.in_([trip.ride_id for trip in won])
+        )}
+        drivers = {driver.id: driver for driver in db.query(models.Driver).filter(
+            models.Driver.id.in_([trip.driver_id for trip in won])
+        )}
+        for trip in won:
+            driver = drivers.get(trip.driver_id)
+            if driver and trip.driver_id in freed:
+                liveness.watch(driver.id, heartbeats.last_seen(driver.id, default=driver.last_seen))
+                driver_index.add(driver.id, driver.location)
+            ride_changed(ride_row(rides[trip.ride_id]))
+            if driver:
+                publish_driver(driver_row(driver))
+            # Remove the ride container
+            if trip.port:
+                remove_ride_container(trip.ride_id, trip.port)
+        return len(won)
+    finally:
+        db.close()
+
+
+def warm_start(now=None):
+    """Rebuild in-memory dispatch state from the tables after a restart, in one bulk pass.
+
+    Restores the port reservations and port index of active rides, the
+    trip timers of assigned rides, the backlog count and the index,
+    heartbeats and liveness deadlines of online drivers. Drivers get a
+    full timeout from now to check in, since they couldn't reach a server
+    that was down. Returns counts of what was restored.
+    """
+    now = time.time() if now is None else now
+    db = SessionLocal()
+    try:
+        rides = db.query(
+            models.RideQueue.id, models.RideQueue.status, models.RideQueue.driver_id,
+            models.RideQueue.port, models.RideQueue.completes_at
+        ).filter(models.RideQueue.status.in_(ACTIVE_RIDE_STATUSES)).all()
+        drivers = db.query(
+            models.Driver.id, models.Driver.status, models.Driver.location, models.Driver.last_seen
+        ).filter(models.Driver.status.in_(["online", "on_trip"])).all()
+    finally:
+        db.close()
+
+    pending = trips = ports = 0
+    for ride_id, status, driver_id, port, completes_at in rides:
+        if port is not None:
+            ride_cache.track_port(ride_id, port, True)
+            port_allocator.reserve(port)
+            ports += 1
+        if status == "assigned":
+            schedule_trip(ride_id, driver_id, port, completes_at or datetime.utcnow())
+            trips += 1
+        else:
+            pending += 1
+    backlog_gate.reset(pending)
+
+    online = 0
+    for driver_id, status, location, last_seen in drivers:
+        # Known drivers' heartbeats then take the in-memory fast path straight away
+        heartbeats.seed(driver_id, last_seen or datetime.utcnow())
+        if status == "online":
+            liveness.watch(driver_id, now)
+            driver_index.add(driver_id, location)
+            online += 1
+    return {"online_drivers": online, "pending_rides": pending, "trips": trips, "ports": ports}
+
+
+# One worker completes all in-flight trips instead of a sleeping thread per ride
+trip_scheduler = TripScheduler(lambda trips: timed("complete_trips", complete_trips, trips))
+
+
+def sync_driver_index(db: Session):
+    """Rebuild the idle-driver index from the table, picking up changes made by other workers"""
+    online = dict(db.query(models.Driver.id, models.Driver.location).filter(models.Driver.status == "online").all())
+    db.rollback()
+    for driver_id in set(driver_index.ids()) - set(online):
+        driver_index.discard(driver_id)
+    indexed = set(driver_index.ids())
+    for driver_id, location in online.items():
+        if driver_id not in indexed:
+            driver_index.add(driver_id, location)
+
+
+def run_assignment_loop(stop: threading.Event):
+    """Drain the pending backlog in batches every ASSIGN_TICK_SECONDS until stop is set."""
+    while not stop.wait(ASSIGN_TICK_SECONDS):
+        db = SessionLocal()
+        try:
+            if WORKER_PROCESSES > 1:
+                sync_driver_index(db)
+            assigned = timed("assign_pending_rides", assign_pending_rides, db)
+            if assigned:
+                RIDES_ASSIGNED.inc(assigned)
+                print(f"🧮 Batch-assigned {assigned} pending rides")
+            backlog_gate.reset(db.execute(pending_count_stmt()).scalar())
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Assignment tick failed: {e}")
+        finally:
+            db.close()
+
+
+def flush_heartbeats():
+    """Write buffered heartbeats to the drivers table. Returns rows written."""
+    db = SessionLocal()
+    try:
+        return heartbeats.flush(db, models.Driver.__table__)
+    finally:
+        db.close()
+
+
+def run_heartbeat_flush_loop(stop: threading.Event):
+    """Flush buffered heartbeats every HEARTBEAT_FLUSH_SECONDS until stop is set."""
+    while not stop.wait(HEARTBEAT_FLUSH_SECONDS):
+        try:
+            timed("flush_heartbeats", flush_heartbeats)
+        except Exception as e:
+            print(f"❌ Heartbeat flush failed: {e}")
+
+
+def sweep_stale_drivers(now=None):
+    """Mark drivers whose heartbeat deadline passed offline. Returns their ids."""
+    now = time.time() if now is None else now
+    expired = liveness.pop_expired(now)
+    if not expired:
+        return []
+    db = SessionLocal()
+    revived = []
+    try:
+        # Drivers that went on a trip meanwhile keep their status
+        online = db.query(models.Driver).filter(
+            models.Driver.id.in_(expired),
+            models.Driver.status == "online"
+        ).all()
+        rows = []
+        for driver in online:
+            # Another worker process may have absorbed (and flushed) heartbeats this one never saw
+            last_seen = to_epoch(driver.last_seen) if driver.last_seen else 0
+            if last_seen + DRIVER_TIMEOUT_SECONDS >= now:
+                revived.append((driver.id, last_seen))
+                continue
+            driver.status = "offline"
+            rows.append(driver_row(driver))
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Keep them tracked so the next sweep retries
+        for driver_id in expired:
+            liveness.watch(driver_id, heartbeats.last_seen(driver_id, default=0))
+        raise
+    finally:
+        db.close()
+    for driver_id, last_seen in revived:
+        liveness.watch(driver_id, last_seen)
+    expired = [driver_id for driver_id in expired if driver_id not in dict(revived)]
+    for driver_id in expired:
+        driver_index.discard(driver_id)
+    for row in rows:
+        publish_driver(row)
+    return expired
+
+
+def run_liveness_sweep_loop(stop: threading.Event):
+    """Expire silent drivers every LIVENESS_SWEEP_SECONDS until stop is set."""
+    while not stop.wait(LIVENESS_SWEEP_SECONDS):
+        try:
+            expired = timed("sweep_stale_drivers", sweep_stale_drivers)
+            if expired:
+                print(f"💤 Marked {len(expired)} silent drivers offline")
+        except Exception as e:
+            print(f"❌ Liveness sweep failed: {e}")
+
+
+def reconcile_containers():
+    """One reconciliation pass against the active rides in the DB"""
+    db = SessionLocal()
+    try:
+        active = dict(db.query(models.RideQueue.id, models.RideQueue.port).filter(
+            models.RideQueue.status.in_(ACTIVE_RIDE_STATUSES),
+            models.RideQueue.port.isnot(None)
+        ).all())
+    finally:
+        db.close()
+    return provisioner.reconcile(active, inspect=not SHARED_RIDE_INTERFACE)
+
+
+def run_container_reconcile_loop(stop: threading.Event):
+    """Reconcile ride containers and ports every CONTAINER_RECONCILE_SECONDS until stop is set."""
+    while not stop.wait(CONTAINER_RECONCILE_SECONDS):
+        try:
+            timed("reconcile_containers", reconcile_containers)
+        except Exception as e:
+            print(f"❌ Container reconciliation failed: {e}")
+
+
+def archive_old_rides(now=None):
+    """Move completed rides past RIDE_RETENTION_SECONDS to ride_history. Returns rides moved."""
+    now = datetime.utcnow() if now is None else now
+    db = SessionLocal()
+    try:
+        moved = archive_completed_rides(db, now - timedelta(seconds=RIDE_RETENTION_SECONDS), ARCHIVE_BATCH_SIZE)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    RIDES_ARCHIVED.inc(moved)
+    return moved
+
+
+def run_archive_loop(stop: threading.Event):
+    """Archive old completed rides every ARCHIVE_INTERVAL_SECONDS until stop is set."""
+    while not stop.wait(ARCHIVE_INTERVAL_SECONDS):
+        try:
+            moved = timed("archive_old_rides", archive_old_rides)
+            if moved:
+                print(f"🗃️ Archived {moved} completed rides")
+        except Exception as e:
+            print(f"❌ Ride archival failed: {e}")
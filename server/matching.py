@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM
+
+# Cost used for a ride or driver without coordinates, so they still match but after everyone else
+UNKNOWN_COST_KM = 10_000.0
+# Solve optimally with the Hungarian algorithm while the smaller side of the batch is at most this big
+MAX_EXACT_SIZE = int(os.getenv("MATCH_MAX_EXACT_SIZE", "200"))
+# Upper bound on distance matrix cells held in memory at once; bigger batches are matched in row chunks
+MAX_MATRIX_CELLS = int(os.getenv("MATCH_MAX_MATRIX_CELLS", "4000000"))
+
+
+def _to_array(points):
+    """(n, 2) array of radians, NaN where a point is None"""
+    arr = np.full((len(points), 2), np.nan)
+    for i, point in enumerate(points):
+        if point is not None:
+            arr[i] = point
+    return np.radians(arr)
+
+
+def haversine_matrix(ride_points, driver_points):
+    """Pickup distance in km from every ride (rows) to every driver (columns)"""
+    a = _to_array(ride_points)
+    b = _to_array(driver_points)
+    return _haversine(a, b)
+
+
+def _haversine(a, b):
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlng = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlng / 2) ** 2
+    cost = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+    return np.nan_to_num(cost, nan=UNKNOWN_COST_KM)
+
+
+def hungarian(cost):
+    """Minimum-cost assignment for a rectangular cost matrix.
+
+    Returns a list of (row, col) pairs covering min(rows, cols) entries.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return []
+
+    # Shortest augmenting path formulation with potentials, 1-indexed with a dummy column 0
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)    # p[j] = row assigned to column j
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            reduced = np.full(m + 1, np.inf)
+            reduced[1:] = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv)
+            minv[better] = reduced[better]
+            way[better] = j0
+            masked = np.where(free, minv, np.inf)
+            j1 = int(np.argmin(masked))
+            delta = masked[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def greedy(cost):
+    """Cheapest-edge-first assignment; fast approximation for batches too big for hungarian.
+
+    Always covers min(rows, cols) entries, like hungarian.
+    """
+    cost = np.asarray(cost, dtype=float)
+    n, m = cost.shape
+    if n == 0 or m == 0:
+        return []
+    k = min(m, max(1, min(n, 16)))
+    # Each row only considers its k cheapest columns, which keeps the sort small
+    candidates = np.argpartition(cost, k - 1, axis=1)[:, :k] if k < m else np.tile(np.arange(m), (n, 1))
+    rows = np.repeat(np.arange(n), candidates.shape[1])
+    cols = candidates.ravel()
+    order = np.argsort(cost[rows, cols], kind="stable")
+    row_done = np.zeros(n, dtype=bool)
+    col_done = np.zeros(m, dtype=bool)
+    pairs = []
+    for idx in order:
+        r, c = rows[idx], cols[idx]
+        if row_done[r] or col_done[c]:
+            continue
+        row_done[r] = col_done[c] = True
+        pairs.append((int(r), int(c)))
+
+    # Rows whose candidates all went to others take the cheapest column still free, so no ride
+    # is left waiting while a driver is idle
+    left_rows, left_cols = np.flatnonzero(~row_done), np.flatnonzero(~col_done)
+    if len(left_rows) and len(left_cols):
+        rest = cost[np.ix_(left_rows, left_cols)]
+        taken = np.zeros(len(left_cols), dtype=bool)
+        for i in np.argsort(rest.min(axis=1), kind="stable")[:len(left_cols)]:
+            c = int(np.argmin(np.where(taken, np.inf, rest[i])))
+            taken[c] = True
+            pairs.append((int(left_rows[i]), int(left_cols[c])))
+    return sorted(pairs)
+
+
+def solve(cost):
+    """Assign rows to columns, exactly when small enough and greedily otherwise"""
+    n, m = cost.shape
+    if n == 0 or m == 0:
+        return []
+    if m > n:
+        # Some optimal assignment only uses each row's n cheapest columns
+        keep = np.unique(np.argpartition(cost, n - 1, axis=1)[:, :n]) if n < m else np.arange(m)
+        if len(keep) < m:
+            return [(r, int(keep[c])) for r, c in solve(cost[:, keep])]
+    if min(n, m) <= MAX_EXACT_SIZE:
+        return hungarian(cost)
+    return greedy(cost)
+
+
+def match(ride_points, driver_points):
+    """Match rides to drivers minimising total pickup distance.
+
+    Returns (ride_index, driver_index) pairs. Each ride and driver is used at most once.
+    """
+    if not ride_points or not driver_points:
+        return []
+    drivers = _to_array(driver_points)
+    rides = _to_array(ride_points)
+    chunk = max(1, MAX_MATRIX_CELLS // len(driver_points))
+    if chunk >= len(ride_points):
+        return solve(_haversine(rides, drivers))
+
+    # Too big for one matrix: match row chunks in order, taking matched drivers out between chunks
+    pairs = []
+    remaining = np.arange(len(driver_points))
+    for start in range(0, len(ride_points), chunk):
+        if not len(remaining):
+            break
+        cost = _haversine(rides[start:start + chunk], drivers[remaining])
+        taken = []
+        for r, c in greedy(cost):
+            pairs.append((start + r, int(remaining[c])))
+            taken.append(c)
+        remaining = np.delete(remaining, taken)
+    return pairs
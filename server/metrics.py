@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# Seconds; covers sub-millisecond cache hits up to multi-second container starts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# [queries, seconds] for the request being handled, shared with threadpool workers it calls into
+request_db = ContextVar("request_db", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Metric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, k), v) for k, v in self._values.items()]
+
+
+class Gauge(Metric):
+    """Read at scrape time from a callback returning a number or {label values: number}.
+
+    kind="counter" exposes a running total kept elsewhere (e.g. a stats() field) as a counter.
+    """
+
+    def __init__(self, name, help, read, labelnames=(), kind="gauge"):
+        super().__init__(name, help, labelnames)
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if not isinstance(value, dict):
+            return [(self.name, "", value)]
+        return [(self.name, _labels(self.labelnames, k if isinstance(k, tuple) else (k,)), v)
+                for k, v in value.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            # Values above the last bound only show up in +Inf, i.e. the total count
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self):
+        """{label values: (count, sum)} for every series observed so far"""
+        with self._lock:
+            return {labels: (series[-1], series[-2]) for labels, series in self._series.items()}
+
+    def samples(self):
+        out = []
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, counts in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + (bound,)), cumulative))
+            out.append((f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + ("+Inf",)), counts[-1]))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, labels), counts[-2]))
+            out.append((f"{self.name}_count", _labels(self.labelnames, labels), counts[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+HTTP_SECONDS = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")))
+HTTP_DB_QUERIES = registry.add(Histogram(
+    "http_request_db_queries", "DB statements issued per request", ("route",), COUNT_BUCKETS))
+HTTP_DB_SECONDS = registry.add(Histogram(
+    "http_request_db_seconds", "Time spent in DB statements per request", ("route",)))
+DB_QUERY_SECONDS = registry.add(Histogram("db_query_duration_seconds", "Duration of each DB statement"))
+TASK_SECONDS = registry.add(Histogram(
+    "background_task_duration_seconds", "Duration of background passes (dispatch, trip completion, ...)", ("task",)))
+RIDES_ASSIGNED = registry.add(Counter("dispatch_rides_assigned_total", "Rides assigned by the batch dispatch loop"))
+RIDES_ARCHIVED = registry.add(Counter("retention_rides_archived_total", "Completed rides moved to ride_history"))
+CONTAINER_CREATE_SECONDS = registry.add(Histogram(
+    "container_create_duration_seconds", "Time for the runtime to start a ride container"))
+
+
+def instrument_engine(engine):
+    """Time every statement on engine and charge it to the current request, if any"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        DB_QUERY_SECONDS.observe(elapsed)
+        totals = request_db.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def timed(task, fn, *args):
+    """Run fn(*args), recording its duration under background_task_duration_seconds{task=...}"""
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        TASK_SECONDS.observe(time.perf_counter() - started, task)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and DB usage per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        totals = [0, 0.0]
+        token = request_db.set(totals)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_db.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one series so scanners can't blow up the label set
+            path = getattr(route, "path", "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - started, scope["method"], path, status[0])
+            HTTP_DB_QUERIES.observe(totals[0], path)
+            HTTP_DB_SECONDS.observe(totals[1], path)
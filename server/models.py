@@ -1,12 +1,19 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from db import Base
 from datetime import datetime
 
+RIDE_STATUSES = ("pending", "assigned", "completed")
+DRIVER_STATUSES = ("offline", "online", "on_trip")
+
+# Native enums on Postgres (4 bytes, values checked by the DB); plain short strings on SQLite
+RideStatus = Enum(*RIDE_STATUSES, name="ride_status")
+DriverStatus = Enum(*DRIVER_STATUSES, name="driver_status")
+
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String)
     email = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -16,27 +23,73 @@ class User(Base):
 class RideQueue(Base):
     __tablename__ = "ride_queue"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     start = Column(String)
     destination = Column(String)
-    status = Column(String, default="pending")
+    status = Column(RideStatus, default="pending")
     driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=True)
     port = Column(Integer, nullable=True)
     container_name = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    completes_at = Column(DateTime, nullable=True)  # when the trip scheduler finishes an assigned ride
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="rides")
     driver = relationship("Driver", back_populates="rides")
 
+    # Keyset pagination of /queue: each filter paired with the id it pages by
+    __table_args__ = (
+        Index("ix_ride_queue_status_id", "status", "id"),
+        Index("ix_ride_queue_user_id_id", "user_id", "id"),
+        Index("ix_ride_queue_driver_id_id", "driver_id", "id"),
+        Index("ix_ride_queue_created_at_id", "created_at", "id"),
+        Index("ix_ride_queue_updated_at_id", "updated_at", "id"),
+        # The retention job's scan for completed rides past their retention window
+        Index("ix_ride_queue_completed_updated_at", "updated_at",
+              postgresql_where=text("status = 'completed'"), sqlite_where=text("status = 'completed'")),
+        # One active ride per port across every worker process
+        Index("ux_ride_queue_active_port", "port", unique=True,
+              postgresql_where=text("status IN ('pending', 'assigned')"),
+              sqlite_where=text("status IN ('pending', 'assigned')")),
+    )
+
 class Driver(Base):
     __tablename__ = "drivers"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String)
     email = Column(String, unique=True, index=True)
     location = Column(String)
-    status = Column(String, default="offline")  # offline, online, on_trip
+    status = Column(DriverStatus, default="offline")
     last_seen = Column(DateTime, default=datetime.utcnow)
 
     rides = relationship("RideQueue", back_populates="driver")
+
+    __table_args__ = (
+        # Covers the id/location reads of online drivers (index sync, warm start). Not last_seen:
+        # every heartbeat flush rewrites it, and liveness deadlines live in memory anyway.
+        Index("ix_drivers_status_location", "status", "location"),
+    )
+
+class RideHistory(Base):
+    """Completed rides moved out of ride_queue by the retention job, so the hot table stays small"""
+    __tablename__ = "ride_history"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # the ride's id in ride_queue
+    user_id = Column(Integer)
+    start = Column(String)
+    destination = Column(String)
+    status = Column(RideStatus)
+    driver_id = Column(Integer, nullable=True)
+    port = Column(Integer, nullable=True)
+    container_name = Column(String, nullable=True)
+    created_at = Column(DateTime)
+    completes_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_ride_history_user_id_id", "user_id", "id"),
+        Index("ix_ride_history_driver_id_id", "driver_id", "id"),
+    )
@@ -0,0 +1,27 @@
+import base64
+import hashlib
+from datetime import datetime
+
+
+def encode_cursor(changed_at, row_id):
+    """Opaque cursor for a (changed_at, id) position in change order"""
+    raw = f"{changed_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything it didn't produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        changed_at, row_id = raw.split("|")
+        return datetime.fromisoformat(changed_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def etag_for(rows, *parts):
+    """Weak ETag over the ids/update times of rows plus any extra request parts"""
+    digest = hashlib.md5(repr(parts).encode())
+    for row in rows:
+        digest.update(f"{row['id']}:{row['updated_at']};".encode())
+    return f'W/"{digest.hexdigest()}"'
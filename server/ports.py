@@ -0,0 +1,92 @@
+import socket
+import threading
+from collections import deque
+
+
+def port_is_free(port):
+    """True if nothing else on this host is bound to port"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("", port))
+        return True
+    except OSError:
+        return False
+
+
+class PortAllocator:
+    """Thread-safe free-list allocator over a fixed range of ride ports.
+
+    Never-used ports are handed out in order from a counter, then released
+    ones from a free list, both O(1); the range costs nothing until used, so
+    it can be as large as needed. Ports taken by other processes are skipped
+    when probing, and reserved ports are skipped lazily.
+    """
+
+    def __init__(self, start, count, probe=True):
+        self.start = start
+        self.count = count
+        self.probe = probe
+        self._next = start   # lowest port never handed out
+        self._free = deque()  # released ports, oldest first
+        self._allocated = set()
+        self._lock = threading.Lock()
+        self.high_water = 0
+        self.exhausted = 0
+
+    def __contains__(self, port):
+        return port in self._allocated
+
+    def allocate(self):
+        """Take a free port, or None when the range is exhausted"""
+        with self._lock:
+            busy = []
+            try:
+                while True:
+                    if self._next < self.start + self.count:
+                        port = self._next
+                        self._next += 1
+                    elif self._free:
+                        port = self._free.popleft()
+                    else:
+                        self.exhausted += 1
+                        return None
+                    if port in self._allocated:
+                        continue
+                    if self.probe and not port_is_free(port):
+                        # In use outside our control; retry it after everything else
+                        busy.append(port)
+                        continue
+                    self._allocated.add(port)
+                    self.high_water = max(self.high_water, len(self._allocated))
+                    return port
+            finally:
+                self._free.extend(busy)
+
+    def reserve(self, port):
+        """Mark a port as taken, e.g. one recorded on an active ride at startup"""
+        if not self.start <= port < self.start + self.count:
+            return False
+        with self._lock:
+            self._allocated.add(port)
+            self.high_water = max(self.high_water, len(self._allocated))
+        return True
+
+    def release(self, port):
+        with self._lock:
+            if port in self._allocated:
+                self._allocated.discard(port)
+                self._free.append(port)
+
+    def allocated_ports(self):
+        with self._lock:
+            return sorted(self._allocated)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "port_range": [self.start, self.start + self.count - 1],
+                "allocated": len(self._allocated),
+                "free": self.count - len(self._allocated),
+                "high_water": self.high_water,
+                "exhausted": self.exhausted,
+            }
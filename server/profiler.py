@@ -0,0 +1,70 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Opt-in wall-clock sampler: snapshots every thread's stack at a fixed interval.
+
+    Costs nothing until started. Stacks are aggregated as collapsed
+    "frame;frame;frame count" lines, the input format of flamegraph tools.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self, interval=None):
+        if self.running:
+            return False
+        self.interval = interval or self.interval
+        with self._lock:
+            self._stacks.clear()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+            self.samples += 1
+
+    def collapsed(self, limit=None):
+        with self._lock:
+            top = self._stacks.most_common(limit)
+        return "\n".join(f"{stack} {count}" for stack, count in top) + "\n"
+
+    def stats(self):
+        return {"running": self.running, "interval": self.interval, "samples": self.samples,
+                "distinct_stacks": len(self._stacks), "started_at": self.started_at}
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, select
+
+import models
+
+# Retention for ride_queue: completed rides are moved, in batches, into ride_history once
+# they are older than the retention window, so the table every hot query touches only
+# holds active and recent rides. Copy and delete happen in one transaction per batch.
+
+# Columns ride_history shares with ride_queue, copied as-is
+ARCHIVED_COLUMNS = [c.name for c in models.RideHistory.__table__.columns if c.name != "archived_at"]
+
+
+def archivable_rides_stmt(cutoff, limit):
+    """Oldest completed rides last changed before cutoff, skipping rows another worker is archiving.
+
+    The newest ride is never archived: SQLite hands the next insert
+    max(id) + 1, so emptying the table would reuse ride ids.
+    """
+    ride = models.RideQueue
+    return (
+        select(ride.id)
+        .where(ride.status == "completed", ride.updated_at < cutoff,
+               ride.id < select(func.max(ride.id)).scalar_subquery())
+        .order_by(ride.updated_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def archive_rides(db, ride_ids, now=None):
+    """Copy completed rides into ride_history and delete them from ride_queue (caller commits)"""
+    now = datetime.utcnow() if now is None else now
+    ride = models.RideQueue
+    completed = (ride.id.in_(ride_ids), ride.status == "completed")
+    db.execute(insert(models.RideHistory).from_select(
+        ARCHIVED_COLUMNS + ["archived_at"],
+        select(*[ride.__table__.c[name] for name in ARCHIVED_COLUMNS], literal(now)).where(*completed),
+    ))
+    return db.execute(delete(ride).where(*completed)).rowcount
+
+
+def archive_completed_rides(db, cutoff, batch_size=1000):
+    """Move every completed ride older than cutoff to ride_history, one commit per batch. Returns rides moved."""
+    moved = 0
+    while True:
+        ride_ids = db.execute(archivable_rides_stmt(cutoff, batch_size)).scalars().all()
+        if not ride_ids:
+            return moved
+        moved += archive_rides(db, ride_ids)
+        db.commit()
+        if len(ride_ids) < batch_size:
+            return moved
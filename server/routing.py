@@ -0,0 +1,159 @@
+import json
+import math
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, KM_PER_DEG, parse_location
+
+# Route cost model: road distance is the great-circle distance times a detour factor,
+# driven at an average city speed. Endpoints are snapped to a grid so repeated
+# (origin cell, destination cell) pairs come out of an LRU cache instead of being
+# recomputed; a road-graph lookup can replace _cell_route without touching callers.
+
+# Road km per straight-line km; ~1.3-1.4 for a typical city street grid
+ROAD_FACTOR = float(os.getenv("ROUTE_ROAD_FACTOR", "1.35"))
+AVERAGE_SPEED_KMH = float(os.getenv("ROUTE_SPEED_KMH", "25"))
+# Grid the cache is keyed by; ~220 m, so a snapped point is at most ~160 m off
+ROUTE_CELL_DEG = 0.002
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "65536"))
+# Shortest and longest drive we ever quote; the cap keeps a mislocated end from holding a
+# driver on_trip for days
+MIN_TRIP_SECONDS = 60
+MAX_TRIP_SECONDS = float(os.getenv("ROUTE_MAX_TRIP_SECONDS", "10800"))
+# Optional JSON file of {"place name": [lat, lng]} merged over the built-in places
+PLACES_FILE = os.getenv("ROUTE_PLACES_FILE")
+
+# Place names the booking form is likely to get, so rides without coordinates still route
+PLACES = {
+    "bangalore": (12.9716, 77.5946),
+    "bengaluru": (12.9716, 77.5946),
+    "mg road": (12.9756, 77.6066),
+    "majestic": (12.9767, 77.5713),
+    "koramangala": (12.9352, 77.6245),
+    "indiranagar": (12.9784, 77.6408),
+    "whitefield": (12.9698, 77.7500),
+    "electronic city": (12.8452, 77.6602),
+    "hsr layout": (12.9116, 77.6474),
+    "jayanagar": (12.9299, 77.5826),
+    "hebbal": (13.0358, 77.5970),
+    "yelahanka": (13.1007, 77.5963),
+    "marathahalli": (12.9569, 77.7011),
+    "kempegowda airport": (13.1986, 77.7066),
+    "airport": (13.1986, 77.7066),
+    "mysore": (12.2958, 76.6394),
+    "mysuru": (12.2958, 76.6394),
+    "chennai": (13.0827, 80.2707),
+    "hyderabad": (17.3850, 78.4867),
+    "mumbai": (19.0760, 72.8777),
+    "pune": (18.5204, 73.8567),
+    "delhi": (28.6139, 77.2090),
+    "new delhi": (28.6139, 77.2090),
+    "kolkata": (22.5726, 88.3639),
+}
+if PLACES_FILE:
+    with open(PLACES_FILE) as f:
+        PLACES.update({name.lower(): tuple(point) for name, point in json.load(f).items()})
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize(name):
+    return _NON_WORD_RE.sub(" ", name.lower()).strip()
+
+
+_PLACE_INDEX = {_normalize(name): point for name, point in PLACES.items()}
+
+
+@lru_cache(maxsize=4096)
+def _resolve_text(text):
+    point = parse_location(text)
+    if point is not None:
+        return point
+    # "MG Road, Bangalore": the whole string first, then each comma-separated part
+    for part in [text] + text.split(","):
+        point = _PLACE_INDEX.get(_normalize(part))
+        if point is not None:
+            return point
+    return None
+
+
+def resolve(location):
+    """(lat, lng) for coordinates or a known place name, or None if it can't be located"""
+    if location is None or isinstance(location, (tuple, list)):
+        return parse_location(location)
+    return _resolve_text(location)
+
+
+class RouteModel:
+    """Road distance and drive time between points, memoized per (origin cell, destination cell).
+
+    route() answers one pair from the cache; pickup_etas() scores one
+    pickup against many drivers in a single numpy pass using the same
+    snapped cells, so both agree.
+    """
+
+    def __init__(self, road_factor=ROAD_FACTOR, speed_kmh=AVERAGE_SPEED_KMH, cell_deg=ROUTE_CELL_DEG,
+                 cache_size=ROUTE_CACHE_SIZE):
+        self.road_factor = road_factor
+        self.speed_kmh = speed_kmh
+        self.cell_deg = cell_deg
+        self._cell_route = lru_cache(maxsize=cache_size)(self._route_cells)
+
+    def _cell(self, point):
+        return int(math.floor(point[0] / self.cell_deg)), int(math.floor(point[1] / self.cell_deg))
+
+    def _route_cells(self, origin, destination):
+        # Between cell centres, so every pair of points in the same two cells shares the answer
+        lat1, lng1 = math.radians((origin[0] + 0.5) * self.cell_deg), math.radians((origin[1] + 0.5) * self.cell_deg)
+        lat2, lng2 = math.radians((destination[0] + 0.5) * self.cell_deg), math.radians((destination[1] + 0.5) * self.cell_deg)
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0))) * self.road_factor
+        return km, km / self.speed_kmh * 3600
+
+    def route(self, origin, destination):
+        """(road_km, seconds) between two locations, or None if either can't be located"""
+        a, b = resolve(origin), resolve(destination)
+        if a is None or b is None:
+            return None
+        return self._cell_route(self._cell(a), self._cell(b))
+
+    def trip_seconds(self, start, destination):
+        """Drive time of a trip within [MIN_TRIP_SECONDS, MAX_TRIP_SECONDS]; None if either end can't be located"""
+        found = self.route(start, destination)
+        return None if found is None else min(max(found[1], MIN_TRIP_SECONDS), MAX_TRIP_SECONDS)
+
+    def pickup_seconds(self, driver_location, pickup):
+        """Drive time from a driver to a pickup, at most MAX_TRIP_SECONDS; None if either can't be located"""
+        found = self.route(driver_location, pickup)
+        return None if found is None else min(found[1], MAX_TRIP_SECONDS)
+
+    def pickup_etas(self, pickup, driver_points):
+        """Seconds for each driver to reach pickup as a float array; inf where a driver has no location.
+
+        driver_points are (lat, lng) tuples or None, e.g. from DriverIndex.points().
+        """
+        target = resolve(pickup)
+        etas = np.full(len(driver_points), np.inf)
+        if target is None or not driver_points:
+            return etas
+        known = [i for i, point in enumerate(driver_points) if point is not None]
+        if not known:
+            return etas
+        # Snap to cell centres exactly as _route_cells does
+        points = np.array([driver_points[i] for i in known], dtype=float)
+        points = (np.floor(points / self.cell_deg) + 0.5) * self.cell_deg
+        origin = (np.floor(np.array(target) / self.cell_deg) + 0.5) * self.cell_deg
+        a = np.radians(points)
+        b = np.radians(origin)
+        h = np.sin((b[0] - a[:, 0]) / 2) ** 2 + np.cos(a[:, 0]) * np.cos(b[0]) * np.sin((b[1] - a[:, 1]) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1))) * self.road_factor
+        etas[known] = km / self.speed_kmh * 3600
+        return etas
+
+    def stats(self):
+        info = self._cell_route.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "cached_pairs": info.currsize, "max_pairs": info.maxsize,
+                "cell_km": round(self.cell_deg * KM_PER_DEG, 3)}
@@ -0,0 +1,97 @@
+import heapq
+import threading
+import time
+from collections import namedtuple
+
+Trip = namedtuple("Trip", ["due_at", "ride_id", "driver_id", "port"])
+
+
+class TripScheduler:
+    """Single-worker min-heap of in-flight trips keyed by completion time.
+
+    One thread sleeps until the earliest trip is due, pops every trip that is
+    due by then and hands the whole batch to `handler(trips)`, which returns
+    how many of them it completed; the rest count as skipped.
+    """
+
+    def __init__(self, handler, max_batch=500, retry_seconds=5):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.retry_seconds = retry_seconds
+        self._heap = []
+        self._cond = threading.Condition()
+        self._stop = False
+        self._worker = None
+        self.completed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.failures = 0
+
+    def schedule(self, ride_id, driver_id, port, due_at):
+        """Queue a trip to complete at due_at (epoch seconds)"""
+        with self._cond:
+            heapq.heappush(self._heap, Trip(due_at, ride_id, driver_id, port))
+            self._cond.notify()
+
+    def pop_due(self, now=None):
+        """Remove and return up to max_batch trips due at or before now"""
+        now = time.time() if now is None else now
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0].due_at <= now and len(due) < self.max_batch:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stats(self):
+        with self._cond:
+            next_due = self._heap[0].due_at - time.time() if self._heap else None
+            return {
+                "queued_trips": len(self._heap),
+                "next_due_in_seconds": round(next_due, 3) if next_due is not None else None,
+                "completed_trips": self.completed,
+                "skipped_trips": self.skipped,
+                "completion_batches": self.batches,
+                "failed_batches": self.failures,
+                "worker_alive": bool(self._worker and self._worker.is_alive()),
+            }
+
+    def start(self):
+        with self._cond:
+            self._stop = False
+        self._worker = threading.Thread(target=self._run, name="trip-scheduler", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._worker:
+            self._worker.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop:
+                    timeout = self._heap[0].due_at - time.time() if self._heap else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._stop:
+                    return
+            trips = self.pop_due()
+            if not trips:
+                continue
+            try:
+                completed = self.handler(trips)
+                self.completed += completed
+                self.skipped += len(trips) - completed
+                self.batches += 1
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Failed to complete {len(trips)} trips, retrying: {e}")
+                retry_at = time.time() + self.retry_seconds
+                for trip in trips:
+                    self.schedule(trip.ride_id, trip.driver_id, trip.port, retry_at)
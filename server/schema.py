@@ -0,0 +1,119 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+
+import models
+
+# Applied schema changes, one row per migration; the highest version is the schema's
+version_table = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# Arbitrary key for the Postgres advisory lock that serializes workers booting at once
+BOOTSTRAP_LOCK_KEY = 4242001
+
+
+def create_base_tables(conn):
+    models.Base.metadata.create_all(conn)
+
+
+def add_missing_columns(conn):
+    """Add model columns the tables lack, e.g. ride_queue.updated_at on tables from before it existed.
+
+    Added columns are nullable; updated_at starts out as the row's created_at.
+    """
+    for table in (models.User.__table__, models.RideQueue.__table__, models.Driver.__table__):
+        existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                kind = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {kind}"))
+                if column.name == "updated_at" and "created_at" in existing:
+                    conn.execute(text(f"UPDATE {table.name} SET updated_at = created_at"))
+
+
+def type_status_columns(conn):
+    """Missing columns, enum status columns, status-shaped indexes and the ride_history table.
+
+    Every step checks first, so it is safe on tables that already have it.
+    """
+    # Tables from before versioning have none of the later columns, and the indexes below need them
+    add_missing_columns(conn)
+    indexes = {table: {ix["name"] for ix in inspect(conn).get_indexes(table)} for table in ("users", "ride_queue", "drivers")}
+    # Primary keys are already indexed; these duplicates only slowed every insert
+    for table, name in (("users", "ix_users_id"), ("ride_queue", "ix_ride_queue_id"), ("drivers", "ix_drivers_id")):
+        if name in indexes[table]:
+            conn.execute(text(f"DROP INDEX {name}"))
+
+    if conn.dialect.name == "postgresql":
+        # The partial unique index's predicate compares status, so it is rebuilt around the type change
+        conn.execute(text("DROP INDEX IF EXISTS ux_ride_queue_active_port"))
+        for table, column in ((models.RideQueue.__table__, "status"), (models.Driver.__table__, "status")):
+            enum = table.c[column].type
+            enum.create(conn, checkfirst=True)
+            conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column} TYPE {enum.name} "
+                              f"USING {column}::text::{enum.name}"))
+        indexes["ride_queue"].discard("ux_ride_queue_active_port")
+    # SQLite stores the enums as the same short strings, so only the indexes change there
+
+    for table in (models.RideQueue.__table__, models.Driver.__table__):
+        for index in table.indexes:
+            if index.name not in indexes[table.name]:
+                index.create(conn)
+    models.RideHistory.__table__.create(conn, checkfirst=True)
+
+
+# (version, description, upgrade(conn)) in order. A new database is created
+# straight from the models and stamped with the last version, so an upgrade
+# only ever runs against databases created by an earlier release.
+MIGRATIONS = [
+    (1, "base tables", create_base_tables),
+    (2, "enum status columns, status indexes, ride_history", type_status_columns),
+]
+
+
+def current_version(conn):
+    """Highest applied migration, 0 for an empty database and None if tables predate versioning"""
+    tables = set(inspect(conn).get_table_names())
+    if version_table.name in tables:
+        return conn.execute(select(func.max(version_table.c.version))).scalar() or 0
+    return None if tables & set(models.Base.metadata.tables) else 0
+
+
+def bootstrap(engine, migrations=MIGRATIONS, metadata=models.Base.metadata):
+    """Bring the schema up to date without touching existing rows. Returns the migrations applied.
+
+    Safe to run on every start and from several workers at once: on
+    Postgres the whole bootstrap holds an advisory lock, and every step
+    checks before it creates.
+    """
+    applied = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        version = current_version(conn)
+        version_table.create(conn, checkfirst=True)
+        if version == 0:
+            metadata.create_all(conn)
+            latest, description, _ = migrations[-1]
+            conn.execute(version_table.insert().values(version=latest, description=description))
+            return [number for number, _, _ in migrations]
+        if version is None:
+            # Tables from before versioning match the first migration
+            version = migrations[0][0]
+            conn.execute(version_table.insert().values(version=version, description=migrations[0][1]))
+        for number, description, upgrade in migrations:
+            if number > version:
+                upgrade(conn)
+                conn.execute(version_table.insert().values(version=number, description=description))
+                applied.append(number)
+    return applied
+
+
+def reset(engine, metadata=models.Base.metadata):
+    """Drop every table, versioning included (development only)"""
+    metadata.drop_all(engine)
+    version_table.drop(engine, checkfirst=True)
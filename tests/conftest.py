@@ -0,0 +1,4 @@
+import os
+
+# The API tests assume empty tables, as they had when the app wiped the DB on import
+os.environ.setdefault("RESET_DB", "1")
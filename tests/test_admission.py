@@ -0,0 +1,37 @@
+from server.admission import BacklogGate, RateLimiter
+
+
+def test_rate_limiter_bursts_then_refills():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire("u", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("u", now=0) == 0.5
+    assert limiter.acquire("other", now=0) == 0
+    assert limiter.acquire("u", now=0.5) == 0
+    assert limiter.stats()["rate_limited"] == 1
+
+
+def test_rate_limiter_prunes_full_buckets():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    for key in range(3):
+        limiter.acquire(key, now=0)
+    limiter.acquire("late", now=10)
+    assert limiter.stats()["tracked_keys"] == 1
+
+
+def test_backlog_gate_caps_pending_rides():
+    gate = BacklogGate(limit=2, drain_seconds=1.5)
+    assert gate.admit() == gate.admit() == 0
+    assert gate.admit() == 2
+    gate.settle(pending=False)
+    gate.settle(pending=True)
+    assert gate.admit() == 0
+    gate.reset(0)
+    # The booking still in flight keeps its slot across a reset
+    assert gate.stats()["in_flight"] == 1 and gate.admit() == 0
+    assert BacklogGate(limit=0, drain_seconds=1).admit() == 0
+
+
+def test_backlog_gate_admits_overlapping_bookings_under_the_cap():
+    gate = BacklogGate(limit=100, drain_seconds=5)
+    assert [gate.admit() for _ in range(50)] == [0] * 50
+    assert gate.stats()["backlog_rejected"] == 0
@@ -14,12 +14,11 @@ async def test_home():
 async def test_book_ride():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
-        # send params since your endpoint expects function args, not JSON body
-        response = await ac.post(
-            "/book-ride?user_id=1&start=Bangalore&destination=Mysore"
-        )
+        user_id = (await ac.post("/register-user", params={"name": "B", "email": "book@example.com"})).json()["user_id"]
+        response = await ac.post("/book-ride", json={"user_id": user_id, "start": "Bangalore", "destination": "Mysore"})
     assert response.status_code == 200
     assert "ride_id" in response.json()
+    # No driver is online in this test, so the ride waits in the queue
     assert response.json()["status"] == "pending"
 
 @pytest.mark.asyncio
@@ -37,3 +36,303 @@ async def test_next_ride():
         response = await ac.get("/next-ride")
     assert response.status_code == 200
     assert "ride_id" in response.json() or response.json()["message"] == "No pending rides"
+
+def test_ws_pushes_driver_status_changes():
+    from fastapi.testclient import TestClient
+    client = TestClient(app)
+    driver_id = client.post(
+        "/register-driver", params={"name": "Ws", "email": "ws@example.com", "location": "12.97,77.59"}
+    ).json()["driver_id"]
+    with client.websocket_connect(f"/ws?driver_id={driver_id}") as ws:
+        client.post("/go-online", params={"driver_id": driver_id})
+        event = ws.receive_json()
+    assert event["type"] == "driver"
+    assert event["driver"]["id"] == driver_id
+    assert event["driver"]["status"] == "online"
+    client.post("/go-offline", params={"driver_id": driver_id})
+
+@pytest.mark.asyncio
+async def test_queue_pagination_and_etag():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "Q", "email": "queue@example.com"})).json()["user_id"]
+        for _ in range(3):
+            await ac.post("/book-ride", json={"user_id": user_id, "start": "A", "destination": "B"})
+        first = await ac.get("/queue", params={"user_id": user_id, "limit": 2})
+        second = await ac.get("/queue", params={"user_id": user_id, "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+        cached = await ac.get("/queue", params={"user_id": user_id, "limit": 2}, headers={"If-None-Match": first.headers["ETag"]})
+        delta = await ac.get("/queue", params={"user_id": user_id, "since": second.headers["X-Since-Cursor"]})
+    assert len(first.json()) == 2
+    assert len(second.json()) == 1
+    assert "X-Next-Cursor" not in second.headers
+    assert cached.status_code == 304
+    # Changes inside the safety window come round again for the client to dedupe
+    assert [r["id"] for r in delta.json()] == [r["id"] for r in first.json() + second.json()]
+
+@pytest.mark.asyncio
+async def test_queue_since_catches_late_commits():
+    from datetime import datetime, timedelta
+    from server import main
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "L", "email": "late@example.com"})).json()["user_id"]
+        await ac.post("/book-ride", json={"user_id": user_id, "start": "A", "destination": "B"})
+        seen = await ac.get("/queue", params={"user_id": user_id, "since": (await ac.get("/queue")).headers["X-Since-Cursor"]})
+        with main.SessionLocal() as db:
+            # Stamped before the ride above but committed after it was read
+            late = main.models.RideQueue(user_id=user_id, start="A", destination="C", status="pending",
+                                         updated_at=datetime.utcnow() - timedelta(seconds=1))
+            db.add(late)
+            db.commit()
+            late_id = late.id
+        delta = await ac.get("/queue", params={"user_id": user_id, "since": seen.headers["X-Since-Cursor"]})
+    assert len(seen.json()) == 1
+    assert late_id in [r["id"] for r in delta.json()]
+
+@pytest.mark.asyncio
+async def test_ride_page_inlines_ride_context():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "P", "email": "page@example.com"})).json()["user_id"]
+        driver_id = (await ac.post("/register-driver", params={"name": "PD", "email": "page-driver@example.com", "location": "12.9,77.6"})).json()["driver_id"]
+        await ac.post("/go-online", params={"driver_id": driver_id})
+        ride = (await ac.post("/book-ride", json={"user_id": user_id, "start": "A", "destination": "</script>"})).json()
+        page = await ac.get(f"/rides/{ride['ride_id']}")
+        by_port = await ac.get(f"/ride-by-port/{ride['ride_port']}")
+        missing = await ac.get("/rides/999999")
+    assert page.status_code == 200
+    assert "window.RIDE_CONTEXT" in page.text
+    assert f'"ride_id": {ride["ride_id"]}' in page.text
+    assert '"destination": "<\\/script>"' in page.text
+    assert by_port.json()["ride_id"] == ride["ride_id"]
+    assert missing.status_code == 404
+
+@pytest.mark.asyncio
+async def test_book_ride_rate_limited_per_user():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "R", "email": "rate@example.com"})).json()["user_id"]
+        responses = [await ac.post("/book-ride", json={"user_id": user_id, "start": "A", "destination": "B"}) for _ in range(8)]
+    statuses = [r.status_code for r in responses]
+    assert statuses.count(200) == 5 and statuses[5:] == [429, 429, 429]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+    assert responses[-1].json()["retry_after"] >= 1
+    # Rides admitted without a driver wait for one before getting a port or container
+    assert all(r.json()["ride_port"] is None for r in responses[:5] if r.json()["driver_id"] is None)
+
+@pytest.mark.asyncio
+async def test_metrics_by_route_template():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        await ac.get("/ride/123456")
+        await ac.get("/no-such-path")
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/ride/{ride_id}",status="200"}' in response.text
+    assert 'route="unmatched"' in response.text
+    assert "# TYPE http_request_db_queries histogram" in response.text
+
+def test_warm_start_restores_dispatch_state():
+    from datetime import datetime, timedelta
+    from server import main
+
+    with main.SessionLocal() as db:
+        online = main.models.Driver(name="W", email="warm@example.com", location="12.9,77.6", status="online",
+                                    last_seen=datetime.utcnow() - timedelta(minutes=5))
+        busy = main.models.Driver(name="WB", email="warm-busy@example.com", location="12.9,77.6", status="on_trip")
+        db.add_all([online, busy])
+        db.flush()
+        ride = main.models.RideQueue(user_id=1, start="A", destination="B", status="assigned", driver_id=busy.id,
+                                     port=main.BASE_PORT + main.PORT_COUNT - 1, completes_at=datetime.utcnow())
+        db.add(ride)
+        db.commit()
+        online_id, busy_id, ride_id, port = online.id, busy.id, ride.id, ride.port
+
+    warmed = main.warm_start()
+    assert warmed["online_drivers"] >= 1 and warmed["trips"] >= 1
+    assert online_id in main.driver_index and busy_id not in main.driver_index
+    assert busy_id in main.heartbeats
+    # Stale in the DB, but given a full timeout from the restart to check in
+    assert online_id in main.liveness and not main.sweep_stale_drivers()
+    assert port in main.port_allocator and main.ride_cache.ride_for_port(port) == ride_id
+
+@pytest.mark.asyncio
+async def test_archived_ride_still_served_and_queue_validates_status():
+    from datetime import datetime, timedelta
+    from server import main
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "H", "email": "history@example.com"})).json()["user_id"]
+        with main.SessionLocal() as db:
+            old = datetime.utcnow() - timedelta(days=1)
+            rides = [main.models.RideQueue(user_id=user_id, start="A", destination="Old", status="completed", updated_at=old)
+                     for _ in range(2)]
+            db.add_all(rides)
+            db.commit()
+            ride_id = rides[0].id
+        assert main.archive_old_rides() >= 1
+        ride = await ac.get(f"/ride/{ride_id}")
+        bad = await ac.get("/queue", params={"status": "pending,bogus"})
+    assert ride.json()["destination"] == "Old" and ride.json()["user_name"] == "H"
+    assert bad.status_code == 400 and "bogus" in bad.json()["error"]
+
+@pytest.mark.asyncio
+async def test_eta_quotes_nearest_drivers():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        driver_id = (await ac.post("/register-driver", params={"name": "E", "email": "eta@example.com", "location": "12.93,77.62"})).json()["driver_id"]
+        await ac.post("/go-online", params={"driver_id": driver_id})
+        quote = (await ac.get("/eta", params={"start": "Koramangala", "destination": "MG Road, Bangalore"})).json()
+        unknown = await ac.get("/eta", params={"start": "Nowhere"})
+    assert quote["start"] == [12.9352, 77.6245]
+    assert driver_id in [d["driver_id"] for d in quote["drivers"]]
+    assert quote["pickup_eta_seconds"] is not None and quote["trip_seconds"] >= 60
+    assert unknown.status_code == 400
+
+@pytest.mark.asyncio
+async def test_bulk_import_upserts_and_queues_rides():
+    from server import main
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        users = "\n".join(f'{{"name": "Bulk {i}", "email": "bulk{i}@example.com"}}' for i in range(3))
+        first = (await ac.post("/bulk/users", content=users)).json()
+        again = (await ac.post("/bulk/users", content='{"name": "Renamed", "email": "bulk0@example.com"}\n')).json()
+        drivers = (await ac.post("/bulk/drivers", params={"return_ids": "true"}, content='{"name": "BD", "email": "bulk-driver@example.com", "location": "12.9,77.6"}\n{"name": "x"}')).json()
+        user_id = (await ac.post("/register-user", params={"name": "Renamed", "email": "bulk0@example.com"})).json()["user_id"]
+        rides = (await ac.post("/bulk/rides", content=(
+            f'{{"user_id": {user_id}, "start": "Koramangala", "destination": "Whitefield"}}\n'
+            '{"user_email": "bulk1@example.com", "start": "A", "destination": "B"}\n'
+            '{"user_email": "nobody@example.com", "start": "A", "destination": "B"}\n'))).json()
+        queued = (await ac.get("/queue", params={"status": "pending", "user_id": user_id})).json()
+    assert first == {"received": 3, "imported": 3, "rejected": 0, "errors": []}
+    assert again["imported"] == 1
+    assert drivers["imported"] == 1 and drivers["errors"] == [{"line": 2, "error": "missing email"}]
+    assert list(drivers["ids"]) == ["bulk-driver@example.com"] and "ids" not in first
+    assert rides["imported"] == 2 and rides["errors"] == [{"line": 3, "error": "unknown user"}]
+    assert [r["destination"] for r in queued] == ["Whitefield"]
+    with main.SessionLocal() as db:
+        assert db.query(main.models.User).filter_by(email="bulk0@example.com").one().name == "Renamed"
+
+@pytest.mark.asyncio
+async def test_ride_by_port_skips_stale_index_entry():
+    from server import main
+
+    port = main.BASE_PORT + main.PORT_COUNT - 2
+    with main.SessionLocal() as db:
+        # Completed by another worker, which then booked a new ride on the same port
+        done = main.models.RideQueue(user_id=1, start="A", destination="B", status="completed", port=port)
+        active = main.models.RideQueue(user_id=1, start="A", destination="C", status="assigned", port=port)
+        db.add_all([done, active])
+        db.commit()
+        done_id, active_id = done.id, active.id
+    main.ride_cache.track_port(done_id, port, active=True)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get(f"/ride-by-port/{port}")
+    assert response.json()["ride_id"] == active_id
+    assert main.ride_cache.ride_for_port(port) == active_id
+
+@pytest.mark.asyncio
+async def test_port_conflict_gives_back_the_warm_pool_port(monkeypatch):
+    from server import main
+    from server.containers import FakeRuntime, Provisioner
+
+    runtime = FakeRuntime()
+    provisioner = Provisioner(runtime, main.port_allocator, pool_size=1)
+    monkeypatch.setattr(main, "provisioner", provisioner)
+    pool_port = main.port_allocator.allocate()
+    runtime.run(f"ride-pool-{pool_port}", pool_port)
+    provisioner._idle.append(pool_port)
+    with main.SessionLocal() as db:
+        # Another worker's allocator handed out the same port for its ride
+        other = main.models.RideQueue(user_id=1, start="A", destination="B", status="assigned", port=pool_port)
+        db.add(other)
+        db.commit()
+        other_id = other.id
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id = (await ac.post("/register-user", params={"name": "W", "email": "warm@example.com"})).json()["user_id"]
+        driver_id = (await ac.post("/register-driver", params={"name": "WD", "email": "warm-driver@example.com", "location": "12.9,77.6"})).json()["driver_id"]
+        await ac.post("/go-online", params={"driver_id": driver_id})
+        ride = (await ac.post("/book-ride", json={"user_id": user_id, "start": "A", "destination": "B"})).json()
+    assert ride["status"] == "assigned" and ride["ride_port"] != pool_port
+    assert pool_port not in provisioner._pooled and pool_port not in provisioner._idle
+
+    # The pool container goes; the port stays allocated until the other worker's ride ends
+    active = {other_id: pool_port, ride["ride_id"]: ride["ride_port"]}
+    provisioner.reconcile(active)
+    assert provisioner.reconcile(active)["containers"] == [f"ride-pool-{pool_port}"]
+    assert pool_port in main.port_allocator.allocated_ports()
+    del active[other_id]
+    provisioner.reconcile(active)
+    assert provisioner.reconcile(active)["ports"] == [pool_port]
+
+def test_booking_writers_follow_the_running_loop(monkeypatch):
+    import asyncio
+    from server import main
+
+    async def hold():
+        async with main.booking_writers():
+            return main._booking_writers
+
+    # A semaphore made on one loop must not be awaited on another (Python 3.9 binds it at creation)
+    first, second = asyncio.run(hold()), asyncio.run(hold())
+    assert first[1] is not second[1]
+    monkeypatch.setattr(main, "BOOK_MAX_IN_FLIGHT", 0)
+    asyncio.run(hold())
+
+def test_complete_trips_leaves_reclaimed_driver_on_trip():
+    from sqlalchemy import event
+    from server import main
+    from server.scheduler import Trip
+
+    with main.SessionLocal() as db:
+        driver = main.models.Driver(name="C", email="complete@example.com", location="12.9,77.6", status="on_trip")
+        db.add(driver)
+        db.flush()
+        ride = main.models.RideQueue(user_id=1, start="A", destination="B", status="assigned", driver_id=driver.id)
+        db.add(ride)
+        db.commit()
+        driver_id, ride_id = driver.id, ride.id
+
+    def other_worker(conn, cursor, statement, *args):
+        # Once this worker reads drivers, another one completes the same trip and re-claims the driver
+        if statement.startswith("SELECT") and "FROM drivers" in statement and not moved:
+            moved.append(True)
+            cursor.connection.execute("UPDATE ride_queue SET status = 'completed' WHERE id = ?", (ride_id,))
+            cursor.connection.execute("UPDATE drivers SET status = 'on_trip' WHERE id = ?", (driver_id,))
+            cursor.connection.execute("INSERT INTO ride_queue (user_id, start, destination, status, driver_id) "
+                                      "VALUES (1, 'B', 'C', 'assigned', ?)", (driver_id,))
+            cursor.connection.commit()
+
+    moved = []
+    event.listen(main.engine, "after_cursor_execute", other_worker)
+    try:
+        main.complete_trips([Trip(0, ride_id, driver_id, None)])
+    finally:
+        event.remove(main.engine, "after_cursor_execute", other_worker)
+        main.driver_index.discard(driver_id)
+    assert moved
+    with main.SessionLocal() as db:
+        assert db.get(main.models.Driver, driver_id).status == "on_trip"
+        assert main.complete_trips([Trip(0, ride_id, driver_id, None)]) == 0
+
+@pytest.mark.asyncio
+async def test_driver_at_a_place_name_is_located():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        near = (await ac.post("/register-driver", params={"name": "K", "email": "place@example.com", "location": "Koramangala"})).json()["driver_id"]
+        far = (await ac.post("/register-driver", params={"name": "F", "email": "far@example.com", "location": "12.0,77.0"})).json()["driver_id"]
+        for driver_id in (near, far):
+            await ac.post("/go-online", params={"driver_id": driver_id})
+        quote = (await ac.get("/eta", params={"start": "Koramangala", "k": 50})).json()
+        for driver_id in (near, far):
+            await ac.post("/go-offline", params={"driver_id": driver_id})
+    assert quote["drivers"][0] == {"driver_id": near, "eta_seconds": 0}
+    assert far in [d["driver_id"] for d in quote["drivers"]]
@@ -0,0 +1,45 @@
+import asyncio
+
+from server.bulk import MAX_REPORTED_ERRORS, driver_row, import_ndjson, ride_row
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def run_import(chunks, parse, batch_size=2):
+    batches = []
+
+    async def write(batch, report):
+        batches.append(batch)
+        report.imported += len(batch)
+
+    report = asyncio.run(import_ndjson(stream(*chunks), parse, write, batch_size=batch_size))
+    return report, batches
+
+
+def test_lines_split_across_chunks_are_batched():
+    report, batches = run_import(
+        [b'{"name": "a", "email": "a@x", "loc', b'ation": "12.9,77.6"}\n\n{"name": "b", "email": "b@x", "location": "B"}\n',
+         b'{"name": "c", "email": "c@x", "location": "C"}'],
+        driver_row,
+    )
+    assert [[line for line, _ in batch] for batch in batches] == [[1, 3], [4]]
+    assert batches[0][0][1] == {"name": "a", "email": "a@x", "location": "12.9,77.6"}
+    assert report.as_dict() == {"received": 3, "imported": 3, "rejected": 0, "errors": []}
+
+
+def test_bad_lines_are_reported_and_skipped():
+    lines = b"\n".join([b"not json", b"[1, 2]", b'{"user_id": "7", "start": "A", "destination": "B"}',
+                        b'{"start": "A", "destination": "B"}', b'{"user_email": "u@x", "start": "A", "destination": "B"}'])
+    report, batches = run_import([lines], ride_row)
+    assert report.received == 5 and report.imported == 1 and report.rejected == 4
+    assert [e["line"] for e in report.errors] == [1, 2, 3, 4]
+    assert report.errors[3]["error"] == "missing user_id or user_email"
+    assert batches == [[(5, {"user_id": None, "user_email": "u@x", "start": "A", "destination": "B"})]]
+
+
+def test_error_list_is_capped():
+    report, _ = run_import([b"x\n" * (MAX_REPORTED_ERRORS + 5)], ride_row)
+    assert report.rejected == MAX_REPORTED_ERRORS + 5 and len(report.errors) == MAX_REPORTED_ERRORS
@@ -0,0 +1,22 @@
+from server.cache import RideCache
+
+
+def test_invalidation_during_read_blocks_stale_put():
+    cache = RideCache()
+    ticket = cache.ticket()
+    cache.invalidate(1)
+    assert not cache.put(1, {"status": "pending"}, ticket)
+    assert cache.get(1) is None
+    assert cache.put(1, {"status": "assigned"}, cache.ticket())
+    assert cache.get(1) == {"status": "assigned"}
+
+
+def test_port_index_follows_active_rides():
+    cache = RideCache()
+    cache.track_port(1, 7000, active=True)
+    assert cache.ride_for_port(7000) == 1
+    cache.track_port(2, 7000, active=True)
+    cache.track_port(1, 7000, active=False)
+    assert cache.ride_for_port(7000) == 2
+    cache.track_port(2, 7000, active=False)
+    assert cache.ride_for_port(7000) is None
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from server.containers import ContainerRuntime, FakeRuntime, Provisioner
+from server.ports import PortAllocator
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_acquire_does_not_wait_for_container_startup():
+    runtime = FakeRuntime(delay=0.2)
+    provisioner = Provisioner(runtime, PortAllocator(7000, 5, probe=False))
+    provisioner.start()
+    try:
+        started = time.perf_counter()
+        port = provisioner.acquire()
+        provisioner.provision(1, port)
+        assert time.perf_counter() - started < 0.1
+        assert wait_for(lambda: runtime.containers.get("ride-1") == port)
+    finally:
+        provisioner.stop()
+
+
+def test_warm_pool_is_claimed_and_renamed():
+    runtime = FakeRuntime()
+    ports = PortAllocator(7000, 5, probe=False)
+    provisioner = Provisioner(runtime, ports, pool_size=2)
+    provisioner.start()
+    try:
+        assert wait_for(lambda: provisioner.stats()["idle_containers"] == 2)
+        port = provisioner.acquire()
+        provisioner.provision(7, port)
+        assert wait_for(lambda: runtime.containers.get("ride-7") == port)
+        assert f"ride-pool-{port}" not in runtime.containers
+        assert provisioner.stats()["claimed_from_pool"] == 1
+    finally:
+        provisioner.stop()
+    provisioner.drain_pool()
+    assert list(runtime.containers) == ["ride-7"]
+    assert ports.allocated_ports() == [port]
+
+
+def test_teardown_is_batched_and_frees_ports():
+    class CountingRuntime(FakeRuntime):
+        remove_calls = 0
+
+        def remove(self, names):
+            self.remove_calls += 1
+            super().remove(names)
+
+    runtime = CountingRuntime()
+    ports = PortAllocator(7000, 5, probe=False)
+    provisioner = Provisioner(runtime, ports)
+    for ride_id in range(3):
+        port = provisioner.acquire()
+        provisioner.provision(ride_id, port)
+        provisioner.release(ride_id, port)
+    # Worker starts with everything queued, so the three removes share one call
+    provisioner.start()
+    try:
+        assert wait_for(lambda: provisioner.stats()["removed"] == 3)
+        assert runtime.remove_calls == 1
+        assert ports.allocated_ports() == []
+    finally:
+        provisioner.stop()
+
+
+def test_reconcile_reaps_orphans_on_second_pass():
+    runtime = FakeRuntime()
+    ports = PortAllocator(7000, 5, probe=False)
+    provisioner = Provisioner(runtime, ports)
+    runtime.containers.update({"ride-1": 7000, "ride-2": 7001, "ride-pool-7004": 7004, "nginx": 80})
+    for port in (7000, 7001, 7003):
+        ports.reserve(port)
+    active = {1: 7000}
+
+    first = provisioner.reconcile(active)
+    assert first == {"containers": [], "ports": []}
+    assert [c["name"] for c in provisioner.containers()] == ["nginx", "ride-1", "ride-2", "ride-pool-7004"]
+
+    second = provisioner.reconcile(active)
+    assert second == {"containers": ["ride-2", "ride-pool-7004"], "ports": [7001, 7003]}
+    assert sorted(runtime.containers) == ["nginx", "ride-1"]
+    assert ports.allocated_ports() == [7000]
+
+
+def test_reconcile_spares_queued_work():
+    runtime = FakeRuntime()
+    ports = PortAllocator(7000, 5, probe=False)
+    provisioner = Provisioner(runtime, ports)
+    port = provisioner.acquire()
+    provisioner.provision(5, port)
+    provisioner.reconcile({})
+    assert provisioner.reconcile({})["ports"] == []
+    assert ports.allocated_ports() == [port]
+
+
+def test_runtime_must_implement_every_method():
+    class Partial(ContainerRuntime):
+        def run(self, name, port, ride_id=None):
+            return True
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert isinstance(FakeRuntime(), ContainerRuntime)
@@ -0,0 +1,56 @@
+import threading
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# dispatch imports models flat (as main does), so use that copy rather than re-importing it
+from server.dispatch import assign_ride, claim_driver, models
+
+
+def make_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dispatch.db'}", connect_args={"timeout": 30})
+    models.Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_racing_dispatchers_never_double_assign(tmp_path):
+    Session = make_session(tmp_path)
+    with Session() as db:
+        db.add_all([models.Driver(name=f"d{i}", email=f"d{i}@x", status="online") for i in range(20)])
+        db.add_all([models.RideQueue(user_id=1, start="A", destination="B") for _ in range(40)])
+        db.commit()
+        driver_ids = db.scalars(select(models.Driver.id)).all()
+        ride_ids = db.scalars(select(models.RideQueue.id)).all()
+
+    wins = []
+
+    def dispatcher(offset):
+        # Every worker walks the same drivers and rides, so they all contend for each row
+        with Session() as db:
+            for i, ride_id in enumerate(ride_ids):
+                driver_id = driver_ids[(i + offset) % len(driver_ids)]
+                if not claim_driver(db, driver_id):
+                    db.rollback()
+                    continue
+                if assign_ride(db, ride_id, driver_id):
+                    db.commit()
+                    wins.append((ride_id, driver_id))
+                else:
+                    db.rollback()
+
+    threads = [threading.Thread(target=dispatcher, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with Session() as db:
+        per_driver = db.execute(
+            select(models.RideQueue.driver_id, func.count())
+            .where(models.RideQueue.status == "assigned")
+            .group_by(models.RideQueue.driver_id)
+        ).all()
+        on_trip = db.scalar(select(func.count()).where(models.Driver.status == "on_trip"))
+    assert len(wins) == len({ride for ride, _ in wins}) == len({driver for _, driver in wins}) == 20
+    assert all(count == 1 for _, count in per_driver)
+    assert on_trip == 20
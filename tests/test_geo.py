@@ -0,0 +1,34 @@
+from server.geo import DriverIndex, parse_location
+
+
+def test_parse_location():
+    assert parse_location("Lat: 12.9716, Lng: 77.5946") == (12.9716, 77.5946)
+    assert parse_location("12.97,77.59") == (12.97, 77.59)
+    assert parse_location("Bangalore") is None
+
+
+def test_numbers_in_an_address_are_not_coordinates():
+    assert parse_location("Flat 3, Tower 45, Whitefield") is None
+    assert parse_location("12th Main, 80 Feet Road, Indiranagar") is None
+    assert parse_location("Gate 2 Terminal 1, Airport") is None
+    assert parse_location("3, 45") is None
+    assert parse_location(" lat: 12.97 , lng: 77.59 ") == (12.97, 77.59)
+
+
+def test_nearest_orders_by_distance():
+    index = DriverIndex()
+    index.add(1, "Lat: 12.9800, Lng: 77.6000")
+    index.add(2, "Lat: 12.9716, Lng: 77.5946")
+    index.add(3, "Lat: 13.2000, Lng: 77.7000")
+    index.add(4, "Somewhere")
+    assert index.nearest("12.9716,77.5946", k=4) == [2, 1, 3, 4]
+
+
+def test_claim_nearest_removes_driver():
+    index = DriverIndex()
+    index.add(1, (12.97, 77.59))
+    index.add(2, (28.61, 77.20))
+    assert index.claim_nearest("28.6,77.2") == 2
+    assert 2 not in index
+    assert index.claim_nearest("28.6,77.2") == 1
+    assert index.claim_nearest("28.6,77.2") is None
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from server.heartbeats import HeartbeatTable, to_datetime
+
+
+def test_beat_only_tracks_known_drivers():
+    table = HeartbeatTable()
+    assert not table.beat(1)
+    table.seed(1, 100.0)
+    assert table.beat(1, now=105.0)
+    assert table.is_alive(1, timeout=10, now=110.0)
+    assert not table.is_alive(1, timeout=10, now=120.0)
+    assert table.is_alive(2, timeout=10, default=115.0, now=120.0)
+
+
+def test_flush_writes_latest_beat_per_driver():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    drivers = Table("drivers", metadata, Column("id", Integer, primary_key=True), Column("last_seen", DateTime))
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(drivers), [{"id": 1, "last_seen": datetime(2020, 1, 1)}, {"id": 2, "last_seen": datetime(2020, 1, 1)}])
+
+    table = HeartbeatTable()
+    table.seed(1, 0.0)
+    table.beat(1, now=1000.0)
+    table.beat(1, now=2000.0)
+    with Session(engine) as db:
+        assert table.flush(db, drivers) == 1
+        assert table.flush(db, drivers) == 0
+        rows = dict(db.execute(select(drivers.c.id, drivers.c.last_seen)).all())
+    assert rows == {1: to_datetime(2000.0), 2: datetime(2020, 1, 1)}
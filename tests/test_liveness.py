@@ -0,0 +1,20 @@
+from server.liveness import LivenessTracker
+
+
+def test_pop_expired_only_returns_silent_drivers():
+    tracker = LivenessTracker(timeout=10)
+    tracker.watch(1, last_seen=100)
+    tracker.watch(2, last_seen=100)
+    tracker.watch(3, last_seen=100)
+    tracker.touch(2, last_seen=108)
+    tracker.unwatch(3)
+    assert tracker.pop_expired(now=111) == [1]
+    assert tracker.pop_expired(now=111) == []
+    assert tracker.pop_expired(now=119) == [2]
+    assert len(tracker) == 0
+
+
+def test_touch_ignores_unwatched_drivers():
+    tracker = LivenessTracker(timeout=10)
+    tracker.touch(1, last_seen=100)
+    assert 1 not in tracker
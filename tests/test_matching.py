@@ -0,0 +1,32 @@
+import numpy as np
+
+from server.matching import greedy, hungarian, match
+
+
+def test_hungarian_beats_greedy():
+    # Greedy grabs the 1 and then has to pay 100; the optimum is 2 + 3
+    cost = np.array([[1.0, 2.0], [3.0, 100.0]])
+    assert greedy(cost) == [(0, 0), (1, 1)]
+    assert hungarian(cost) == [(0, 1), (1, 0)]
+
+
+def test_hungarian_rectangular():
+    cost = np.array([[5.0, 1.0, 9.0], [4.0, 2.0, 8.0]])
+    assert hungarian(cost) == [(0, 1), (1, 0)]
+    assert hungarian(cost.T) == [(0, 1), (1, 0)]
+
+
+def test_match_prefers_located_drivers():
+    rides = [(12.97, 77.59), None]
+    drivers = [None, (12.98, 77.60), (28.61, 77.20)]
+    assert sorted(match(rides, drivers)) == [(0, 1), (1, 0)]
+
+
+def test_greedy_matches_every_ride_it_can():
+    rng = np.random.default_rng(7)
+    hotspot = [(12.97, 77.59)] * 300
+    spread = [tuple(p) for p in rng.uniform((12.8, 77.4), (13.1, 77.8), size=(1000, 2))]
+    # Past the exact-solver size, so these take the greedy path
+    assert len(match(hotspot, hotspot)) == 300
+    assert len(match(spread, spread[:600])) == 600
+    assert len(match(spread[:600], spread)) == 600
@@ -0,0 +1,35 @@
+from server.metrics import Counter, Gauge, Histogram, Registry, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("latency_seconds", "help", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        hist.observe(value, "/a")
+    samples = {name + labels: value for name, labels, value in hist.samples()}
+    assert samples['latency_seconds_bucket{route="/a",le="0.1"}'] == 2
+    assert samples['latency_seconds_bucket{route="/a",le="1"}'] == 3
+    assert samples['latency_seconds_bucket{route="/a",le="+Inf"}'] == 4
+    assert samples['latency_seconds_count{route="/a"}'] == 4
+    assert samples['latency_seconds_sum{route="/a"}'] == 3.65
+
+
+def test_registry_renders_text_format():
+    registry = Registry()
+    registry.add(Counter("jobs_total", "Jobs run")).inc(2)
+    registry.add(Gauge("queue_depth", "Queued", lambda: {("a",): 1, "b": 2}, ("queue",)))
+    text = registry.render()
+    assert "# TYPE jobs_total counter\njobs_total 2\n" in text
+    assert 'queue_depth{queue="a"} 1\nqueue_depth{queue="b"} 2\n' in text
+
+
+def test_timed_records_failures_too():
+    from server.metrics import TASK_SECONDS
+
+    def boom():
+        raise RuntimeError
+
+    try:
+        timed("boom", boom)
+    except RuntimeError:
+        pass
+    assert any(labels == '{task="boom"}' and name.endswith("_count") for name, labels, _ in TASK_SECONDS.samples())
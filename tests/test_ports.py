@@ -0,0 +1,27 @@
+from server.ports import PortAllocator
+
+
+def test_allocate_release_and_exhaustion():
+    ports = PortAllocator(7000, 3, probe=False)
+    assert [ports.allocate() for _ in range(3)] == [7000, 7001, 7002]
+    assert ports.allocate() is None
+    ports.release(7001)
+    assert ports.allocate() == 7001
+    stats = ports.stats()
+    assert stats["allocated"] == 3 and stats["exhausted"] == 1
+
+
+def test_reserved_ports_are_skipped():
+    ports = PortAllocator(7000, 3, probe=False)
+    assert ports.reserve(7000)
+    assert not ports.reserve(8000)
+    assert ports.allocate() == 7001
+
+
+def test_large_range_is_allocated_lazily():
+    # Shared mode uses the whole integer column as ride keys
+    ports = PortAllocator(7000, 2**31 - 1 - 7000, probe=False)
+    assert [ports.allocate() for _ in range(3)] == [7000, 7001, 7002]
+    ports.release(7000)
+    assert ports.allocate() == 7003
+    assert ports.stats()["free"] == 2**31 - 1 - 7000 - 3
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+# retention imports models flat (as main does), so use that copy rather than re-importing it
+from server.retention import archive_completed_rides, models
+
+
+def test_archives_only_old_completed_rides(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    now = datetime.utcnow()
+    old, recent = now - timedelta(hours=2), now - timedelta(minutes=5)
+    with Session() as db:
+        db.add_all(
+            [models.RideQueue(user_id=1, start="A", destination="B", status="completed", driver_id=7, updated_at=old)
+             for _ in range(5)]
+            + [models.RideQueue(user_id=1, start="A", destination="B", status="completed", updated_at=recent),
+               models.RideQueue(user_id=1, start="A", destination="B", status="assigned", updated_at=old),
+               # Newest row: kept even though it qualifies, so SQLite never hands its id out again
+               models.RideQueue(user_id=1, start="A", destination="B", status="completed", updated_at=old)]
+        )
+        db.commit()
+
+        assert archive_completed_rides(db, now - timedelta(hours=1), batch_size=2) == 5
+        assert archive_completed_rides(db, now - timedelta(hours=1), batch_size=2) == 0
+        remaining = db.execute(select(models.RideQueue.id, models.RideQueue.status).order_by(models.RideQueue.id)).all()
+        archived = db.execute(select(models.RideHistory)).scalars().all()
+    assert [status for _, status in remaining] == ["completed", "assigned", "completed"]
+    assert sorted(ride.id for ride in archived) == [1, 2, 3, 4, 5]
+    assert all(ride.driver_id == 7 and ride.updated_at == old and ride.archived_at for ride in archived)
@@ -0,0 +1,55 @@
+import math
+
+from server.geo import haversine_km
+from server.routing import MAX_TRIP_SECONDS, MIN_TRIP_SECONDS, RouteModel, resolve
+
+
+def test_resolve_coordinates_and_place_names():
+    assert resolve("Lat: 12.9716, Lng: 77.5946") == (12.9716, 77.5946)
+    assert resolve((12.9, 77.6)) == (12.9, 77.6)
+    assert resolve("Bangalore") == resolve("  bengaluru ") == (12.9716, 77.5946)
+    assert resolve("MG Road, Bangalore") == resolve("mg road")
+    assert resolve("Somewhere else") is None
+    assert resolve(None) is None
+
+
+def test_street_addresses_with_numbers_resolve_by_place_name():
+    assert resolve("Flat 3, Tower 45, Whitefield") == resolve("Whitefield")
+    assert resolve("12th Main, 80 Feet Road, Indiranagar") == resolve("Indiranagar")
+    assert resolve("Gate 2 Terminal 1, Airport") == resolve("Airport")
+    assert resolve("Flat 3, Tower 45") is None
+    model = RouteModel()
+    assert model.trip_seconds("Koramangala", "Flat 3, Tower 45, Whitefield") < 3600
+    assert model.trip_seconds("Koramangala", "Flat 3, Tower 45") is None
+
+
+def test_route_matches_haversine_within_a_cell_and_is_cached():
+    model = RouteModel(road_factor=1.5, speed_kmh=30)
+    a, b = (12.9716, 77.5946), (12.9352, 77.6245)
+    km, seconds = model.route(a, b)
+    assert abs(km - 1.5 * haversine_km(a, b)) < 1.5 * 0.5
+    assert math.isclose(seconds, km / 30 * 3600)
+    # Nearby points in the same two cells share the cached answer
+    assert model.route((a[0] + 0.0001, a[1]), (b[0], b[1] + 0.0001)) == (km, seconds)
+    assert model.stats()["hits"] == 1 and model.stats()["misses"] == 1
+    assert model.route("Bangalore", "Nowhere") is None
+
+
+def test_trip_seconds_has_a_floor():
+    model = RouteModel()
+    assert model.trip_seconds("12.97,77.59", "12.97,77.59") == MIN_TRIP_SECONDS
+    assert model.trip_seconds("Bangalore", "Mysore") > 3600
+    assert model.trip_seconds("Bangalore", "Delhi") == MAX_TRIP_SECONDS
+    assert model.trip_seconds("A", "B") is None
+
+
+def test_batch_pickup_etas_agree_with_single_routes():
+    model = RouteModel()
+    pickup = (12.9716, 77.5946)
+    drivers = [(12.98, 77.60), None, (13.05, 77.55), (12.9716, 77.5946)]
+    etas = model.pickup_etas(pickup, drivers)
+    assert math.isinf(etas[1])
+    for point, eta in zip(drivers, etas):
+        if point is not None:
+            assert math.isclose(eta, model.route(point, pickup)[1], rel_tol=1e-9, abs_tol=1e-6)
+    assert all(math.isinf(eta) for eta in model.pickup_etas("Nowhere", drivers))
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from server.scheduler import TripScheduler
+
+
+def test_pop_due_in_deadline_order():
+    scheduler = TripScheduler(handler=lambda trips: None)
+    scheduler.schedule(1, 10, 7000, due_at=300)
+    scheduler.schedule(2, 20, 7001, due_at=100)
+    scheduler.schedule(3, 30, 7002, due_at=200)
+    assert [trip.ride_id for trip in scheduler.pop_due(now=250)] == [2, 3]
+    assert len(scheduler) == 1
+
+
+def test_worker_completes_due_trips_in_one_batch():
+    batches = []
+    done = threading.Event()
+
+    def handler(trips):
+        batches.append([trip.ride_id for trip in trips])
+        done.set()
+        return len(trips)
+
+    scheduler = TripScheduler(handler)
+    scheduler.start()
+    try:
+        due = time.time() + 0.05
+        scheduler.schedule(1, 10, 7000, due)
+        scheduler.schedule(2, 20, 7001, due)
+        assert done.wait(2)
+    finally:
+        scheduler.stop()
+    assert batches == [[1, 2]]
+    assert scheduler.stats()["completed_trips"] == 2
+
+
+def test_skipped_trips_are_not_counted_as_completed():
+    done = threading.Event()
+
+    def handler(trips):
+        done.set()
+        # Ride 2 was already completed, e.g. scheduled twice after a restart
+        return len([trip for trip in trips if trip.ride_id != 2])
+
+    scheduler = TripScheduler(handler)
+    scheduler.start()
+    try:
+        due = time.time() + 0.05
+        scheduler.schedule(1, 10, 7000, due)
+        scheduler.schedule(2, 20, 7001, due)
+        assert done.wait(2)
+    finally:
+        scheduler.stop()
+    assert scheduler.stats()["completed_trips"] == 1
+    assert scheduler.stats()["skipped_trips"] == 1
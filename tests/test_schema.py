@@ -0,0 +1,73 @@
+from sqlalchemy import create_engine, inspect, select, text
+
+# schema imports models flat (as main does), so use that copy rather than re-importing it
+from server.schema import MIGRATIONS, bootstrap, current_version, models, version_table
+
+
+def test_bootstrap_creates_once_and_keeps_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    assert bootstrap(engine) == [number for number, _, _ in MIGRATIONS]
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(name="kept", email="kept@x"))
+    assert bootstrap(engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(select(models.User.name)).scalars().all() == ["kept"]
+        assert current_version(conn) == MIGRATIONS[-1][0]
+
+
+# The tables as the first release created them, before versioning, status indexes,
+# ride_queue.completes_at and ride_queue.updated_at
+LEGACY_TABLES = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, created_at DATETIME)",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE TABLE drivers (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, location VARCHAR, "
+    "status VARCHAR, last_seen DATETIME)",
+    "CREATE INDEX ix_drivers_id ON drivers (id)",
+    "CREATE UNIQUE INDEX ix_drivers_email ON drivers (email)",
+    "CREATE TABLE ride_queue (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), start VARCHAR, "
+    "destination VARCHAR, status VARCHAR, driver_id INTEGER REFERENCES drivers (id), port INTEGER, "
+    "container_name VARCHAR, created_at DATETIME)",
+    "CREATE INDEX ix_ride_queue_id ON ride_queue (id)",
+]
+
+
+def test_bootstrap_upgrades_unversioned_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_TABLES:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO users (id, name, email, created_at) VALUES (1, 'kept', 'kept@x', '2024-01-02 03:04:05')"))
+        conn.execute(text("INSERT INTO ride_queue (id, user_id, start, destination, status, created_at) "
+                          "VALUES (1, 1, 'A', 'B', 'pending', '2024-01-02 03:04:05')"))
+    with engine.connect() as conn:
+        assert current_version(conn) is None
+
+    def add_notes(conn):
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY)"))
+
+    migrations = MIGRATIONS + [(MIGRATIONS[-1][0] + 1, "notes", add_notes)]
+    # Stamped as version 1, then every later migration runs
+    assert bootstrap(engine, migrations) == [number for number, _, _ in migrations[1:]]
+    assert bootstrap(engine, migrations) == []
+    assert "notes" in inspect(engine).get_table_names()
+    assert {"completes_at", "updated_at"} <= {column["name"] for column in inspect(engine).get_columns("ride_queue")}
+    with engine.connect() as conn:
+        assert conn.execute(select(version_table.c.version)).scalars().all() == [number for number, _, _ in migrations]
+        ride = conn.execute(select(models.RideQueue.updated_at, models.RideQueue.created_at)).one()
+        assert ride.updated_at == ride.created_at
+
+
+def test_status_migration_upgrades_version_one_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'v1.db'}")
+    bootstrap(engine, MIGRATIONS[:1])
+    # What version 1 had: a redundant id index and none of the status indexes or ride_history
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_ride_queue_id ON ride_queue (id)"))
+        conn.execute(text("DROP INDEX ix_drivers_status_location"))
+        conn.execute(text("DROP TABLE ride_history"))
+    assert bootstrap(engine) == [2]
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("ride_queue") + inspect(engine).get_indexes("drivers")}
+    assert "ix_ride_queue_id" not in indexes
+    assert {"ix_drivers_status_location", "ix_ride_queue_completed_updated_at"} <= indexes
+    assert "ride_history" in inspect(engine).get_table_names()